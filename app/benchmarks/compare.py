@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+    This command compares two stored benchmark runs
+
+    Usage (from the app directory):
+        python -m benchmarks.compare current.json baseline.json --threshold 0.1
+"""
+import argparse
+import json
+import sys
+
+from benchmarks.report import (
+    PERCENTILES,
+    compare_results,
+    format_comparisons,
+    load_results,
+)
+
+
+def parse_arguments(argv=None):
+    """
+    Parse the command line arguments.
+
+    Args:
+        argv (list, optional): The arguments to parse, defaults to sys.argv.
+
+    Returns:
+        Namespace: The parsed arguments.
+    """
+    parser = argparse.ArgumentParser(
+        description="Compare benchmark results with a baseline"
+    )
+    parser.add_argument("results", help="The results of the run to check")
+    parser.add_argument("baseline", help="The results of the reference run")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="Tolerated relative slowdown against the baseline (default: 0.1)",
+    )
+    parser.add_argument(
+        "--metric",
+        choices=[f"p{percent}" for percent in PERCENTILES],
+        default="p95",
+        help="Latency percentile to compare (default: p95)",
+    )
+    parser.add_argument(
+        "--json", action="store_true", help="Print the comparison as JSON"
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """
+    Print the comparison of two runs.
+
+    Returns:
+        int: The process exit code, 1 when a benchmark regressed against the baseline.
+    """
+    arguments = parse_arguments(argv)
+    comparisons = compare_results(
+        load_results(arguments.results),
+        load_results(arguments.baseline),
+        arguments.threshold,
+        arguments.metric,
+    )
+
+    if arguments.json:
+        print(json.dumps(comparisons, indent=2))
+    else:
+        print(format_comparisons(comparisons, arguments.threshold))
+    return 1 if any(comparison["regressed"] for comparison in comparisons) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
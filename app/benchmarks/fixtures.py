@@ -0,0 +1,322 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+    This file sets up what a benchmark run needs: a stub photo service, the API server and a
+    users table of a given size
+"""
+import io
+import os
+import socket
+import subprocess
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from time import monotonic, sleep
+
+import requests
+from database.bulk_copy import copy_rows
+from database.connection_context import ConnectionContext
+from PIL import Image
+from sqlalchemy import text
+
+FILL_CHUNK_SIZE = 10000
+FIRST_NAMES = ("Alex", "Jordan", "Casey", "Taylor", "Morgan", "Riley", "Cameron")
+LAST_NAMES = ("Taylor", "Lee", "Morgan", "Parker", "Reed", "Adams", "Blake", "Hayes")
+APP_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port():
+    """
+    Pick a TCP port that is currently free on the loopback interface.
+
+    Returns:
+        int: The port number.
+    """
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def render_stub_photo(edge=256):
+    """
+    Render a small JPEG for the stub photo service.
+
+    Args:
+        edge (int): The width and height of the image in pixels.
+
+    Returns:
+        bytes: The encoded image.
+    """
+    image = Image.linear_gradient("L").resize((edge, edge)).convert("RGB")
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=85)
+    return buffer.getvalue()
+
+
+def wait_for_background_work(base_url, timeout=120):
+    """
+    Wait until the API has attached every profile photo it scheduled.
+
+    Creating users hands photo jobs to the background photo worker, which would otherwise keep
+    the server busy during the next measurement. With several uvicorn workers, only the one
+    answering the health check is waited for.
+
+    Args:
+        base_url (str): The base URL of the API.
+        timeout (float): The maximum number of seconds to wait.
+
+    Returns:
+        bool: True if the worker became idle in time.
+    """
+    deadline = monotonic() + timeout
+    while monotonic() < deadline:
+        stats = requests.get(f"{base_url}/health/photo-worker", timeout=5).json()
+        if stats["submitted"] <= stats["stored"] + stats["failed"]:
+            return True
+        sleep(0.2)
+    return False
+
+
+class PhotoStub:
+    """
+    A local HTTP server standing in for the upstream photo service.
+
+    It answers every GET with the same small JPEG, so benchmarks never depend on the network
+    while still exercising the photo reservoir, rendering and blob storage.
+
+    Attributes:
+        url (str): The URL to point PROFILE_PHOTO_URL at.
+    """
+
+    def __init__(self):
+        """
+        Initialize the stub without starting it.
+        """
+        photo = render_stub_photo()
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                self.send_response(200)
+                self.send_header("Content-Type", "image/jpeg")
+                self.send_header("Content-Length", str(len(photo)))
+                self.end_headers()
+                self.wfile.write(photo)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", free_port()), Handler)
+        self.url = f"http://127.0.0.1:{self._server.server_port}/"
+
+    def start(self):
+        """
+        Serve requests on a daemon thread.
+        """
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        """
+        Stop serving requests.
+        """
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class ApiServer:
+    """
+    Runs the API with uvicorn in a child process.
+
+    Attributes:
+        url (str): The base URL of the running server.
+        workers (int): The number of uvicorn worker processes.
+        log_path (str): The file receiving the server's output.
+    """
+
+    def __init__(self, workers, environment, log_path):
+        """
+        Initialize the server without starting it.
+
+        Args:
+            workers (int): The number of uvicorn worker processes.
+            environment (dict): Extra environment variables for the server.
+            log_path (str): The file receiving the server's output.
+        """
+        self.port = free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        self.workers = workers
+        self.log_path = log_path
+        self._environment = {**os.environ, **environment}
+        self._process = None
+
+    def start(self, timeout=120):
+        """
+        Start the server and wait until it answers its ping endpoint.
+
+        Args:
+            timeout (float): The number of seconds to wait for the server.
+
+        Raises:
+            RuntimeError: If the server exits or does not answer in time.
+        """
+        with open(self.log_path, "ab") as log:
+            self._process = subprocess.Popen(
+                [
+                    sys.executable,
+                    "-m",
+                    "uvicorn",
+                    "main:app",
+                    "--host",
+                    "127.0.0.1",
+                    "--port",
+                    str(self.port),
+                    "--workers",
+                    str(self.workers),
+                    "--log-level",
+                    "warning",
+                    "--no-access-log",
+                ],
+                cwd=APP_DIRECTORY,
+                env=self._environment,
+                stdout=log,
+                stderr=subprocess.STDOUT,
+            )
+
+        deadline = monotonic() + timeout
+        while monotonic() < deadline:
+            if self._process.poll() is not None:
+                raise RuntimeError(f"The API server exited, see {self.log_path}")
+            try:
+                if requests.get(f"{self.url}/health/ping", timeout=1).ok:
+                    return
+            except requests.RequestException:
+                pass
+            sleep(0.25)
+
+        self.stop()
+        raise RuntimeError(f"The API server did not start, see {self.log_path}")
+
+    def stop(self):
+        """
+        Stop the server, if it is running.
+        """
+        if self._process is not None and self._process.poll() is None:
+            self._process.terminate()
+            try:
+                self._process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                self._process.kill()
+        self._process = None
+
+
+class BenchmarkTable:
+    """
+    Brings the users table to the sizes under test and provides the rows scenarios work on.
+
+    Rows are loaded with COPY straight into the database, bypassing the API. Every row created
+    here has an email under the run's token, so repeated runs never collide.
+
+    Attributes:
+        token (str): A token unique to the benchmark run.
+    """
+
+    def __init__(self, token):
+        """
+        Initialize the table helper.
+
+        Args:
+            token (str): A token unique to the benchmark run.
+        """
+        self.token = token
+        self._inserted = 0
+
+    def count(self):
+        """
+        Count the users currently in the table.
+
+        Returns:
+            int: The exact number of users.
+        """
+        with ConnectionContext() as connection:
+            return connection.execute(text("SELECT count(*) FROM users")).scalar_one()
+
+    def fill(self, size, progress=None):
+        """
+        Insert synthetic users until the table holds at least `size` of them.
+
+        Args:
+            size (int): The number of users the table should hold.
+            progress (Callable[[int, int], None], optional): Called with the number of rows
+                inserted so far and the number to insert, after each chunk.
+
+        Returns:
+            int: The number of users inserted.
+        """
+        missing = max(size - self.count(), 0)
+        inserted = 0
+        while inserted < missing:
+            chunk = min(FILL_CHUNK_SIZE, missing - inserted)
+            self.insert("fill", chunk)
+            inserted += chunk
+            if progress:
+                progress(inserted, missing)
+        return inserted
+
+    def insert(self, label, count):
+        """
+        Insert synthetic users and return their IDs.
+
+        Args:
+            label (str): A label included in the emails of the new users.
+            count (int): The number of users to insert.
+
+        Returns:
+            list: The IDs of the new users.
+        """
+        first, self._inserted = self._inserted, self._inserted + count
+        emails = [
+            f"bench-{self.token}-{label}-{first + offset}@example.com"
+            for offset in range(count)
+        ]
+        rows = (
+            (
+                FIRST_NAMES[(first + offset) % len(FIRST_NAMES)],
+                LAST_NAMES[(first + offset) % len(LAST_NAMES)],
+                email,
+                f"+1555{(first + offset) % 10000000:07d}",
+            )
+            for offset, email in enumerate(emails)
+        )
+
+        with ConnectionContext() as connection:
+            copy_rows(
+                connection,
+                "users",
+                ("first_name", "last_name", "email", "phone_number"),
+                rows,
+            )
+            ids = list(
+                connection.execute(
+                    text("SELECT id FROM users WHERE email = ANY(:emails)"),
+                    {"emails": emails},
+                ).scalars()
+            )
+            connection.commit()
+        return ids
+
+    def sample_ids(self, count):
+        """
+        Pick random IDs of existing users.
+
+        Args:
+            count (int): The number of IDs to pick.
+
+        Returns:
+            list: Up to `count` user IDs.
+        """
+        with ConnectionContext() as connection:
+            return list(
+                connection.execute(
+                    text("SELECT id FROM users ORDER BY random() LIMIT :count"),
+                    {"count": count},
+                ).scalars()
+            )
@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+    This file drives concurrent HTTP requests against the API and measures their latency
+"""
+import itertools
+import threading
+from time import perf_counter
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+def run_load(request, total, concurrency):
+    """
+    Issue `total` requests from `concurrency` threads and record the latency of each.
+
+    Every thread keeps its own HTTP session, so connections are reused as a real client would.
+    Requests are numbered from 0 to `total - 1`; each number is handed to `request` exactly once.
+
+    Args:
+        request (Callable[[Session, int], int]): Sends the numbered request with the given
+            session and returns its HTTP status code.
+        total (int): The number of requests to send.
+        concurrency (int): The number of requests in flight at any time.
+
+    Returns:
+        dict: The "latencies" of successful requests in seconds, the number of "errors"
+        (exceptions and 4xx/5xx responses) and the wall-clock "seconds" the run took.
+    """
+    counter = itertools.count()
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+
+    def work():
+        session = requests.Session()
+        session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=1))
+        local_latencies, local_errors = [], 0
+
+        while (index := next(counter)) < total:
+            started = perf_counter()
+            try:
+                status_code = request(session, index)
+            except requests.RequestException:
+                status_code = None
+            elapsed = perf_counter() - started
+
+            if status_code is None or status_code >= 400:
+                local_errors += 1
+            else:
+                local_latencies.append(elapsed)
+
+        session.close()
+        with lock:
+            latencies.extend(local_latencies)
+            errors[0] += local_errors
+
+    threads = [threading.Thread(target=work) for _ in range(concurrency)]
+    started = perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    return {
+        "latencies": latencies,
+        "errors": errors[0],
+        "seconds": perf_counter() - started,
+    }
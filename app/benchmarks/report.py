@@ -0,0 +1,218 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+    This file summarizes benchmark measurements and compares them against a stored baseline
+"""
+import json
+import math
+
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(sorted_values, percent):
+    """
+    Compute a nearest-rank percentile.
+
+    Args:
+        sorted_values (list): The values, in ascending order.
+        percent (float): The percentile, between 0 and 100.
+
+    Returns:
+        float: The percentile, or None when there are no values.
+    """
+    if not sorted_values:
+        return None
+    rank = max(math.ceil(percent / 100 * len(sorted_values)), 1)
+    return sorted_values[rank - 1]
+
+
+def summarize(scenario, table_size, concurrency, measurement):
+    """
+    Turn the raw measurement of a benchmark into its result entry.
+
+    Args:
+        scenario (str): The scenario name.
+        table_size (int): The number of users in the table.
+        concurrency (int): The number of requests in flight.
+        measurement (dict): The output of `run_load`.
+
+    Returns:
+        dict: The scenario parameters, request and error counts, requests per second and
+        latency percentiles, mean and maximum in milliseconds.
+    """
+    latencies = sorted(measurement["latencies"])
+    latency_ms = {
+        f"p{percent}": _milliseconds(percentile(latencies, percent))
+        for percent in PERCENTILES
+    }
+    latency_ms["mean"] = _milliseconds(
+        sum(latencies) / len(latencies) if latencies else None
+    )
+    latency_ms["max"] = _milliseconds(latencies[-1] if latencies else None)
+
+    return {
+        "scenario": scenario,
+        "table_size": table_size,
+        "concurrency": concurrency,
+        "requests": len(latencies) + measurement["errors"],
+        "errors": measurement["errors"],
+        "requests_per_second": round(len(latencies) / measurement["seconds"], 1),
+        "latency_ms": latency_ms,
+    }
+
+
+def result_key(result):
+    """
+    Identify the benchmark a result entry belongs to.
+
+    Returns:
+        tuple: The scenario, table size and concurrency.
+    """
+    return result["scenario"], result["table_size"], result["concurrency"]
+
+
+def compare_results(results, baseline, threshold, metric="p95"):
+    """
+    Compare result entries with those of a baseline run.
+
+    A benchmark regresses when its `metric` latency grew, or its throughput dropped, by more
+    than `threshold` relative to the baseline, or when it had errors the baseline did not have.
+    Benchmarks missing from the baseline are reported but never regress.
+
+    Args:
+        results (list): The result entries of the current run.
+        baseline (list): The result entries of the baseline run.
+        threshold (float): The tolerated relative change, e.g. 0.1 for 10%.
+        metric (str): The latency percentile to compare, e.g. "p95".
+
+    Returns:
+        list: One comparison per current result, with the baseline and current latency and
+        throughput, their relative changes and whether it "regressed".
+    """
+    baseline_by_key = {result_key(result): result for result in baseline}
+    comparisons = []
+
+    for result in results:
+        before = baseline_by_key.get(result_key(result))
+        comparison = {
+            "scenario": result["scenario"],
+            "table_size": result["table_size"],
+            "concurrency": result["concurrency"],
+            "metric": metric,
+            "latency_ms": result["latency_ms"][metric],
+            "requests_per_second": result["requests_per_second"],
+            "baseline_latency_ms": None,
+            "baseline_requests_per_second": None,
+            "latency_change": None,
+            "throughput_change": None,
+            "regressed": False,
+        }
+        if before is not None:
+            comparison["baseline_latency_ms"] = before["latency_ms"][metric]
+            comparison["baseline_requests_per_second"] = before["requests_per_second"]
+            comparison["latency_change"] = _relative_change(
+                before["latency_ms"][metric], result["latency_ms"][metric]
+            )
+            comparison["throughput_change"] = _relative_change(
+                before["requests_per_second"], result["requests_per_second"]
+            )
+            comparison["regressed"] = (
+                (comparison["latency_change"] or 0) > threshold
+                or (comparison["throughput_change"] or 0) < -threshold
+                or (result["errors"] > 0 and before["errors"] == 0)
+            )
+        comparisons.append(comparison)
+
+    return comparisons
+
+
+def load_results(path):
+    """
+    Read the result entries of a stored benchmark run.
+
+    Args:
+        path (str): The JSON file written by `benchmarks.run`.
+
+    Returns:
+        list: The result entries.
+    """
+    with open(path) as file:
+        return json.load(file)["results"]
+
+
+def format_results(results):
+    """
+    Render result entries as a plain-text table.
+
+    Args:
+        results (list): The result entries.
+
+    Returns:
+        str: The table.
+    """
+    lines = [
+        f"{'scenario':<14}{'rows':>10}{'conc':>6}{'req/s':>10}"
+        f"{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}"
+    ]
+    for result in results:
+        latency = result["latency_ms"]
+        lines.append(
+            f"{result['scenario']:<14}{result['table_size']:>10}{result['concurrency']:>6}"
+            f"{result['requests_per_second']:>10}{_cell(latency['p50'])}"
+            f"{_cell(latency['p95'])}{_cell(latency['p99'])}{result['errors']:>8}"
+        )
+    return "\n".join(lines)
+
+
+def format_comparisons(comparisons, threshold):
+    """
+    Render comparisons with a baseline as a plain-text table.
+
+    Args:
+        comparisons (list): The output of `compare_results`.
+        threshold (float): The tolerated relative change.
+
+    Returns:
+        str: The table, followed by a one-line verdict.
+    """
+    lines = [
+        f"{'scenario':<14}{'rows':>10}{'conc':>6}{'latency':>10}{'change':>9}"
+        f"{'req/s':>10}{'change':>9}  verdict"
+    ]
+    for comparison in comparisons:
+        if comparison["baseline_latency_ms"] is None:
+            verdict = "new"
+        else:
+            verdict = "REGRESSED" if comparison["regressed"] else "ok"
+        lines.append(
+            f"{comparison['scenario']:<14}{comparison['table_size']:>10}"
+            f"{comparison['concurrency']:>6}{_cell(comparison['latency_ms'])}"
+            f"{_percent(comparison['latency_change']):>9}"
+            f"{comparison['requests_per_second']:>10}"
+            f"{_percent(comparison['throughput_change']):>9}  {verdict}"
+        )
+
+    regressions = sum(comparison["regressed"] for comparison in comparisons)
+    lines.append(
+        f"{regressions} regression(s) beyond {threshold:.0%} "
+        f"({comparisons[0]['metric'] if comparisons else 'p95'} latency and throughput)"
+    )
+    return "\n".join(lines)
+
+
+def _milliseconds(seconds):
+    return round(seconds * 1000, 3) if seconds is not None else None
+
+
+def _relative_change(before, after):
+    if not before or after is None:
+        return None
+    return round((after - before) / before, 4)
+
+
+def _cell(value):
+    return f"{value:>10.2f}" if value is not None else f"{'-':>10}"
+
+
+def _percent(value):
+    return f"{value:+.1%}" if value is not None else "-"
@@ -0,0 +1,297 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+    This command benchmarks the users endpoints against a local Postgres database
+
+    Unless --url is given, the API is started with uvicorn on a free port, with the photo service
+    replaced by a local stub. Users are loaded into DATABASE_URL directly, so point it at a
+    throwaway database.
+
+    Usage (from the app directory):
+        python -m benchmarks.run --table-sizes 1000,100000 --concurrency 1,16 --output current.json
+        python -m benchmarks.run --baseline baseline.json --threshold 0.1
+"""
+import argparse
+import json
+import os
+import platform
+import secrets
+import subprocess
+import sys
+import tempfile
+from datetime import datetime, timezone
+
+from benchmarks.fixtures import (
+    APP_DIRECTORY,
+    ApiServer,
+    BenchmarkTable,
+    PhotoStub,
+    wait_for_background_work,
+)
+from benchmarks.load import run_load
+from benchmarks.report import (
+    PERCENTILES,
+    compare_results,
+    format_comparisons,
+    format_results,
+    load_results,
+    summarize,
+)
+from benchmarks.scenarios import SCENARIOS
+from database.engine import dispose_engine, init_engine
+
+# Server settings recorded with the results, as they change what is being measured
+RECORDED_SETTINGS = (
+    "DATABASE_ASYNC",
+    "DATABASE_POOL_SIZE",
+    "DATABASE_POOL_MAX_OVERFLOW",
+    "USER_COUNT_STRATEGY",
+    "READ_CACHE_ENABLED",
+    "PHOTO_STORAGE",
+    "PHOTO_PROCESS_WORKERS",
+)
+
+
+def integer_list(value):
+    """
+    Parse a comma separated list of positive integers.
+    """
+    try:
+        numbers = [int(item) for item in value.split(",") if item.strip()]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected comma separated integers: {value}")
+    if not numbers or min(numbers) < 1:
+        raise argparse.ArgumentTypeError(f"expected positive integers: {value}")
+    return numbers
+
+
+def scenario_list(value):
+    """
+    Parse a comma separated list of scenario names.
+    """
+    names = [item.strip() for item in value.split(",") if item.strip()]
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown or not names:
+        raise argparse.ArgumentTypeError(
+            f"unknown scenario(s) {', '.join(unknown)}; choose from {', '.join(SCENARIOS)}"
+        )
+    return names
+
+
+def parse_arguments(argv=None):
+    """
+    Parse the command line arguments.
+
+    Args:
+        argv (list, optional): The arguments to parse, defaults to sys.argv.
+
+    Returns:
+        Namespace: The parsed arguments.
+    """
+    parser = argparse.ArgumentParser(description="Benchmark the users endpoints")
+    parser.add_argument(
+        "--scenarios",
+        type=scenario_list,
+        default=list(SCENARIOS),
+        help=f"Comma separated scenarios to run (default: {','.join(SCENARIOS)})",
+    )
+    parser.add_argument(
+        "--table-sizes",
+        type=integer_list,
+        default=[1000, 100000],
+        help="Comma separated numbers of users to benchmark with (default: 1000,100000)",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=integer_list,
+        default=[1, 16],
+        help="Comma separated numbers of requests in flight (default: 1,16)",
+    )
+    parser.add_argument(
+        "--requests",
+        type=int,
+        default=500,
+        help="Measured requests per scenario, table size and concurrency (default: 500)",
+    )
+    parser.add_argument(
+        "--warmup",
+        type=int,
+        default=50,
+        help="Unmeasured requests sent before each measurement (default: 50)",
+    )
+    parser.add_argument(
+        "--page-size", type=int, default=10, help="Page size of list requests"
+    )
+    parser.add_argument(
+        "--url",
+        help="Benchmark an API that is already running at this URL instead of starting one",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="uvicorn worker processes of the started API (default: 1)",
+    )
+    parser.add_argument(
+        "--output", help="Write the results as JSON to this file instead of stdout"
+    )
+    parser.add_argument("--baseline", help="Compare with the results in this file")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="Tolerated relative slowdown against the baseline (default: 0.1)",
+    )
+    parser.add_argument(
+        "--metric",
+        choices=[f"p{percent}" for percent in PERCENTILES],
+        default="p95",
+        help="Latency percentile compared with the baseline (default: p95)",
+    )
+    return parser.parse_args(argv)
+
+
+def run_benchmarks(arguments, base_url, table):
+    """
+    Run every selected scenario at every table size and concurrency.
+
+    Table sizes are run in ascending order, topping the table up in between. Each measurement
+    follows a warmup and starts once the server has finished its background photo work.
+
+    Args:
+        arguments (Namespace): The parsed arguments.
+        base_url (str): The base URL of the API.
+        table (BenchmarkTable): The users table under test.
+
+    Returns:
+        list: The result entries.
+    """
+    scenarios = [
+        SCENARIOS[name](base_url, table, arguments.page_size)
+        for name in arguments.scenarios
+    ]
+    results = []
+
+    for table_size in sorted(arguments.table_sizes):
+        inserted = table.fill(table_size, progress=report_fill)
+        print(f"Table holds {table_size}+ users ({inserted} added)", file=sys.stderr)
+
+        for concurrency in arguments.concurrency:
+            for scenario in scenarios:
+                scenario.prepare(arguments.warmup + arguments.requests)
+                run_load(scenario.request, arguments.warmup, concurrency)
+                wait_for_background_work(base_url)
+                measurement = run_load(
+                    lambda session, index: scenario.request(
+                        session, arguments.warmup + index
+                    ),
+                    arguments.requests,
+                    concurrency,
+                )
+
+                result = summarize(scenario.name, table_size, concurrency, measurement)
+                results.append(result)
+                print(format_results([result]).splitlines()[-1], file=sys.stderr)
+
+    return results
+
+
+def report_fill(inserted, missing):
+    """
+    Print the progress of a table fill to stderr.
+    """
+    print(f"  loaded {inserted}/{missing} users", file=sys.stderr)
+
+
+def describe_run(arguments):
+    """
+    Describe the environment of the run, to be stored along with its results.
+
+    Returns:
+        dict: The run time, code revision, interpreter, platform, arguments and server settings.
+    """
+    try:
+        revision = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=APP_DIRECTORY,
+            capture_output=True,
+            text=True,
+        ).stdout.strip()
+    except OSError:
+        revision = None
+
+    return {
+        "started_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "revision": revision or None,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "arguments": {
+            key: value
+            for key, value in vars(arguments).items()
+            if key not in ("output", "baseline")
+        },
+        "settings": {
+            name: os.environ[name] for name in RECORDED_SETTINGS if name in os.environ
+        },
+    }
+
+
+def main(argv=None):
+    """
+    Run the benchmarks, write their results and compare them with the baseline.
+
+    Returns:
+        int: The process exit code, 1 when a benchmark regressed against the baseline.
+    """
+    arguments = parse_arguments(argv)
+    run = describe_run(arguments)
+
+    init_engine()
+    stub, server = None, None
+    try:
+        if arguments.url:
+            base_url = arguments.url.rstrip("/")
+        else:
+            stub = PhotoStub()
+            stub.start()
+            log_descriptor, log_path = tempfile.mkstemp(
+                prefix="benchmark-server-", suffix=".log"
+            )
+            os.close(log_descriptor)
+            server = ApiServer(
+                arguments.workers, {"PROFILE_PHOTO_URL": stub.url}, log_path
+            )
+            print(f"Starting the API, logging to {log_path}", file=sys.stderr)
+            server.start()
+            base_url = server.url
+
+        results = run_benchmarks(
+            arguments, base_url, BenchmarkTable(secrets.token_hex(4))
+        )
+    finally:
+        if server is not None:
+            server.stop()
+        if stub is not None:
+            stub.stop()
+        dispose_engine()
+
+    document = json.dumps({"run": run, "results": results}, indent=2)
+    if arguments.output:
+        with open(arguments.output, "w") as file:
+            file.write(document + "\n")
+    else:
+        print(document)
+    print(format_results(results), file=sys.stderr)
+
+    if not arguments.baseline:
+        return 0
+
+    comparisons = compare_results(
+        results, load_results(arguments.baseline), arguments.threshold, arguments.metric
+    )
+    print(format_comparisons(comparisons, arguments.threshold), file=sys.stderr)
+    return 1 if any(comparison["regressed"] for comparison in comparisons) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
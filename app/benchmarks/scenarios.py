@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+    This file defines the requests each benchmark scenario sends to the users endpoints
+"""
+import itertools
+from abc import ABC, abstractmethod
+
+
+class Scenario(ABC):
+    """
+    A kind of request to benchmark.
+
+    `prepare` is called once before the measured requests, outside of the measurement, to set up
+    whatever rows the requests work on. `request` then sends the numbered request.
+
+    Attributes:
+        name (str): The name the scenario is selected and reported by.
+        base_url (str): The base URL of the API.
+        table (BenchmarkTable): The users table under test.
+        page_size (int): The page size of list requests.
+    """
+
+    name = None
+
+    def __init__(self, base_url, table, page_size):
+        """
+        Initialize the scenario.
+
+        Args:
+            base_url (str): The base URL of the API.
+            table (BenchmarkTable): The users table under test.
+            page_size (int): The page size of list requests.
+        """
+        self.base_url = base_url
+        self.table = table
+        self.page_size = page_size
+        self._serial = itertools.count()
+
+    def prepare(self, total):
+        """
+        Set up the rows needed by `total` requests.
+
+        Args:
+            total (int): The number of requests that will be sent.
+        """
+
+    @abstractmethod
+    def request(self, session, index):
+        """
+        Send one request.
+
+        Args:
+            session (Session): The HTTP session of the calling thread.
+            index (int): The number of the request, from 0 to `total - 1`.
+
+        Returns:
+            int: The HTTP status code.
+        """
+
+    def user_payload(self):
+        """
+        Build a valid user body with an email unique to the run.
+        """
+        serial = next(self._serial)
+        return {
+            "first_name": "Bench",
+            "last_name": self.name.title(),
+            "email": f"bench-{self.table.token}-{self.name}-{serial}@example.com",
+            "phone_number": f"+1555{serial % 10000000:07d}",
+        }
+
+
+class CreateUsers(Scenario):
+    """
+    Creates users one at a time through POST /users/.
+    """
+
+    name = "create"
+
+    def request(self, session, index):
+        payload = self.user_payload()
+        return session.post(f"{self.base_url}/users/", json=payload).status_code
+
+
+class ListShallowPages(Scenario):
+    """
+    Reads the first pages of the user list, with counts, through GET /users/.
+    """
+
+    name = "list_shallow"
+    pages = 10
+
+    def request(self, session, index):
+        params = {"page": index % self.pages + 1, "page_size": self.page_size}
+        return session.get(f"{self.base_url}/users/", params=params).status_code
+
+
+class ListDeepPages(Scenario):
+    """
+    Reads pages near the end of the user list, with counts, through GET /users/.
+    """
+
+    name = "list_deep"
+    pages = 10
+
+    def prepare(self, total):
+        self.last_page = max(self.table.count() // self.page_size, 1)
+
+    def request(self, session, index):
+        page = max(self.last_page - index % self.pages, 1)
+        params = {"page": page, "page_size": self.page_size}
+        return session.get(f"{self.base_url}/users/", params=params).status_code
+
+
+class UpdateUsers(Scenario):
+    """
+    Updates random existing users through PUT /users/{id}.
+    """
+
+    name = "update"
+
+    def prepare(self, total):
+        self.user_ids = self.table.sample_ids(total)
+
+    def request(self, session, index):
+        user_id = self.user_ids[index % len(self.user_ids)]
+        payload = self.user_payload()
+        return session.put(f"{self.base_url}/users/{user_id}", json=payload).status_code
+
+
+class DeleteUsers(Scenario):
+    """
+    Deletes users, inserted beforehand for the purpose, through DELETE /users/{id}.
+    """
+
+    name = "delete"
+
+    def prepare(self, total):
+        self.user_ids = self.table.insert("delete", total)
+
+    def request(self, session, index):
+        user_id = self.user_ids[index]
+        return session.delete(f"{self.base_url}/users/{user_id}").status_code
+
+
+SCENARIOS = {
+    scenario.name: scenario
+    for scenario in (
+        CreateUsers,
+        ListShallowPages,
+        ListDeepPages,
+        UpdateUsers,
+        DeleteUsers,
+    )
+}
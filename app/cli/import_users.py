@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+    This command imports users from a local CSV or NDJSON file
+
+    Usage (from the app directory):
+        python -m cli.import_users users.csv
+        python -m cli.import_users users.ndjson --on-conflict update
+"""
+import argparse
+import json
+import sys
+
+from database.connection_context import ConnectionContext
+from database.engine import dispose_engine, init_engine
+from services.user_import import (
+    IMPORT_CONFLICT_MODES,
+    IMPORT_FORMATS,
+    detect_import_format,
+    import_users,
+)
+
+
+def parse_arguments(argv=None):
+    """
+    Parse the command line arguments.
+
+    Args:
+        argv (list, optional): The arguments to parse, defaults to sys.argv.
+
+    Returns:
+        Namespace: The parsed arguments.
+    """
+    parser = argparse.ArgumentParser(
+        description="Import users from a CSV or NDJSON file"
+    )
+    parser.add_argument("path", help="The file to import")
+    parser.add_argument(
+        "--format",
+        choices=IMPORT_FORMATS,
+        help="The file format, inferred from the file extension when omitted",
+    )
+    parser.add_argument(
+        "--on-conflict",
+        choices=IMPORT_CONFLICT_MODES,
+        default="skip",
+        help="What to do with users whose email already exists (default: skip)",
+    )
+    return parser.parse_args(argv)
+
+
+def report_progress(summary):
+    """
+    Print the running import summary to stderr.
+
+    Args:
+        summary (dict): The running import summary.
+    """
+    print(
+        f"{summary['rows_read']} rows read, {summary['inserted']} inserted, "
+        f"{summary['updated']} updated, {summary['skipped']} skipped, "
+        f"{summary['rows_invalid']} invalid ({summary['rows_per_second']} rows/s)",
+        file=sys.stderr,
+    )
+
+
+def main(argv=None):
+    """
+    Run the import and print the final summary as JSON.
+
+    Returns:
+        int: The process exit code.
+    """
+    arguments = parse_arguments(argv)
+    file_format = arguments.format or detect_import_format(arguments.path)
+    if file_format is None:
+        print("Could not determine the file format, pass --format", file=sys.stderr)
+        return 2
+
+    init_engine()
+    try:
+        with open(arguments.path, encoding="utf-8", newline="") as stream:
+            with ConnectionContext() as connection:
+                summary = import_users(
+                    connection,
+                    stream,
+                    file_format,
+                    on_conflict=arguments.on_conflict,
+                    progress=report_progress,
+                )
+    finally:
+        dispose_engine()
+
+    print(json.dumps(summary, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+    This command fills the database with synthetic users
+
+    Usage (from the app directory):
+        python -m cli.seed_users 1000000
+        python -m cli.seed_users 10000000 --seed 7 --photos --defer-indexes
+"""
+import argparse
+import json
+import sys
+
+from database.connection_context import ConnectionContext
+from database.engine import dispose_engine, init_engine
+from services.synthetic_users import seed_users
+
+
+def parse_arguments(argv=None):
+    """
+    Parse the command line arguments.
+
+    Args:
+        argv (list, optional): The arguments to parse, defaults to sys.argv.
+
+    Returns:
+        Namespace: The parsed arguments.
+    """
+    parser = argparse.ArgumentParser(description="Generate synthetic users")
+    parser.add_argument("count", type=int, help="The number of users to create")
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=0,
+        help="The random seed; the same seed yields the same users (default: 0)",
+    )
+    parser.add_argument(
+        "--photos",
+        action="store_true",
+        help="Give every user one of a few small placeholder photos",
+    )
+    parser.add_argument(
+        "--defer-indexes",
+        action="store_true",
+        help="Drop the search indexes while loading and rebuild them at the end; "
+        "much faster for large loads, but searches scan the table in the meantime",
+    )
+    return parser.parse_args(argv)
+
+
+def report_progress(summary, total):
+    """
+    Print the running seeding progress to stderr.
+
+    Args:
+        summary (dict): The running seeding summary.
+        total (int): The number of users being created.
+    """
+    remaining = total - summary["inserted"]
+    eta = remaining / summary["rows_per_second"] if summary["rows_per_second"] else 0
+    print(
+        f"{summary['inserted']}/{total} users "
+        f"({summary['inserted'] / total:.0%}, {summary['rows_per_second']:.0f} rows/s, "
+        f"{eta:.0f}s left)",
+        file=sys.stderr,
+    )
+
+
+def main(argv=None):
+    """
+    Seed the users and print the final summary as JSON.
+
+    Returns:
+        int: The process exit code.
+    """
+    arguments = parse_arguments(argv)
+    if arguments.count < 1:
+        print("The number of users must be positive", file=sys.stderr)
+        return 2
+
+    init_engine()
+    try:
+        with ConnectionContext() as connection:
+            summary = seed_users(
+                connection,
+                arguments.count,
+                seed=arguments.seed,
+                photos=arguments.photos,
+                defer_indexes=arguments.defer_indexes,
+                progress=lambda summary: report_progress(summary, arguments.count),
+            )
+    finally:
+        dispose_engine()
+
+    print(json.dumps(summary, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
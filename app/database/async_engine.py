@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+    This file owns the process-wide asyncio engine (asyncpg driver) used when DATABASE_ASYNC is enabled
+"""
+from logging import getLogger
+from time import perf_counter
+
+from database.engine import (
+    DATABASE_ECHO,
+    POOL_MAX_OVERFLOW,
+    POOL_PRE_PING,
+    POOL_RECYCLE_SECONDS,
+    POOL_SIZE,
+    POOL_TIMEOUT_SECONDS,
+)
+from database.pool_statistics import PoolStatistics
+from database.slow_queries import slow_query_log
+from database.statement_metrics import attach_statement_metrics
+from settings import env_bool, env_int, env_str
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import create_async_engine
+
+logger = getLogger(__name__)
+
+DATABASE_ASYNC = env_bool("DATABASE_ASYNC", False)
+PREPARED_STATEMENT_CACHE_SIZE = env_int("DATABASE_PREPARED_STATEMENT_CACHE_SIZE", 500)
+
+async_pool_statistics = PoolStatistics()
+_async_engine = None
+
+
+def get_async_database_url():
+    """
+    Build the asyncpg URL for the database.
+
+    DATABASE_ASYNC_URL is used as-is when set. Otherwise DATABASE_URL is reused with its driver
+    switched to asyncpg and the prepared statement cache sized by
+    DATABASE_PREPARED_STATEMENT_CACHE_SIZE, so repeated queries skip parsing and planning.
+
+    Returns:
+        URL: The SQLAlchemy URL for the asyncio engine.
+    """
+    async_url = env_str("DATABASE_ASYNC_URL")
+    if async_url:
+        return make_url(async_url)
+
+    return to_asyncpg_url(env_str("DATABASE_URL"))
+
+
+def to_asyncpg_url(url):
+    """
+    Switch a database URL to the asyncpg driver, with the prepared statement cache sized by
+    DATABASE_PREPARED_STATEMENT_CACHE_SIZE.
+
+    Args:
+        url (str): A PostgreSQL URL for any driver.
+
+    Returns:
+        URL: The SQLAlchemy URL for an asyncio engine.
+    """
+    return (
+        make_url(url)
+        .set(drivername="postgresql+asyncpg")
+        .update_query_dict(
+            {"prepared_statement_cache_size": str(PREPARED_STATEMENT_CACHE_SIZE)}
+        )
+    )
+
+
+def init_async_engine():
+    """
+    Build the shared asyncio engine for this worker process if it does not exist yet.
+
+    The engine uses the same pool settings as the synchronous engine (see database.engine).
+
+    Returns:
+        AsyncEngine: The shared SQLAlchemy asyncio engine.
+    """
+    global _async_engine
+
+    if _async_engine is None:
+        _async_engine = create_async_engine(
+            get_async_database_url(),
+            pool_size=POOL_SIZE,
+            max_overflow=POOL_MAX_OVERFLOW,
+            pool_pre_ping=POOL_PRE_PING,
+            pool_recycle=POOL_RECYCLE_SECONDS,
+            pool_timeout=POOL_TIMEOUT_SECONDS,
+            echo=DATABASE_ECHO,
+        )
+        async_pool_statistics.attach(_async_engine.sync_engine)
+        attach_statement_metrics(_async_engine.sync_engine)
+        slow_query_log.attach(_async_engine.sync_engine)
+        logger.info("Async database engine ready")
+
+    return _async_engine
+
+
+def get_async_engine():
+    """
+    Return the shared asyncio engine, building it on first use.
+
+    Returns:
+        AsyncEngine: The shared SQLAlchemy asyncio engine.
+    """
+    return _async_engine if _async_engine is not None else init_async_engine()
+
+
+async def dispose_async_engine():
+    """
+    Close every pooled asyncpg connection and forget the shared engine.
+    """
+    global _async_engine
+
+    if _async_engine is not None:
+        await _async_engine.dispose()
+        _async_engine = None
+
+
+def get_async_pool_status():
+    """
+    Describe the current state of the asyncio connection pool.
+
+    Returns:
+        dict: Pool configuration, live usage and the collected checkout/wait statistics.
+    """
+    return async_pool_statistics.snapshot(
+        get_async_engine().sync_engine, POOL_MAX_OVERFLOW
+    )
+
+
+async def get_async_connection():
+    """
+    Async generator function to yield a connection from the shared asyncio engine.
+
+    Yields:
+        AsyncConnection: A connection that is returned to the pool after use.
+    """
+    started = perf_counter()
+    try:
+        connection = await get_async_engine().connect()
+    except PoolTimeoutError:
+        async_pool_statistics.record_timeout()
+        raise
+    async_pool_statistics.record_wait(perf_counter() - started)
+
+    try:
+        yield connection
+    finally:
+        await connection.close()
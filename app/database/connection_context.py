@@ -3,43 +3,53 @@
 """
     This file provides utility functionality for stablishing and managing a database connection
 """
-import os
+from time import perf_counter
 
-from sqlalchemy import create_engine
+from database.engine import get_engine
+from database.pool_statistics import pool_statistics
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
 
 
 class ConnectionContext:
     """
     A context manager class for handling database connections.
 
-    This class uses a context management protocol to establish and close database
-    connections automatically using the connection details from the environment variables.
+    This class uses a context management protocol to check a connection out of the shared,
+    process-wide connection pool and return it automatically afterwards.
 
     Attributes:
-        engine (Engine): A SQLAlchemy engine instance created from the database URL.
+        engine (Engine): The shared SQLAlchemy engine whose pool connections are taken from.
         connection (Connection): A connection object to interact with the database.
     """
 
     def __init__(self):
         """
-        Initializes the ConnectionContext with a SQLAlchemy engine.
+        Initializes the ConnectionContext with the shared SQLAlchemy engine.
         """
-        self.engine = create_engine(os.getenv("DATABASE_URL"))
+        self.engine = get_engine()
         self.connection = None
 
     def __enter__(self):
         """
-        Opens a new database connection when entering the context.
+        Checks a connection out of the pool when entering the context.
+
+        The time spent waiting for the pool is recorded so that saturation can be observed.
 
         Returns:
             Connection: A SQLAlchemy connection object.
         """
-        self.connection = self.engine.connect()
+        started = perf_counter()
+        try:
+            self.connection = self.engine.connect()
+        except PoolTimeoutError:
+            pool_statistics.record_timeout()
+            raise
+        pool_statistics.record_wait(perf_counter() - started)
         return self.connection
 
     def __exit__(self, type, value, traceback):
         """
-        Closes the database connection when exiting the context.
+        Returns the connection to the pool when exiting the context.
 
         Args:
             type (Type): The type of exception raised (if any).
@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+    This file owns the process-wide SQLAlchemy engine and the connection pool behind it
+"""
+import threading
+from logging import getLogger
+
+from database.pool_statistics import pool_statistics
+from database.slow_queries import slow_query_log
+from database.statement_metrics import attach_statement_metrics
+from settings import env_bool, env_float, env_int, env_str
+from sqlalchemy import create_engine
+
+logger = getLogger(__name__)
+
+POOL_SIZE = env_int("DATABASE_POOL_SIZE", 10)
+POOL_MAX_OVERFLOW = env_int("DATABASE_POOL_MAX_OVERFLOW", 10)
+POOL_PRE_PING = env_bool("DATABASE_POOL_PRE_PING", True)
+POOL_RECYCLE_SECONDS = env_int("DATABASE_POOL_RECYCLE", 1800)
+POOL_TIMEOUT_SECONDS = env_float("DATABASE_POOL_TIMEOUT", 5.0)
+DATABASE_ECHO = env_bool("DATABASE_ECHO", False)
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def init_engine():
+    """
+    Build the shared engine for this worker process if it does not exist yet.
+
+    The engine is created once per process (uvicorn runs the startup hook in every worker
+    after forking) so that all requests share a single connection pool instead of paying a
+    TCP and authentication handshake per request. Pool sizing is read from the environment:
+
+        - DATABASE_POOL_SIZE: Connections kept open in the pool (default 10).
+        - DATABASE_POOL_MAX_OVERFLOW: Extra connections allowed under burst load (default 10).
+        - DATABASE_POOL_PRE_PING: Test connections before handing them out (default true).
+        - DATABASE_POOL_RECYCLE: Seconds after which a connection is replaced (default 1800).
+        - DATABASE_POOL_TIMEOUT: Seconds to wait for a free connection before failing (default 5).
+        - DATABASE_ECHO: Log every SQL statement, for debugging only (default false).
+
+    Returns:
+        Engine: The shared SQLAlchemy engine.
+    """
+    global _engine
+
+    with _engine_lock:
+        if _engine is None:
+            _engine = create_engine(
+                env_str("DATABASE_URL"),
+                pool_size=POOL_SIZE,
+                max_overflow=POOL_MAX_OVERFLOW,
+                pool_pre_ping=POOL_PRE_PING,
+                pool_recycle=POOL_RECYCLE_SECONDS,
+                pool_timeout=POOL_TIMEOUT_SECONDS,
+                echo=DATABASE_ECHO,
+            )
+            pool_statistics.attach(_engine)
+            attach_statement_metrics(_engine)
+            slow_query_log.attach(_engine)
+            logger.info(
+                f"Database engine ready (pool_size={POOL_SIZE}, max_overflow={POOL_MAX_OVERFLOW})"
+            )
+
+    return _engine
+
+
+def get_engine():
+    """
+    Return the shared engine, building it on first use (e.g. from scripts that skip startup).
+
+    Returns:
+        Engine: The shared SQLAlchemy engine.
+    """
+    return _engine if _engine is not None else init_engine()
+
+
+def dispose_engine():
+    """
+    Close every pooled connection and forget the shared engine.
+    """
+    global _engine
+
+    with _engine_lock:
+        if _engine is not None:
+            _engine.dispose()
+            _engine = None
+
+
+def get_pool_status():
+    """
+    Describe the current state of the shared connection pool.
+
+    Returns:
+        dict: Pool configuration, live usage and the collected checkout/wait statistics.
+    """
+    status = pool_statistics.snapshot(get_engine(), POOL_MAX_OVERFLOW)
+    status["pre_ping"] = POOL_PRE_PING
+    status["recycle_seconds"] = POOL_RECYCLE_SECONDS
+    status["timeout_seconds"] = POOL_TIMEOUT_SECONDS
+    return status
@@ -3,39 +3,488 @@
 """
     This file focuses on the creation of tables and seed data in the event that our database is empty
 """
-import os
+from contextlib import contextmanager
 from logging import getLogger
+from time import monotonic, sleep
 
-from database.tables import Base, User
-from sqlalchemy import create_engine
+from database.engine import get_engine
+from database.search_indexes import expected_indexes, missing_indexes
+from database.tables import (
+    Base,
+    ProfilePhotoRendition,
+    User,
+    UserChange,
+)
+from services.blob_store import blob_store
+from services.change_feed import (
+    CHANGE_FEED_CHANNEL,
+    CHANGE_FEED_LOCK,
+    CHANGE_FEED_SETTING,
+)
+from services.synthetic_users import seed_users as seed_synthetic_users
+from settings import env_bool, env_float, env_int
+from sqlalchemy import (
+    Column,
+    DateTime,
+    Integer,
+    MetaData,
+    String,
+    Table,
+    exists,
+    func,
+    insert,
+    inspect,
+    select,
+    text,
+)
+from sqlalchemy.exc import DBAPIError
 from sqlalchemy.orm import Session
 
-engine = create_engine(os.getenv("DATABASE_URL"), echo=True)
 logger = getLogger(__name__)
 
+# Seed an empty database with this many synthetic users instead of the few predefined ones
+SEED_USERS = env_int("SEED_USERS", 0)
+SEED_USERS_SEED = env_int("SEED_USERS_SEED", 0)
+SEED_USERS_PHOTOS = env_bool("SEED_USERS_PHOTOS", False)
+PHOTO_MIGRATION_BATCH_SIZE = env_int("PHOTO_MIGRATION_BATCH_SIZE", 500)
+MIGRATION_LOCK_TIMEOUT = env_float("MIGRATION_LOCK_TIMEOUT", 600.0)
+MIGRATION_LOCK_POLL_INTERVAL = 0.5
+# Arbitrary application-wide key of the advisory lock serializing migrations and seeding
+MIGRATION_LOCK = 72340001
 
-def create_tables():
+# Kept apart from the models' metadata so that `create_all` never manages it
+schema_migrations = Table(
+    "schema_migrations",
+    MetaData(),
+    Column("version", Integer, primary_key=True),
+    Column("name", String(100), nullable=False),
+    Column(
+        "applied_at", DateTime(timezone=True), nullable=False, server_default=func.now()
+    ),
+)
+
+
+def initialize_database():
+    """
+    Bring the database schema up to date and seed it if it is empty.
+
+    Every worker process calls this on startup. Once the schema is at the latest version,
+    users exist and the indexes of the users table are in place, that costs a few catalog and
+    index lookups and no lock, so workers after the first start right away. Otherwise the
+    pending migrations, the seeding and the rebuilding of missing indexes run under a Postgres
+    advisory lock: the first worker to get it does the work, the others wait and then find
+    nothing left to do.
+
+    Raises:
+        TimeoutError: If the lock is not acquired within MIGRATION_LOCK_TIMEOUT seconds.
+    """
+    engine = get_engine()
+    with engine.connect() as connection:
+        if (
+            not _pending_migrations(connection)
+            and _has_users(connection)
+            and not missing_indexes(connection)
+        ):
+            logger.info(
+                f"Database schema is at version {MIGRATIONS[-1][0]}, nothing to migrate."
+            )
+            return
+
+    with _migration_lock(engine):
+        run_migrations(engine)
+        seed_data(engine)
+        rebuild_missing_indexes(engine)
+
+
+def rebuild_missing_indexes(engine):
+    """
+    Build the indexes of the users table that are missing or invalid.
+
+    A seed with deferred indexes drops them for the duration of the load; if its process dies
+    before rebuilding them, the next startup does. Callers must hold the migration lock.
+
+    Args:
+        engine (Engine): The engine to build through.
+    """
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        missing = missing_indexes(connection)
+        if not missing:
+            return
+
+        logger.warning(f"Rebuilding missing indexes of users: {', '.join(missing)}")
+        statements = expected_indexes(connection, concurrently=True)
+        for name in missing:
+            connection.execute(text(f'DROP INDEX CONCURRENTLY IF EXISTS "{name}"'))
+            connection.execute(text(statements[name]))
+
+
+def run_migrations(engine):
+    """
+    Apply the migrations in MIGRATIONS that are not recorded in `schema_migrations` yet.
+
+    Transactional migrations are recorded in the transaction that applies them, so they are
+    either fully applied and recorded or not at all. The others (CREATE INDEX CONCURRENTLY,
+    batched data moves) commit as they go and are recorded once they complete; they must be
+    safe to run again after an interruption. Callers must hold the migration lock.
+
+    Args:
+        engine (Engine): The engine to migrate through.
+    """
+    with engine.begin() as connection:
+        schema_migrations.create(connection, checkfirst=True)
+
+    with engine.connect() as connection:
+        pending = _pending_migrations(connection)
+
+    for version, name, migrate, transactional in pending:
+        logger.info(f"Applying schema migration {version} ({name})...")
+        if transactional:
+            with engine.begin() as connection:
+                migrate(connection)
+                _record_migration(connection, version, name)
+        else:
+            with engine.connect() as connection:
+                migrate(connection)
+                connection.commit()
+            with engine.begin() as connection:
+                _record_migration(connection, version, name)
+
+
+def create_tables(connection):
     """
     Create database tables based on predefined SQLAlchemy Base metadata.
 
     This function utilizes the SQLAlchemy ORM's declarative base to reflect the schema
-    definitions onto the connected database. It should be called at the initial setup
-    phase of the application to ensure that the database schema is correctly set up.
+    definitions onto the connected database. Existing tables are left as they are.
+
+    Args:
+        connection (Connection): The connection to create the tables through.
+    """
+    Base.metadata.create_all(connection)
+
+
+def add_profile_photo_hash(connection):
+    """
+    Add `users.profile_photo_hash` to tables that predate it and backfill it from the stored photos.
+
+    Args:
+        connection (Connection): The connection to migrate through.
+    """
+    if _has_column(inspect(connection), User, "profile_photo_hash"):
+        return
+
+    connection.execute(
+        text(
+            "ALTER TABLE users ADD COLUMN IF NOT EXISTS profile_photo_hash VARCHAR(64)"
+        )
+    )
+    connection.execute(
+        text(
+            "UPDATE users SET profile_photo_hash = encode(sha256(profile_photo), 'hex') "
+            "WHERE profile_photo IS NOT NULL AND profile_photo_hash IS NULL"
+        )
+    )
+    logger.info("Added and backfilled users.profile_photo_hash.")
+
+
+def store_photo_blobs_externally(connection):
+    """
+    Keep TOAST from trying to compress photo blobs, which do not compress.
+
+    Args:
+        connection (Connection): The connection to migrate through.
+    """
+    connection.execute(
+        text("ALTER TABLE photo_blobs ALTER COLUMN data SET STORAGE EXTERNAL")
+    )
+
+
+def migrate_photos_to_blob_store(connection):
+    """
+    Move photos stored inline in `users.profile_photo` and `profile_photo_renditions.photo` into
+    the blob store, then drop those columns.
+
+    Rows are moved in batches of PHOTO_MIGRATION_BATCH_SIZE, one transaction each, so an
+    interrupted migration resumes where it stopped. The space held by the inline photos is
+    reclaimed by VACUUM.
+
+    Args:
+        connection (Connection): The connection to migrate through, committed batch by batch.
+    """
+    inspector = inspect(connection)
+    if _has_column(inspector, ProfilePhotoRendition, "photo"):
+        connection.execute(
+            text(
+                "ALTER TABLE profile_photo_renditions ALTER COLUMN photo DROP NOT NULL"
+            )
+        )
+        moved = _move_photos(
+            connection,
+            "profile_photo_renditions",
+            ("user_id", "size"),
+            "photo",
+            "photo_hash",
+        )
+        connection.execute(
+            text("ALTER TABLE profile_photo_renditions DROP COLUMN photo")
+        )
+        connection.commit()
+        logger.info(f"Moved {moved} photo renditions to the blob store.")
+
+    if _has_column(inspector, User, "profile_photo"):
+        moved = _move_photos(
+            connection, "users", ("id",), "profile_photo", "profile_photo_hash"
+        )
+        connection.execute(text("ALTER TABLE users DROP COLUMN profile_photo"))
+        connection.commit()
+        logger.info(f"Moved {moved} profile photos to the blob store.")
+        logger.info(f"Photo blob store: {blob_store.stats(connection)}")
+
+
+def _has_column(inspector, model, name):
+    """
+    Tell whether the table of a model has a column, which may no longer be declared on it.
+    """
+    return any(
+        column["name"] == name for column in inspector.get_columns(model.__tablename__)
+    )
+
+
+def _move_photos(connection, table, key_columns, photo_column, hash_column):
+    """
+    Move the inline photos of a table into the blob store, replacing them with their hashes.
+
+    Returns:
+        int: The number of photos moved.
+    """
+    keys = ", ".join(key_columns)
+    batch_query = text(
+        f"SELECT {keys}, {photo_column} AS photo FROM {table} "
+        f"WHERE {photo_column} IS NOT NULL LIMIT :batch_size"
+    )
+    update_query = text(
+        f"UPDATE {table} SET {photo_column} = NULL, {hash_column} = :photo_hash "
+        f"WHERE " + " AND ".join(f"{key} = :{key}" for key in key_columns)
+    )
 
-    Requires:
-        An already defined SQLAlchemy ORM `Base` with entity declarations and
-        a global `engine` object connected to the desired database.
+    moved = 0
+    while True:
+        rows = connection.execute(
+            batch_query, {"batch_size": PHOTO_MIGRATION_BATCH_SIZE}
+        ).all()
+        if not rows:
+            return moved
+
+        photo_hashes = blob_store.acquire(
+            connection, [bytes(row.photo) for row in rows]
+        )
+        connection.execute(
+            update_query,
+            [
+                {
+                    **{key: getattr(row, key) for key in key_columns},
+                    "photo_hash": photo_hash,
+                }
+                for row, photo_hash in zip(rows, photo_hashes)
+            ],
+        )
+        connection.commit()
+        moved += len(rows)
+
+
+def create_search_indexes(connection):
+    """
+    Create the indexes behind user search on tables that predate them.
+
+    The indexes declared on the `User` model are built with CREATE INDEX CONCURRENTLY, so
+    existing tables stay writable while they are built. When the pg_trgm extension is available,
+    a trigram index is also built for each searchable column so that substring matches do not
+    scan the table; without it, substring searches still work but fall back to a scan.
+
+    Args:
+        connection (Connection): The connection to migrate through, switched to autocommit as
+            CREATE INDEX CONCURRENTLY cannot run inside a transaction.
+    """
+    connection.execution_options(isolation_level="AUTOCOMMIT")
+    try:
+        connection.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+    except DBAPIError as e:
+        logger.warning(
+            f"pg_trgm is unavailable, substring search will not be indexed: {e}"
+        )
+
+    for statement in expected_indexes(connection, concurrently=True).values():
+        connection.execute(text(statement))
+
+
+def add_user_version(connection):
     """
-    Base.metadata.create_all(engine)
+    Add `users.version`, the row version behind optimistic concurrency, starting at 1.
 
+    A constant default lets Postgres add the NOT NULL column without rewriting the table.
 
-def seed_data():
+    Args:
+        connection (Connection): The connection to migrate through.
+    """
+    connection.execute(
+        text(
+            "ALTER TABLE users ADD COLUMN IF NOT EXISTS version INTEGER NOT NULL DEFAULT 1"
+        )
+    )
+
+
+# Records the rows changed by each statement on `users` in `user_changes` and notifies the
+# listeners of the change feed with the last sequence number. Writers hold the shared feed lock
+# from before they take sequence numbers until they commit, which lets the listeners tell a
+# writer still in flight from a rolled back one. Bulk loads opt out by setting the feed setting.
+PUBLISH_USER_CHANGES = f"""
+CREATE OR REPLACE FUNCTION publish_user_changes() RETURNS trigger
+LANGUAGE plpgsql AS $$
+DECLARE
+    last_seq BIGINT;
+BEGIN
+    IF current_setting('{CHANGE_FEED_SETTING}', true) = 'off' THEN
+        RETURN NULL;
+    END IF;
+
+    IF TG_OP = 'DELETE' THEN
+        PERFORM 1 FROM old_rows LIMIT 1;
+    ELSE
+        PERFORM 1 FROM new_rows LIMIT 1;
+    END IF;
+    IF NOT FOUND THEN
+        RETURN NULL;
+    END IF;
+
+    PERFORM pg_advisory_xact_lock_shared({CHANGE_FEED_LOCK});
+    IF TG_OP = 'DELETE' THEN
+        WITH recorded AS (
+            INSERT INTO user_changes (operation, user_id, version)
+            SELECT 'deleted', id, version FROM old_rows ORDER BY id
+            RETURNING seq
+        )
+        SELECT max(seq) INTO last_seq FROM recorded;
+    ELSE
+        WITH recorded AS (
+            INSERT INTO user_changes (operation, user_id, version)
+            SELECT CASE TG_OP WHEN 'INSERT' THEN 'created' ELSE 'updated' END, id, version
+            FROM new_rows ORDER BY id
+            RETURNING seq
+        )
+        SELECT max(seq) INTO last_seq FROM recorded;
+    END IF;
+
+    PERFORM pg_notify('{CHANGE_FEED_CHANNEL}', last_seq::text);
+    RETURN NULL;
+END
+$$
+"""
+
+USER_CHANGE_TRIGGERS = {
+    "users_publish_inserts": "AFTER INSERT ON users REFERENCING NEW TABLE AS new_rows",
+    "users_publish_updates": "AFTER UPDATE ON users REFERENCING NEW TABLE AS new_rows",
+    "users_publish_deletes": "AFTER DELETE ON users REFERENCING OLD TABLE AS old_rows",
+}
+
+
+def create_user_change_feed(connection):
+    """
+    Create `user_changes` and the statement-level triggers recording every write to `users` in it.
+
+    The triggers see all the rows changed by a statement at once through transition tables, so
+    a bulk update of a thousand users costs one INSERT ... SELECT and one notification rather
+    than a thousand of each.
+
+    Args:
+        connection (Connection): The connection to migrate through.
+    """
+    UserChange.__table__.create(connection, checkfirst=True)
+    connection.execute(text(PUBLISH_USER_CHANGES))
+    for name, timing in USER_CHANGE_TRIGGERS.items():
+        connection.execute(text(f"DROP TRIGGER IF EXISTS {name} ON users"))
+        connection.execute(
+            text(
+                f"CREATE TRIGGER {name} {timing} "
+                "FOR EACH STATEMENT EXECUTE FUNCTION publish_user_changes()"
+            )
+        )
+
+
+# Ordered (version, name, function, transactional) steps; append new ones, never renumber.
+# The first five reproduce the upgrades made before the schema was versioned, so they check
+# the current state first and do nothing on databases that already had them.
+MIGRATIONS = [
+    (1, "create_tables", create_tables, True),
+    (2, "add_profile_photo_hash", add_profile_photo_hash, True),
+    (3, "store_photo_blobs_externally", store_photo_blobs_externally, True),
+    (4, "migrate_photos_to_blob_store", migrate_photos_to_blob_store, False),
+    (5, "create_search_indexes", create_search_indexes, False),
+    (6, "add_user_version", add_user_version, True),
+    (7, "create_user_change_feed", create_user_change_feed, True),
+]
+
+
+def _pending_migrations(connection):
+    """
+    List the migrations not recorded in `schema_migrations`, in order.
+    """
+    if connection.scalar(text("SELECT to_regclass('schema_migrations')")) is None:
+        return list(MIGRATIONS)
+
+    applied = set(connection.scalars(select(schema_migrations.c.version)))
+    return [migration for migration in MIGRATIONS if migration[0] not in applied]
+
+
+def _record_migration(connection, version, name):
+    """
+    Record a migration as applied.
+    """
+    connection.execute(insert(schema_migrations).values(version=version, name=name))
+
+
+def _has_users(connection):
+    """
+    Tell whether the users table holds at least one row, reading a single index entry at most.
+    """
+    return connection.scalar(select(exists().select_from(User)))
+
+
+@contextmanager
+def _migration_lock(engine):
+    """
+    Hold the migration advisory lock for the duration of the block.
+
+    The lock is polled with pg_try_advisory_lock from an autocommit connection rather than
+    waited for with pg_advisory_lock: a worker blocked inside a statement keeps a snapshot
+    open, which CREATE INDEX CONCURRENTLY run by the lock holder would wait for in turn.
+    """
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        deadline = monotonic() + MIGRATION_LOCK_TIMEOUT
+        while not connection.scalar(select(func.pg_try_advisory_lock(MIGRATION_LOCK))):
+            if monotonic() >= deadline:
+                raise TimeoutError(
+                    f"Could not acquire the migration lock within {MIGRATION_LOCK_TIMEOUT}s"
+                )
+            sleep(MIGRATION_LOCK_POLL_INTERVAL)
+
+        try:
+            yield
+        finally:
+            connection.execute(select(func.pg_advisory_unlock(MIGRATION_LOCK)))
+
+
+def seed_data(engine):
     """
     Seed the database with initial data if no data exists.
 
     This function checks for existing user data and seeds the database with predefined
     user entries if the user table is empty. It is intended to be used during the initial
-    setup phase or when resetting the database to a default state.
+    setup phase or when resetting the database to a default state. When SEED_USERS is set,
+    that many synthetic users are generated instead, see `services.synthetic_users`.
+
+    Args:
+        engine (Engine): The engine to seed through. Callers must hold the migration lock, so
+            that two workers cannot both find the table empty.
 
     Side Effects:
         - Adds multiple `User` entries to the database if it is initially empty.
@@ -46,67 +495,78 @@ def seed_data():
         Logs errors to a logger and rolls back the session if an error occurs during
         the database transactions.
     """
-    try:
-        with Session(engine) as session:
-            existing_users = session.query(User).all()
-
-            if not existing_users:
-                seed_users = [
-                    User(
-                        first_name="Alex",
-                        last_name="Taylor",
-                        email="alex.taylor@example.com",
-                        phone_number="1234567890",
-                    ),
-                    User(
-                        first_name="Jordan",
-                        last_name="Lee",
-                        email="jordan.lee@example.com",
-                        phone_number="0987654321",
-                    ),
-                    User(
-                        first_name="Casey",
-                        last_name="Morgan",
-                        email="casey.morgan@example.com",
-                        phone_number="1122334455",
-                    ),
-                    User(
-                        first_name="Taylor",
-                        last_name="Parker",
-                        email="taylor.parker@example.com",
-                        phone_number="2233445566",
-                    ),
-                    User(
-                        first_name="Morgan",
-                        last_name="Reed",
-                        email="morgan.reed@example.com",
-                        phone_number="3344556677",
-                    ),
-                    User(
-                        first_name="Riley",
-                        last_name="Adams",
-                        email="riley.adams@example.com",
-                        phone_number="4455667788",
-                    ),
-                    User(
-                        first_name="Cameron",
-                        last_name="Blake",
-                        email="cameron.blake@example.com",
-                        phone_number="5566778899",
-                    ),
-                    User(
-                        first_name="Quinn",
-                        last_name="Hayes",
-                        email="quinn.hayes@example.com",
-                        phone_number="6677889900",
-                    ),
-                ]
-
-                session.add_all(seed_users)
-                session.commit()
-                logger.info("Database seeded successfully.")
-            else:
-                logger.info("Database already has data. Skipping seeding.")
-    except Exception as e:
-        logger.error(f"Error seeding the database: {str(e)}")
-        session.rollback()
+    with engine.connect() as connection:
+        if _has_users(connection):
+            logger.info("Database already has data. Skipping seeding.")
+            return
+
+        if SEED_USERS > 0:
+            connection.rollback()
+            seed_synthetic_users(
+                connection,
+                SEED_USERS,
+                seed=SEED_USERS_SEED,
+                photos=SEED_USERS_PHOTOS,
+                defer_indexes=True,
+            )
+            return
+
+    with Session(engine) as session:
+        try:
+            seed_users = [
+                User(
+                    first_name="Alex",
+                    last_name="Taylor",
+                    email="alex.taylor@example.com",
+                    phone_number="1234567890",
+                ),
+                User(
+                    first_name="Jordan",
+                    last_name="Lee",
+                    email="jordan.lee@example.com",
+                    phone_number="0987654321",
+                ),
+                User(
+                    first_name="Casey",
+                    last_name="Morgan",
+                    email="casey.morgan@example.com",
+                    phone_number="1122334455",
+                ),
+                User(
+                    first_name="Taylor",
+                    last_name="Parker",
+                    email="taylor.parker@example.com",
+                    phone_number="2233445566",
+                ),
+                User(
+                    first_name="Morgan",
+                    last_name="Reed",
+                    email="morgan.reed@example.com",
+                    phone_number="3344556677",
+                ),
+                User(
+                    first_name="Riley",
+                    last_name="Adams",
+                    email="riley.adams@example.com",
+                    phone_number="4455667788",
+                ),
+                User(
+                    first_name="Cameron",
+                    last_name="Blake",
+                    email="cameron.blake@example.com",
+                    phone_number="5566778899",
+                ),
+                User(
+                    first_name="Quinn",
+                    last_name="Hayes",
+                    email="quinn.hayes@example.com",
+                    phone_number="6677889900",
+                ),
+            ]
+
+            session.add_all(seed_users)
+            session.commit()
+            logger.info("Database seeded successfully.")
+        except Exception as e:
+            logger.error(f"Error seeding the database: {str(e)}")
+            session.rollback()
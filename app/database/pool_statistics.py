@@ -0,0 +1,155 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+    This file keeps telemetry about the shared connection pool so that it can be sized from real traffic
+"""
+import threading
+from collections import deque
+
+from sqlalchemy import event
+
+
+class PoolStatistics:
+    """
+    Collects checkout, wait-time and saturation statistics for a SQLAlchemy connection pool.
+
+    Counters are updated from pool events (connect, checkout, checkin, invalidate) and from
+    `record_wait`, which the connection context calls with the time it took to acquire a
+    connection. A bounded window of recent wait samples is kept to report percentiles.
+
+    Attributes:
+        connections_opened (int): Number of new DBAPI connections the pool had to establish.
+        checkouts (int): Number of times a connection was checked out of the pool.
+        checkins (int): Number of times a connection was returned to the pool.
+        invalidations (int): Number of connections invalidated (e.g. failed pre-ping).
+        acquire_timeouts (int): Number of acquisitions that gave up after the pool timeout.
+        peak_checked_out (int): The highest number of simultaneously checked out connections.
+    """
+
+    def __init__(self, sample_window=1024):
+        """
+        Initialize empty statistics.
+
+        Args:
+            sample_window (int): How many recent wait-time samples to keep for percentiles.
+        """
+        self._lock = threading.Lock()
+        self._wait_samples = deque(maxlen=sample_window)
+        self._checked_out = 0
+        self.connections_opened = 0
+        self.checkouts = 0
+        self.checkins = 0
+        self.invalidations = 0
+        self.acquire_timeouts = 0
+        self.peak_checked_out = 0
+        self.wait_count = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def attach(self, engine):
+        """
+        Subscribe to the pool events of the given engine.
+
+        Args:
+            engine (Engine): The engine whose pool should be observed.
+        """
+        event.listen(engine, "connect", self._on_connect)
+        event.listen(engine.pool, "checkout", self._on_checkout)
+        event.listen(engine.pool, "checkin", self._on_checkin)
+        event.listen(engine.pool, "invalidate", self._on_invalidate)
+
+    def record_wait(self, seconds):
+        """
+        Record how long a caller waited to acquire a connection.
+
+        Args:
+            seconds (float): The acquisition time in seconds.
+        """
+        with self._lock:
+            self.wait_count += 1
+            self.wait_seconds_total += seconds
+            self.wait_seconds_max = max(self.wait_seconds_max, seconds)
+            self._wait_samples.append(seconds)
+
+    def record_timeout(self):
+        """
+        Record an acquisition that failed because the pool stayed exhausted for the whole timeout.
+        """
+        with self._lock:
+            self.acquire_timeouts += 1
+
+    def snapshot(self, engine, max_overflow):
+        """
+        Build a JSON-serializable view of the statistics and the current pool state.
+
+        Args:
+            engine (Engine): The engine whose pool state should be included.
+            max_overflow (int): The overflow the pool was configured with.
+
+        Returns:
+            dict: Pool configuration, live usage, counters and wait-time statistics.
+        """
+        pool = engine.pool
+        size = pool.size()
+        capacity = size + max(max_overflow, 0)
+        checked_out = pool.checkedout()
+
+        with self._lock:
+            samples = sorted(self._wait_samples)
+            average = self.wait_seconds_total / self.wait_count if self.wait_count else 0.0
+
+            return {
+                "pool_size": size,
+                "max_overflow": max_overflow,
+                "capacity": capacity,
+                "checked_out": checked_out,
+                "checked_in": pool.checkedin(),
+                "overflow": pool.overflow(),
+                "peak_checked_out": self.peak_checked_out,
+                "saturation": round(checked_out / capacity, 4) if capacity > 0 else None,
+                "connections_opened": self.connections_opened,
+                "checkouts": self.checkouts,
+                "checkins": self.checkins,
+                "invalidations": self.invalidations,
+                "acquire_timeouts": self.acquire_timeouts,
+                "wait": {
+                    "count": self.wait_count,
+                    "avg_ms": round(average * 1000, 3),
+                    "max_ms": round(self.wait_seconds_max * 1000, 3),
+                    "p50_ms": _percentile_ms(samples, 0.50),
+                    "p95_ms": _percentile_ms(samples, 0.95),
+                    "p99_ms": _percentile_ms(samples, 0.99),
+                },
+            }
+
+    def _on_connect(self, dbapi_connection, connection_record):
+        with self._lock:
+            self.connections_opened += 1
+
+    def _on_checkout(self, dbapi_connection, connection_record, connection_proxy):
+        with self._lock:
+            self.checkouts += 1
+            self._checked_out += 1
+            self.peak_checked_out = max(self.peak_checked_out, self._checked_out)
+
+    def _on_checkin(self, dbapi_connection, connection_record):
+        with self._lock:
+            self.checkins += 1
+            self._checked_out = max(self._checked_out - 1, 0)
+
+    def _on_invalidate(self, dbapi_connection, connection_record, exception):
+        with self._lock:
+            self.invalidations += 1
+
+
+def _percentile_ms(sorted_samples, quantile):
+    """
+    Return the given quantile of already sorted samples in milliseconds, or None when empty.
+    """
+    if not sorted_samples:
+        return None
+    index = min(int(quantile * len(sorted_samples)), len(sorted_samples) - 1)
+    return round(sorted_samples[index] * 1000, 3)
+
+
+pool_statistics = PoolStatistics()
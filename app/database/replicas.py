@@ -0,0 +1,308 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+    This file owns the engines of the read replicas and picks the one each read is sent to
+"""
+import threading
+from itertools import count
+from logging import getLogger
+from time import monotonic, perf_counter, time
+
+from database.async_engine import DATABASE_ASYNC, to_asyncpg_url
+from database.engine import (
+    DATABASE_ECHO,
+    POOL_MAX_OVERFLOW,
+    POOL_PRE_PING,
+    POOL_RECYCLE_SECONDS,
+    POOL_SIZE,
+    POOL_TIMEOUT_SECONDS,
+)
+from database.pool_statistics import PoolStatistics
+from database.slow_queries import slow_query_log
+from database.statement_metrics import attach_statement_metrics
+from settings import env_float, env_str
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import create_async_engine
+
+logger = getLogger(__name__)
+
+DATABASE_READ_URLS = [
+    url.strip() for url in env_str("DATABASE_READ_URLS", "").split(",") if url.strip()
+]
+READ_STRATEGY = env_str("DATABASE_READ_STRATEGY", "round_robin")
+READ_EJECT_SECONDS = env_float("DATABASE_READ_EJECT_SECONDS", 30.0)
+READ_STICKY_SECONDS = env_float("DATABASE_READ_STICKY_SECONDS", 5.0)
+
+READ_REPLICAS_ENABLED = bool(DATABASE_READ_URLS)
+READ_STRATEGIES = ("round_robin", "least_busy")
+# Set on responses to writes; reads carrying it go to the primary until it expires
+READ_PRIMARY_COOKIE = "read_primary_until"
+
+
+class Replica:
+    """
+    A read replica with its own connection pools and health state.
+
+    Attributes:
+        name (str): The replica URL without its password, used in logs and statistics.
+        engine (Engine): The synchronous engine, created with the primary's pool settings.
+        async_engine (AsyncEngine): The asyncpg engine, when DATABASE_ASYNC is enabled.
+        statistics (PoolStatistics): Checkout and wait statistics of the synchronous pool.
+        ejected_until (float): The monotonic time until which the replica is skipped.
+        ejections (int): Number of times the replica was ejected.
+    """
+
+    def __init__(self, url):
+        """
+        Build the engines of a replica. Connections are only opened on first use.
+
+        Args:
+            url (str): The database URL of the replica.
+        """
+        self.name = make_url(url).render_as_string(hide_password=True)
+        self.engine = create_engine(
+            url,
+            pool_size=POOL_SIZE,
+            max_overflow=POOL_MAX_OVERFLOW,
+            pool_pre_ping=POOL_PRE_PING,
+            pool_recycle=POOL_RECYCLE_SECONDS,
+            pool_timeout=POOL_TIMEOUT_SECONDS,
+            echo=DATABASE_ECHO,
+        )
+        self.async_engine = (
+            create_async_engine(
+                to_asyncpg_url(url),
+                pool_size=POOL_SIZE,
+                max_overflow=POOL_MAX_OVERFLOW,
+                pool_pre_ping=POOL_PRE_PING,
+                pool_recycle=POOL_RECYCLE_SECONDS,
+                pool_timeout=POOL_TIMEOUT_SECONDS,
+                echo=DATABASE_ECHO,
+            )
+            if DATABASE_ASYNC
+            else None
+        )
+        self.statistics = PoolStatistics()
+        self.statistics.attach(self.engine)
+        self.ejected_until = 0.0
+        self.ejections = 0
+
+        for engine in self.engines():
+            attach_statement_metrics(engine)
+            slow_query_log.attach(engine)
+
+    def busy(self):
+        """
+        Count the connections currently checked out of the replica's pools.
+
+        Returns:
+            int: The number of connections in use.
+        """
+        return sum(engine.pool.checkedout() for engine in self.engines())
+
+    def engines(self):
+        """
+        List the synchronous engines of the replica, including the one behind the asyncio engine.
+
+        Returns:
+            list: The engines to attach event listeners to.
+        """
+        if self.async_engine is None:
+            return [self.engine]
+        return [self.engine, self.async_engine.sync_engine]
+
+
+class ReplicaPool:
+    """
+    Spreads reads over the configured replicas and takes failing ones out of rotation.
+
+    A replica is picked round-robin, or the one with the fewest connections in use when
+    DATABASE_READ_STRATEGY is "least_busy". A replica that cannot be connected to, or whose
+    connection drops during a query, is ejected for DATABASE_READ_EJECT_SECONDS and retried
+    afterwards. When every replica is ejected, `connect` returns None and callers read from the
+    primary, so losing the replicas costs capacity but not availability.
+
+    Replicas lag behind the primary, so a client that just wrote is sent to the primary for
+    DATABASE_READ_STICKY_SECONDS, see `reads_from_primary`.
+
+    Attributes:
+        replicas (list): The configured `Replica` instances.
+        strategy (str): One of READ_STRATEGIES.
+        eject_seconds (float): How long a failing replica is skipped.
+    """
+
+    def __init__(self, urls, strategy, eject_seconds):
+        """
+        Initialize the pool.
+
+        Args:
+            urls (list): The database URLs of the replicas.
+            strategy (str): One of READ_STRATEGIES.
+            eject_seconds (float): How long a failing replica is skipped.
+
+        Raises:
+            ValueError: If the strategy is not one of READ_STRATEGIES.
+        """
+        if strategy not in READ_STRATEGIES:
+            raise ValueError(f"Unknown read strategy '{strategy}'")
+
+        self.replicas = []
+        self.strategy = strategy
+        self.eject_seconds = eject_seconds
+        self._urls = urls
+        self._turns = count()
+        self._lock = threading.Lock()
+        self.primary_fallbacks = 0
+
+    def start(self):
+        """
+        Build the replica engines if they do not exist yet.
+        """
+        with self._lock:
+            if not self.replicas and self._urls:
+                self.replicas = [Replica(url) for url in self._urls]
+                for replica in self.replicas:
+                    for engine in replica.engines():
+                        event.listen(engine, "handle_error", self._on_error(replica))
+                logger.info(
+                    f"Routing reads to {len(self.replicas)} replicas ({self.strategy})"
+                )
+
+    def connect(self):
+        """
+        Check a connection out of a healthy replica.
+
+        Returns:
+            Connection: A connection to a replica, or None when every replica is ejected.
+        """
+        for replica in self._candidates():
+            started = perf_counter()
+            try:
+                connection = replica.engine.connect()
+            except PoolTimeoutError:
+                replica.statistics.record_timeout()
+                continue
+            except (DBAPIError, OSError) as e:
+                self.eject(replica, e)
+                continue
+            replica.statistics.record_wait(perf_counter() - started)
+            return connection
+        return self._fall_back()
+
+    async def connect_async(self):
+        """
+        Check an asyncio connection out of a healthy replica.
+
+        Returns:
+            AsyncConnection: A connection to a replica, or None when every replica is ejected.
+        """
+        for replica in self._candidates():
+            try:
+                return await replica.async_engine.connect()
+            except PoolTimeoutError:
+                continue
+            except (DBAPIError, OSError) as e:
+                self.eject(replica, e)
+        return self._fall_back()
+
+    def eject(self, replica, error):
+        """
+        Take a replica out of rotation for `eject_seconds`.
+
+        Args:
+            replica (Replica): The failing replica.
+            error (Exception): What went wrong, for the log.
+        """
+        with self._lock:
+            already_ejected = replica.ejected_until > monotonic()
+            replica.ejected_until = monotonic() + self.eject_seconds
+            if not already_ejected:
+                replica.ejections += 1
+        if not already_ejected:
+            logger.warning(
+                f"Ejecting read replica {replica.name} for {self.eject_seconds}s: {error}"
+            )
+
+    async def dispose(self):
+        """
+        Close every pooled replica connection.
+        """
+        for replica in self.replicas:
+            if replica.async_engine is not None:
+                await replica.async_engine.dispose()
+            replica.engine.dispose()
+
+    def stats(self):
+        """
+        Describe the replicas and their pools.
+
+        Returns:
+            dict: The strategy, fallback count and, per replica, its health and pool statistics.
+        """
+        now = monotonic()
+        return {
+            "strategy": self.strategy,
+            "sticky_seconds": READ_STICKY_SECONDS,
+            "primary_fallbacks": self.primary_fallbacks,
+            "replicas": [
+                {
+                    "name": replica.name,
+                    "healthy": replica.ejected_until <= now,
+                    "ejected_for_seconds": round(
+                        max(replica.ejected_until - now, 0), 3
+                    ),
+                    "ejections": replica.ejections,
+                    "busy": replica.busy(),
+                    "pool": replica.statistics.snapshot(
+                        replica.engine, POOL_MAX_OVERFLOW
+                    ),
+                }
+                for replica in self.replicas
+            ],
+        }
+
+    def _candidates(self):
+        if not self.replicas:
+            self.start()
+        now = monotonic()
+        healthy = [replica for replica in self.replicas if replica.ejected_until <= now]
+        if self.strategy == "least_busy":
+            return sorted(healthy, key=lambda replica: replica.busy())
+
+        # Round-robin: start from the next replica in turn, keep the others as fallbacks
+        start = next(self._turns) % len(healthy) if healthy else 0
+        return healthy[start:] + healthy[:start]
+
+    def _fall_back(self):
+        with self._lock:
+            self.primary_fallbacks += 1
+        return None
+
+    def _on_error(self, replica):
+        def handle_error(exception_context):
+            if exception_context.is_disconnect:
+                self.eject(replica, exception_context.original_exception)
+
+        return handle_error
+
+
+def reads_from_primary(cookies):
+    """
+    Tell whether a client wrote recently enough that replicas may not have its writes yet.
+
+    Args:
+        cookies (dict): The request cookies.
+
+    Returns:
+        bool: Whether its reads should go to the primary.
+    """
+    try:
+        return float(cookies.get(READ_PRIMARY_COOKIE, 0)) > time()
+    except ValueError:
+        return False
+
+
+replica_pool = ReplicaPool(DATABASE_READ_URLS, READ_STRATEGY, READ_EJECT_SECONDS)
@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+    This file describes the secondary indexes of the users table and builds the missing ones
+"""
+from database.tables import SEARCHABLE_COLUMNS, User
+from sqlalchemy import text
+from sqlalchemy.schema import CreateIndex
+
+TRIGRAM_INDEX_NAME = "ix_users_{column}_trgm"
+TRIGRAM_INDEX = (
+    "CREATE INDEX {concurrently}IF NOT EXISTS " + TRIGRAM_INDEX_NAME + " "
+    "ON users USING gin ({column} gin_trgm_ops)"
+)
+
+
+def has_trigram_extension(connection):
+    """
+    Tell whether the pg_trgm extension is installed in the database.
+
+    Args:
+        connection (Connection): The connection to check through.
+
+    Returns:
+        bool: Whether trigram indexes can be built.
+    """
+    return bool(
+        connection.scalar(
+            text("SELECT EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm')")
+        )
+    )
+
+
+def expected_indexes(connection, concurrently=False):
+    """
+    Build the statements creating every index the users table should have, unless it exists.
+
+    These are the indexes declared on the `User` model and, when pg_trgm is installed, a
+    trigram index for each searchable column. Being derived from the code rather than from the
+    database, they can rebuild indexes that were dropped by a process that died since.
+
+    Args:
+        connection (Connection): The connection to compile the statements for.
+        concurrently (bool): Whether to build with CREATE INDEX CONCURRENTLY, which keeps the
+            table writable but cannot run inside a transaction.
+
+    Returns:
+        dict: The CREATE INDEX IF NOT EXISTS statements, keyed by index name.
+    """
+    statements = {}
+    for index in User.__table__.indexes:
+        statement = str(CreateIndex(index, if_not_exists=True).compile(connection))
+        if concurrently:
+            statement = statement.replace("INDEX", "INDEX CONCURRENTLY", 1)
+        statements[index.name] = statement
+
+    if has_trigram_extension(connection):
+        statements.update(
+            {
+                TRIGRAM_INDEX_NAME.format(column=column): TRIGRAM_INDEX.format(
+                    concurrently="CONCURRENTLY " if concurrently else "", column=column
+                )
+                for column in SEARCHABLE_COLUMNS
+            }
+        )
+    return statements
+
+
+def missing_indexes(connection):
+    """
+    List the expected indexes of the users table that do not exist or are invalid, as left
+    behind by an interrupted CREATE INDEX CONCURRENTLY.
+
+    Args:
+        connection (Connection): The connection to check through.
+
+    Returns:
+        list: The names of the indexes to (re)build.
+    """
+    valid = set(
+        connection.scalars(
+            text(
+                "SELECT index_class.relname FROM pg_index AS info "
+                "JOIN pg_class AS index_class ON index_class.oid = info.indexrelid "
+                "WHERE info.indrelid = 'users'::regclass AND info.indisvalid"
+            )
+        )
+    )
+    return [name for name in expected_indexes(connection) if name not in valid]
@@ -0,0 +1,252 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+    This file keeps a bounded log of slow SQL statements, optionally with their execution plans
+"""
+import random
+import re
+import threading
+from collections import deque
+from datetime import datetime, timezone
+from itertools import count
+from logging import getLogger
+from time import perf_counter
+
+from services.metrics import current_request
+from settings import env_float, env_int, env_str
+from sqlalchemy import event
+
+logger = getLogger(__name__)
+
+SLOW_QUERY_THRESHOLD_MS = env_float("SLOW_QUERY_THRESHOLD_MS", 250.0)
+SLOW_QUERY_LOG_SIZE = env_int("SLOW_QUERY_LOG_SIZE", 200)
+SLOW_QUERY_EXPLAIN_RATE = env_float("SLOW_QUERY_EXPLAIN_RATE", 0.0)
+SLOW_QUERY_REDACT = env_str("SLOW_QUERY_REDACT", "password|token|hash|photo|data")
+
+# Array parameters (e.g. id lists) are cut, so a log entry stays small
+MAX_PARAMETER_ITEMS = 20
+# SELECTs calling these have effects a rollback does not undo (sequences, session advisory
+# locks) or that are better not repeated, so they are explained without ANALYZE
+NON_REPEATABLE_FUNCTIONS = re.compile(
+    r"\b(nextval|setval|pg_notify|pg_(try_)?advisory_\w*)\s*\(", re.IGNORECASE
+)
+REDACTED = "[redacted]"
+
+
+class SlowQueryLog:
+    """
+    Records statements that ran longer than a threshold in a ring buffer.
+
+    Each entry holds the SQL, its bound parameters, the duration and the route of the request
+    that ran it. String parameters are always redacted, as they carry names, emails and search
+    terms; numbers, booleans and nulls are kept so that the statement can be reproduced. Named
+    parameters matching the redaction pattern are redacted whatever their type.
+
+    A sample of the slow statements (`explain_rate`) is explained on the same connection right
+    after it ran: SELECT statements with EXPLAIN (ANALYZE, BUFFERS), which runs them a second
+    time, and other statements with a plain EXPLAIN so their writes are not repeated. The plan
+    is taken inside a savepoint, or a transaction of its own on autocommit connections, that is
+    always rolled back, so neither a failing EXPLAIN nor the second run of the statement can
+    affect the caller's transaction. SELECTs calling NON_REPEATABLE_FUNCTIONS are not analyzed.
+
+    Attributes:
+        threshold_seconds (float): The duration from which a statement is recorded.
+        explain_rate (float): The fraction of slow statements to capture a plan for.
+        recorded (int): Number of slow statements seen, including those evicted from the buffer.
+        explained (int): Number of plans captured.
+        explain_failures (int): Number of plans that could not be captured.
+    """
+
+    def __init__(self, threshold_ms, size, explain_rate, redact_pattern):
+        """
+        Initialize an empty log.
+
+        Args:
+            threshold_ms (float): The duration in milliseconds from which a statement is slow;
+                zero or less disables the log.
+            size (int): How many entries to keep.
+            explain_rate (float): The fraction of slow statements to explain, 0 to 1.
+            redact_pattern (str): A regular expression matched against parameter names to
+                redact non-string values too.
+        """
+        self.threshold_seconds = threshold_ms / 1000
+        self.explain_rate = explain_rate
+        self._redact = re.compile(redact_pattern, re.IGNORECASE)
+        self._entries = deque(maxlen=size)
+        self._ids = count(1)
+        self._lock = threading.Lock()
+        self.recorded = 0
+        self.explained = 0
+        self.explain_failures = 0
+
+    def attach(self, engine):
+        """
+        Subscribe to the cursor events of the given engine.
+
+        Args:
+            engine (Engine): The synchronous engine, or the `sync_engine` of an asyncio engine.
+        """
+        if self.threshold_seconds <= 0:
+            return
+        event.listen(engine, "before_cursor_execute", self._before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", self._after_cursor_execute)
+        event.listen(engine, "handle_error", self._handle_error)
+
+    def snapshot(self, limit=None):
+        """
+        Build a JSON-serializable view of the log.
+
+        Args:
+            limit (int, optional): The maximum number of entries to include.
+
+        Returns:
+            dict: The settings, counters and the entries, newest first.
+        """
+        with self._lock:
+            entries = list(reversed(self._entries))
+        return {
+            "threshold_ms": round(self.threshold_seconds * 1000, 3),
+            "explain_rate": self.explain_rate,
+            "capacity": self._entries.maxlen,
+            "recorded": self.recorded,
+            "explained": self.explained,
+            "explain_failures": self.explain_failures,
+            "entries": entries[:limit] if limit is not None else entries,
+        }
+
+    def clear(self):
+        """
+        Drop every entry, keeping the counters.
+        """
+        with self._lock:
+            self._entries.clear()
+
+    def redact_parameters(self, parameters, executemany=False):
+        """
+        Make bound parameters safe and small enough to keep in the log.
+
+        Args:
+            parameters (dict | tuple | list): The DBAPI parameters of a statement.
+            executemany (bool): Whether `parameters` is a list of parameter sets.
+
+        Returns:
+            The redacted parameters; for executemany, the number of sets and the first one.
+        """
+        if executemany:
+            return {
+                "sets": len(parameters),
+                "first": self.redact_parameters(parameters[0]) if parameters else None,
+            }
+        if isinstance(parameters, dict):
+            return {
+                name: REDACTED if self._redact.search(name) else _redact_value(value)
+                for name, value in parameters.items()
+            }
+        if isinstance(parameters, (list, tuple)):
+            return [_redact_value(value) for value in parameters]
+        return _redact_value(parameters)
+
+    def _record(self, connection, statement, parameters, executemany, elapsed):
+        statistics = current_request.get()
+        entry = {
+            "id": next(self._ids),
+            "recorded_at": datetime.now(timezone.utc).isoformat(
+                timespec="milliseconds"
+            ),
+            "duration_ms": round(elapsed * 1000, 3),
+            "method": statistics.scope["method"] if statistics else None,
+            "route": statistics.route if statistics else None,
+            "statement": statement,
+            "parameters": self.redact_parameters(parameters, executemany),
+            "plan": None,
+        }
+        if not executemany and random.random() < self.explain_rate:
+            entry["plan"] = self._explain(connection, statement, parameters)
+
+        with self._lock:
+            self.recorded += 1
+            self._entries.append(entry)
+        logger.warning(
+            f"Slow query ({entry['duration_ms']} ms, {entry['method']} {entry['route']}): "
+            f"{' '.join(statement.split())[:200]}"
+        )
+
+    def _explain(self, connection, statement, parameters):
+        analyze = statement.lstrip()[:6].upper() == "SELECT" and not (
+            NON_REPEATABLE_FUNCTIONS.search(statement)
+        )
+        prefix = "EXPLAIN (ANALYZE, BUFFERS) " if analyze else "EXPLAIN "
+        dbapi_connection = connection.connection.dbapi_connection
+        autocommit = getattr(dbapi_connection, "autocommit", False)
+        begin, rollback, release = (
+            ("BEGIN", "ROLLBACK", None)
+            if autocommit
+            else (
+                "SAVEPOINT slow_query_explain",
+                "ROLLBACK TO SAVEPOINT slow_query_explain",
+                "RELEASE SAVEPOINT slow_query_explain",
+            )
+        )
+
+        cursor = connection.connection.cursor()
+        try:
+            cursor.execute(begin)
+            try:
+                cursor.execute(prefix + statement, parameters)
+                plan = [row[0] for row in cursor.fetchall()]
+            finally:
+                # Undo whatever running the statement again did, even when it succeeded
+                cursor.execute(rollback)
+                if release is not None:
+                    cursor.execute(release)
+        except Exception as e:
+            with self._lock:
+                self.explain_failures += 1
+            logger.error(f"Failed to explain slow query: {e}")
+            return None
+        finally:
+            cursor.close()
+
+        with self._lock:
+            self.explained += 1
+        return plan
+
+    def _before_cursor_execute(
+        self, connection, cursor, statement, parameters, context, executemany
+    ):
+        connection.info.setdefault("slow_query_started", []).append(perf_counter())
+
+    def _after_cursor_execute(
+        self, connection, cursor, statement, parameters, context, executemany
+    ):
+        elapsed = perf_counter() - connection.info["slow_query_started"].pop()
+        if elapsed >= self.threshold_seconds:
+            self._record(connection, statement, parameters, executemany, elapsed)
+
+    def _handle_error(self, exception_context):
+        connection = exception_context.connection
+        if connection is not None and connection.info.get("slow_query_started"):
+            connection.info["slow_query_started"].pop()
+
+
+def _redact_value(value):
+    """
+    Return a parameter value as something small, JSON-serializable and free of user data.
+    """
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    if isinstance(value, str):
+        return REDACTED
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return f"<{len(value)} bytes>"
+    if isinstance(value, (list, tuple)):
+        return [_redact_value(item) for item in value[:MAX_PARAMETER_ITEMS]]
+    return REDACTED
+
+
+slow_query_log = SlowQueryLog(
+    SLOW_QUERY_THRESHOLD_MS,
+    SLOW_QUERY_LOG_SIZE,
+    SLOW_QUERY_EXPLAIN_RATE,
+    SLOW_QUERY_REDACT,
+)
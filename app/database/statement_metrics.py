@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+    This file times the SQL statements an engine executes and attributes them to the current request
+"""
+from time import perf_counter
+
+from services.metrics import METRICS_ENABLED, current_request, db_statement_duration
+from sqlalchemy import event
+
+# Statement texts come from SQLAlchemy's compiled cache, so the set of distinct texts is small;
+# the bound keeps ad-hoc statements from growing it without limit
+_OPERATION_CACHE_SIZE = 2048
+_operations = {}
+
+
+def attach_statement_metrics(engine):
+    """
+    Subscribe to the cursor events of the given engine.
+
+    Every statement is timed into the `db_statement_duration_seconds` histogram, labelled with its
+    type (SELECT, INSERT, ...), and added to the statistics of the request being handled, if any.
+    Does nothing when METRICS_ENABLED is off.
+
+    Args:
+        engine (Engine): The synchronous engine, or the `sync_engine` of an asyncio engine.
+    """
+    if not METRICS_ENABLED:
+        return
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+
+
+def statement_operation(statement):
+    """
+    Classify a statement by its leading keyword.
+
+    Args:
+        statement (str): The SQL text.
+
+    Returns:
+        str: The upper-cased first keyword, e.g. "SELECT", or "OTHER" for an empty statement.
+    """
+    operation = _operations.get(statement)
+    if operation is None:
+        words = statement.split(None, 1)
+        operation = words[0].upper() if words else "OTHER"
+        if len(_operations) < _OPERATION_CACHE_SIZE:
+            _operations[statement] = operation
+    return operation
+
+
+def _before_cursor_execute(
+    connection, cursor, statement, parameters, context, executemany
+):
+    connection.info.setdefault("statement_started", []).append(perf_counter())
+
+
+def _after_cursor_execute(
+    connection, cursor, statement, parameters, context, executemany
+):
+    elapsed = perf_counter() - connection.info["statement_started"].pop()
+    db_statement_duration.labels(statement_operation(statement)).observe(elapsed)
+
+    statistics = current_request.get()
+    if statistics is not None:
+        statistics.statements += 1
+        statistics.statement_seconds += elapsed
+
+
+def _handle_error(exception_context):
+    connection = exception_context.connection
+    if connection is not None and connection.info.get("statement_started"):
+        connection.info["statement_started"].pop()
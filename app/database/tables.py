@@ -2,11 +2,43 @@
 # -*- coding: utf-8 -*-
 """
 """
-from sqlalchemy import Column, Integer, LargeBinary, String
+from sqlalchemy import (
+    BigInteger,
+    Column,
+    DateTime,
+    ForeignKey,
+    Index,
+    Integer,
+    LargeBinary,
+    String,
+    func,
+    literal_column,
+)
 from sqlalchemy.ext.declarative import declarative_base
 
 Base = declarative_base()
 
+# Columns that can be searched; each gets a search key index and, with pg_trgm, a trigram index
+SEARCHABLE_COLUMNS = ("first_name", "last_name", "email", "phone_number")
+
+
+def search_key(column):
+    """
+    Build the normalized search key of a column: lowercased, NULL as '' and in the "C" collation.
+
+    A btree index on this expression serves both case-insensitive prefix matching (LIKE 'abc%'
+    can use the index because the "C" collation compares bytes, just like text_pattern_ops) and
+    ordering by the column, with no NULLs to complicate keyset pagination. Queries must use the
+    very same expression, which is why the empty string is inlined rather than bound.
+
+    Args:
+        column (Column): The column to normalize.
+
+    Returns:
+        ColumnElement: The search key expression.
+    """
+    return func.coalesce(func.lower(column), literal_column("''")).collate("C")
+
 
 class User(Base):
     """
@@ -18,11 +50,15 @@ class User(Base):
         last_name (str): The last name of the user.
         email (str): The email address of the user, which must be unique.
         phone_number (str): The contact phone number of the user.
-        profile_photo (bytes, optional): A binary large object that can store the user's profile photo.
+        profile_photo_hash (str, optional): The SHA-256 hex digest of the user's profile photo. It addresses
+            the photo in the blob store and serves as its ETag and cache-busting version.
+        version (int): The row version, incremented whenever the user's details are updated. Writers may
+            require the version they last read, so that concurrent edits are detected instead of silently
+            overwritten. Attaching a profile photo in the background does not change it.
 
     The `User` model includes standard attributes for managing user information. The `email` field is
-    unique to prevent duplicate entries. The `profile_photo` field is optional and can store binary data,
-    suitable for saving images or other binary formats directly in the database.
+    unique to prevent duplicate entries. Profile photos are not stored in the row but in `photo_blobs`,
+    which keeps user rows a few hundred bytes wide.
 
     Table:
         - The SQLAlchemy `__tablename__` attribute explicitly names the database table used to store `User` records.
@@ -35,4 +71,86 @@ class User(Base):
     last_name = Column(String)
     email = Column(String, unique=True, index=True)
     phone_number = Column(String)
-    profile_photo = Column(LargeBinary, nullable=True)
+    profile_photo_hash = Column(String(64), nullable=True)
+    version = Column(Integer, nullable=False, server_default="1")
+
+
+class ProfilePhotoRendition(Base):
+    """
+    Represents a resized rendition of a user's profile photo, stored in the 'profile_photo_renditions' table.
+
+    Attributes:
+        user_id (int): The ID of the user the photo belongs to; renditions are deleted with the user.
+        size (str): The rendition name, e.g. "small" or "medium". The original is `users.profile_photo_hash`.
+        photo_hash (str): The SHA-256 hex digest of the encoded rendition (WebP by default), which addresses
+            it in the blob store and serves as its ETag.
+
+    Renditions are a few kilobytes each, so small avatars never require reading the full-size photo.
+    """
+
+    __tablename__ = "profile_photo_renditions"
+
+    user_id = Column(
+        Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True
+    )
+    size = Column(String(16), primary_key=True)
+    photo_hash = Column(String(64), nullable=False)
+
+
+class PhotoBlob(Base):
+    """
+    Represents a stored photo, identified by its content, in the 'photo_blobs' table.
+
+    Attributes:
+        hash (str): The SHA-256 hex digest of the bytes, which is the primary key.
+        content_type (str): The media type detected from the bytes.
+        byte_size (int): The size of the bytes.
+        ref_count (int): The number of users and renditions referencing the blob.
+        data (bytes, optional): The bytes, when the Postgres blob store is used; the filesystem
+            blob store keeps them in files instead.
+
+    Identical photos share one blob. Blobs are removed once their reference count drops to zero.
+    """
+
+    __tablename__ = "photo_blobs"
+
+    hash = Column(String(64), primary_key=True)
+    content_type = Column(String(64), nullable=False)
+    byte_size = Column(Integer, nullable=False)
+    ref_count = Column(Integer, nullable=False, default=0)
+    data = Column(LargeBinary, nullable=True)
+
+
+class UserChange(Base):
+    """
+    Represents a committed change to the 'users' table, recorded in the 'user_changes' table.
+
+    Attributes:
+        seq (int): The position of the change in the change feed, increasing with every change.
+        operation (str): "created", "updated" or "deleted", or "reset" after a bulk load that
+            was not recorded row by row.
+        user_id (int, optional): The ID of the changed user; not a foreign key, since deleted
+            users keep their changes.
+        version (int, optional): The version of the user after the change.
+        changed_at (datetime): When the change was recorded.
+
+    Rows are written by triggers on 'users', so every write is recorded whichever code path
+    made it, and pruned down to the most recent CHANGE_FEED_RETENTION changes. See
+    `services.change_feed`.
+    """
+
+    __tablename__ = "user_changes"
+
+    seq = Column(BigInteger, primary_key=True)
+    operation = Column(String(8), nullable=False)
+    user_id = Column(Integer, nullable=True)
+    version = Column(Integer, nullable=True)
+    changed_at = Column(
+        DateTime(timezone=True), nullable=False, server_default=func.now()
+    )
+
+
+Index("ix_users_first_name_search", search_key(User.first_name), User.id)
+Index("ix_users_last_name_search", search_key(User.last_name), User.id)
+Index("ix_users_email_search", search_key(User.email), User.id)
+Index("ix_users_phone_number_search", search_key(User.phone_number), User.id)
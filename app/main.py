@@ -6,11 +6,30 @@
 
 from logging import getLogger
 
-from database.initialize import create_tables, seed_data
+from database.async_engine import (
+    DATABASE_ASYNC,
+    dispose_async_engine,
+    init_async_engine,
+)
+from database.engine import dispose_engine, init_engine
+from database.initialize import initialize_database
+from database.replicas import READ_REPLICAS_ENABLED, replica_pool
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from middleware.compression import COMPRESSION_ENABLED, CompressionMiddleware
+from middleware.metrics import MetricsMiddleware
+from middleware.profiling import ProfilingMiddleware
+from middleware.read_your_writes import ReadYourWritesMiddleware
 from routers.health import router as health_router
+from routers.metrics import router as metrics_router
 from routers.users import router as user_router
+from services.change_feed import CHANGE_FEED_ENABLED, change_feed
+from services.metrics import METRICS_ENABLED
+from services.photo_renditions import photo_renderer
+from services.photo_reservoir import photo_reservoir
+from services.photo_worker import profile_photo_worker
+from services.profiler import PROFILING_ENABLED
+from services.readiness import readiness
 
 app = FastAPI()
 logger = getLogger(__name__)
@@ -18,9 +37,9 @@ logger = getLogger(__name__)
 app.include_router(health_router, prefix="/health", tags=["health", "ping"])
 app.include_router(user_router, prefix="/users", tags=["users"])
 
-methods = ["GET", "POST", "PUT", "DELETE"]
+methods = ["GET", "POST", "PUT", "PATCH", "DELETE"]
 
-headers = ["Authorization", "Content-Type"]
+headers = ["Authorization", "Content-Type", "Last-Event-ID"]
 
 app.add_middleware(
     CORSMiddleware,
@@ -29,10 +48,43 @@ app.add_middleware(
     allow_headers=headers,
 )
 
+if COMPRESSION_ENABLED:
+    app.add_middleware(CompressionMiddleware)
+
+if METRICS_ENABLED:
+    app.include_router(metrics_router, tags=["metrics"])
+    app.add_middleware(MetricsMiddleware)
+
+if PROFILING_ENABLED:
+    app.add_middleware(ProfilingMiddleware)
+
+if READ_REPLICAS_ENABLED:
+    app.add_middleware(ReadYourWritesMiddleware)
+
 
 @app.on_event("startup")
 async def startup_event():
     logger.debug("Starting up...")
-    create_tables()
-    seed_data()
+    init_engine()
+    if DATABASE_ASYNC:
+        init_async_engine()
+    replica_pool.start()
+    initialize_database()
+    photo_reservoir.start()
+    if CHANGE_FEED_ENABLED:
+        change_feed.start()
+    readiness.start()
     logger.debug("Startup complete.")
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    logger.debug("Shutting down...")
+    await readiness.stop()
+    change_feed.stop()
+    photo_reservoir.stop()
+    profile_photo_worker.shutdown()
+    photo_renderer.shutdown()
+    await replica_pool.dispose()
+    await dispose_async_engine()
+    dispose_engine()
@@ -0,0 +1,287 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+    This file provides the ASGI middleware compressing response bodies with the encoding the client accepts
+"""
+import zlib
+from time import perf_counter
+
+from services.metrics import (
+    http_compressed_responses,
+    http_compression_duration,
+    http_compression_input_bytes,
+    http_compression_output_bytes,
+    http_uncompressed_responses,
+)
+from settings import env_bool, env_int, env_str
+from starlette.datastructures import Headers, MutableHeaders
+
+# Brotli and Zstandard come with the "compression" extra; gzip is always available
+try:
+    import brotli
+except ImportError:
+    brotli = None
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COMPRESSION_ENABLED = env_bool("COMPRESSION_ENABLED", True)
+COMPRESSION_MIN_SIZE = env_int("COMPRESSION_MIN_SIZE", 1024)
+COMPRESSION_GZIP_LEVEL = env_int("COMPRESSION_GZIP_LEVEL", 5)
+COMPRESSION_BROTLI_QUALITY = env_int("COMPRESSION_BROTLI_QUALITY", 4)
+COMPRESSION_ZSTD_LEVEL = env_int("COMPRESSION_ZSTD_LEVEL", 3)
+# The server's preference among the encodings a client accepts equally
+COMPRESSION_ENCODINGS = env_str("COMPRESSION_ENCODINGS", "zstd,br,gzip")
+
+COMPRESSIBLE_TYPES = {
+    "application/json",
+    "application/javascript",
+    "application/xml",
+    "application/x-ndjson",
+    "image/svg+xml",
+}
+# Server-sent events must reach the client message by message, unbuffered
+INCOMPRESSIBLE_TEXT_TYPES = {"text/event-stream"}
+
+
+class _GzipEncoder:
+    def __init__(self):
+        self._compressor = zlib.compressobj(
+            COMPRESSION_GZIP_LEVEL, zlib.DEFLATED, zlib.MAX_WBITS | 16
+        )
+
+    def compress(self, data, final):
+        flush_mode = zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH
+        return self._compressor.compress(data) + self._compressor.flush(flush_mode)
+
+
+class _BrotliEncoder:
+    def __init__(self):
+        self._compressor = brotli.Compressor(quality=COMPRESSION_BROTLI_QUALITY)
+
+    def compress(self, data, final):
+        output = self._compressor.process(data)
+        return output + (
+            self._compressor.finish() if final else self._compressor.flush()
+        )
+
+
+class _ZstdEncoder:
+    def __init__(self):
+        self._compressor = zstandard.ZstdCompressor(
+            level=COMPRESSION_ZSTD_LEVEL
+        ).compressobj()
+
+    def compress(self, data, final):
+        flush_mode = (
+            zstandard.COMPRESSOBJ_FLUSH_FINISH
+            if final
+            else zstandard.COMPRESSOBJ_FLUSH_BLOCK
+        )
+        return self._compressor.compress(data) + self._compressor.flush(flush_mode)
+
+
+_AVAILABLE_ENCODERS = {
+    "gzip": _GzipEncoder,
+    "br": _BrotliEncoder if brotli is not None else None,
+    "zstd": _ZstdEncoder if zstandard is not None else None,
+}
+
+# Encodings in order of preference, restricted to the ones that can be produced here
+ENCODERS = {
+    name: _AVAILABLE_ENCODERS[name]
+    for name in (name.strip() for name in COMPRESSION_ENCODINGS.split(","))
+    if _AVAILABLE_ENCODERS.get(name) is not None
+}
+
+
+class CompressionMiddleware:
+    """
+    Compresses response bodies with zstd, Brotli or gzip, as negotiated through Accept-Encoding.
+
+    The encoding with the highest quality value in the client's Accept-Encoding header wins;
+    ties are broken by COMPRESSION_ENCODINGS. Brotli and zstd are offered when their packages
+    are installed (the "compression" extra). Bodies are left as they are when they are smaller
+    than COMPRESSION_MIN_SIZE, already encoded, partial, or of a type that does not compress,
+    such as the profile photos; textual types (JSON, CSV, NDJSON, plain text) are compressed.
+
+    Streaming responses are compressed chunk by chunk, each chunk flushed so that the client
+    receives data as it is produced. Compressed responses carry `Vary: Accept-Encoding` and a
+    weakened ETag, since their bytes differ from the identity representation. The bytes in and
+    out and the time spent compressing are recorded in the metrics, per encoding, so the level
+    can be tuned against the CPU it costs.
+
+    Attributes:
+        app (ASGIApp): The wrapped application.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] == "HEAD":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            http_uncompressed_responses.labels("not_accepted").inc()
+            await self.app(scope, receive, send)
+            return
+
+        responder = _CompressingResponder(send, encoding)
+        await self.app(scope, receive, responder.send)
+
+
+class _CompressingResponder:
+    """
+    Wraps the `send` of one response: holds back its start until the first body chunk shows
+    whether to compress, then compresses every chunk or passes them all through.
+    """
+
+    def __init__(self, send, encoding):
+        self._send = send
+        self.encoding = encoding
+        self.start_message = None
+        self.encoder = None
+        self.passthrough = False
+        self.input_bytes = 0
+        self.output_bytes = 0
+        self.seconds = 0.0
+
+    async def send(self, message):
+        if self.passthrough:
+            await self._send(message)
+            return
+
+        if message["type"] == "http.response.start":
+            self.start_message = message
+            return
+
+        if message["type"] != "http.response.body":
+            # E.g. a path send: the body does not go through this middleware
+            self.passthrough = True
+            await self._flush_start()
+            await self._send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if self.encoder is None:
+            headers = MutableHeaders(raw=list(self.start_message.get("headers", [])))
+            reason = self._skip_reason(headers, body, more_body)
+            if reason is not None:
+                http_uncompressed_responses.labels(reason).inc()
+                self.passthrough = True
+                if reason == "small":
+                    headers.add_vary_header("Accept-Encoding")
+                    self.start_message = {**self.start_message, "headers": headers.raw}
+                await self._flush_start()
+                await self._send(message)
+                return
+
+            self.encoder = ENCODERS[self.encoding]()
+            compressed = self._compress(body, not more_body)
+            headers["Content-Encoding"] = self.encoding
+            headers.add_vary_header("Accept-Encoding")
+            if more_body:
+                del headers["Content-Length"]
+            else:
+                headers["Content-Length"] = str(len(compressed))
+            etag = headers.get("ETag")
+            if etag is not None and not etag.startswith("W/"):
+                headers["ETag"] = f"W/{etag}"
+            self.start_message = {**self.start_message, "headers": headers.raw}
+            await self._flush_start()
+        else:
+            compressed = self._compress(body, not more_body)
+
+        await self._send(
+            {"type": "http.response.body", "body": compressed, "more_body": more_body}
+        )
+        if not more_body:
+            self._record()
+
+    def _skip_reason(self, headers, body, more_body):
+        status = self.start_message["status"]
+        if status < 200 or status in (204, 304):
+            return "no_body"
+        if status == 206 or "content-encoding" in headers:
+            return "encoded"
+        if not is_compressible(headers.get("content-type", "")):
+            return "content_type"
+        if not more_body and len(body) < COMPRESSION_MIN_SIZE:
+            return "small"
+        return None
+
+    def _compress(self, data, final):
+        started = perf_counter()
+        compressed = self.encoder.compress(data, final)
+        self.seconds += perf_counter() - started
+        self.input_bytes += len(data)
+        self.output_bytes += len(compressed)
+        return compressed
+
+    async def _flush_start(self):
+        if self.start_message is not None:
+            await self._send(self.start_message)
+            self.start_message = None
+
+    def _record(self):
+        http_compressed_responses.labels(self.encoding).inc()
+        http_compression_input_bytes.labels(self.encoding).inc(self.input_bytes)
+        http_compression_output_bytes.labels(self.encoding).inc(self.output_bytes)
+        http_compression_duration.labels(self.encoding).observe(self.seconds)
+
+
+def negotiate_encoding(accept_encoding):
+    """
+    Pick the content encoding of a response from the request's Accept-Encoding header.
+
+    Args:
+        accept_encoding (str): The header value, e.g. "gzip, deflate, br;q=0.9".
+
+    Returns:
+        str: The chosen encoding among ENCODERS, or None to send the body uncompressed.
+    """
+    if not accept_encoding:
+        return None
+
+    qualities = {}
+    for entry in accept_encoding.split(","):
+        name, _, parameters = entry.partition(";")
+        name = name.strip().lower()
+        quality = 1.0
+        parameter, _, value = parameters.partition("=")
+        if parameter.strip().lower() == "q":
+            try:
+                quality = float(value)
+            except ValueError:
+                quality = 0.0
+        if name:
+            qualities[name] = quality
+
+    wildcard = qualities.get("*", 0.0)
+    best, best_quality = None, 0.0
+    for name in ENCODERS:
+        quality = qualities.get(name, wildcard)
+        if quality > best_quality:
+            best, best_quality = name, quality
+    return best
+
+
+def is_compressible(content_type):
+    """
+    Tell whether a media type is worth compressing.
+
+    Args:
+        content_type (str): The Content-Type header value, with or without parameters.
+
+    Returns:
+        bool: True for textual types, False for images, archives, event streams and the like.
+    """
+    media_type = content_type.partition(";")[0].strip().lower()
+    if media_type.startswith("text/"):
+        return media_type not in INCOMPRESSIBLE_TEXT_TYPES
+    return media_type in COMPRESSIBLE_TYPES or media_type.endswith(("+json", "+xml"))
@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+    This file provides the ASGI middleware recording request latency, status and database work
+"""
+from time import perf_counter
+
+from services.metrics import (
+    RequestStatistics,
+    current_request,
+    db_request_duration,
+    db_request_statements,
+    http_request_duration,
+    http_requests,
+    http_requests_in_progress,
+    route_template,
+)
+
+
+class MetricsMiddleware:
+    """
+    Records every HTTP request in the metrics registry.
+
+    Requests are labelled with their route template (e.g. "/users/{user_id}") rather than their
+    path, so that the number of series stays bounded; requests that match no route share the
+    "unmatched" label. The middleware is plain ASGI so that its cost stays in the low
+    microseconds: it wraps `send` to catch the status code and binds a `RequestStatistics` to
+    `current_request`, which the statement hooks fill in.
+
+    Attributes:
+        app (ASGIApp): The wrapped application.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        in_progress = http_requests_in_progress.labels(method)
+        in_progress.inc()
+        statistics = RequestStatistics(scope)
+        token = current_request.set(statistics)
+        started = perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = perf_counter() - started
+            current_request.reset(token)
+            in_progress.dec()
+
+            template = route_template(scope)
+            http_requests.labels(method, template, str(status)).inc()
+            http_request_duration.labels(method, template).observe(elapsed)
+            db_request_statements.labels(template).observe(statistics.statements)
+            db_request_duration.labels(template).observe(statistics.statement_seconds)
@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+    This file provides the ASGI middleware profiling requests on demand
+"""
+import random
+import secrets
+import threading
+from time import perf_counter
+
+from services.metrics import route_template
+from services.profiler import (
+    PROFILING_INTERVAL_MS,
+    PROFILING_SAMPLE_RATE,
+    PROFILING_TOKEN,
+    SamplingProfiler,
+    profile_store,
+)
+
+PROFILE_REQUEST_HEADER = b"x-profile"
+PROFILE_ID_HEADER = b"x-profile-id"
+# Starlette runs sync endpoints, dependencies and streamed bodies in anyio worker threads
+WORKER_THREAD_NAME = "AnyIO worker thread"
+
+# Profiles sample shared threads, so overlapping ones would record each other's requests
+_profiling = threading.Lock()
+
+
+class ProfilingMiddleware:
+    """
+    Profiles a request when it carries `X-Profile: <PROFILING_TOKEN>`, or for a random share of
+    requests set by PROFILING_SAMPLE_RATE.
+
+    The profile is stored in `profile_store` and its id returned in the `X-Profile-Id` response
+    header; it can then be downloaded from /health/profiles/{id}. The event loop thread and the
+    threadpool workers are sampled, leaving out background threads such as the photo
+    reservoir. Only one request is profiled at a time, others pass through untouched. The
+    middleware is only installed when profiling is configured, so the normal path does not pay
+    for it.
+
+    Attributes:
+        app (ASGIApp): The wrapped application.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.token = PROFILING_TOKEN.encode() if PROFILING_TOKEN else None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self._wants_profile(scope):
+            await self.app(scope, receive, send)
+            return
+        if not _profiling.acquire(blocking=False):
+            await self.app(scope, receive, send)
+            return
+
+        profile_id = profile_store.next_id()
+        status = 500
+
+        async def send_with_profile_id(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message = {
+                    **message,
+                    "headers": [
+                        *message.get("headers", []),
+                        (PROFILE_ID_HEADER, str(profile_id).encode()),
+                    ],
+                }
+            await send(message)
+
+        loop_thread = threading.get_ident()
+        profiler = SamplingProfiler(
+            PROFILING_INTERVAL_MS / 1000,
+            lambda thread: thread.ident == loop_thread
+            or thread.name == WORKER_THREAD_NAME,
+        )
+        profiler.start()
+        started = perf_counter()
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            duration = perf_counter() - started
+            profiler.stop()
+            _profiling.release()
+            profile_store.add(
+                profile_id,
+                {
+                    "method": scope["method"],
+                    "path": scope["path"],
+                    "route": route_template(scope),
+                    "status": status,
+                },
+                profiler,
+                duration,
+            )
+
+    def _wants_profile(self, scope):
+        if self.token is not None:
+            for name, value in scope["headers"]:
+                if name == PROFILE_REQUEST_HEADER:
+                    return secrets.compare_digest(value, self.token)
+        return PROFILING_SAMPLE_RATE > 0 and random.random() < PROFILING_SAMPLE_RATE
@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+    This file provides the ASGI middleware keeping a client's reads on the primary right after it writes
+"""
+from time import time
+
+from database.replicas import READ_PRIMARY_COOKIE, READ_STICKY_SECONDS
+
+SAFE_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+
+class ReadYourWritesMiddleware:
+    """
+    Marks clients that just wrote so that their next reads skip the replicas.
+
+    Successful responses to non-GET requests set the `read_primary_until` cookie to the time
+    until which the client's reads go to the primary, DATABASE_READ_STICKY_SECONDS from now. The
+    cookie carries its own expiry, so every worker process honors it without shared state;
+    clients that do not keep cookies read from the replicas right away. The middleware is only
+    installed when DATABASE_READ_URLS is set.
+
+    Attributes:
+        app (ASGIApp): The wrapped application.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.max_age = max(int(READ_STICKY_SECONDS + 0.999), 1)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] in SAFE_METHODS:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_cookie(message):
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                cookie = (
+                    f"{READ_PRIMARY_COOKIE}={time() + READ_STICKY_SECONDS:.3f}; "
+                    f"Max-Age={self.max_age}; Path=/; HttpOnly; SameSite=Lax"
+                )
+                message = {
+                    **message,
+                    "headers": [
+                        *message.get("headers", []),
+                        (b"set-cookie", cookie.encode()),
+                    ],
+                }
+            await send(message)
+
+        await self.app(scope, receive, send_with_cookie)
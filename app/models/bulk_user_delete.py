@@ -0,0 +1,22 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+    This model is the structure of our input validation for bulk DELETE requests for users
+"""
+from typing import List
+
+from pydantic import BaseModel, Field
+
+
+class BulkUserDelete(BaseModel):
+    """
+    A Pydantic model that represents a bulk delete request.
+
+    Attributes:
+        ids (List[int]): The IDs of the users to delete.
+    """
+
+    ids: List[int] = Field(
+        description="IDs of the users to delete",
+        example=[1, 2, 3],
+    )
@@ -0,0 +1,20 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+    This model is the structure of our input validation for the items of bulk PUT requests for users
+"""
+from models.user import User
+
+
+class BulkUserUpdate(User):
+    """
+    A Pydantic model that represents one user update within a bulk update request.
+
+    Attributes:
+        id (int): The ID of the user to update.
+
+    All other fields are inherited from `User` and replace the stored values, exactly like the
+    single-user PUT endpoint.
+    """
+
+    id: int
@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+    This model specifies input validation for the keyset (cursor) pagination parameters of the GET endpoint
+"""
+from typing import Literal, Optional
+
+from pydantic import BaseModel, Field
+
+
+class CursorParams(BaseModel):
+    """
+    A Pydantic model that defines the parameters for keyset (cursor) pagination in API requests.
+
+    Attributes:
+        mode (str): Either "page" for the classic page/page_size pagination or "cursor" for keyset pagination.
+        after (Optional[str]): An opaque cursor; when given, the page starts right after the row it points at.
+        before (Optional[str]): An opaque cursor; when given, the page ends right before the row it points at.
+
+    Keyset pagination seeks directly to the cursor position through the primary key index, so every page
+    costs the same regardless of how deep into the table it is. Cursors are returned by the previous
+    response as `next_cursor`/`prev_cursor` and should be treated as opaque by clients.
+
+    Usage:
+        - `mode=cursor` without a cursor fetches the first page.
+        - Supplying `after` or `before` implies cursor mode; only one of them may be given at a time.
+    """
+
+    mode: Literal["page", "cursor"] = Field(
+        default="page",
+        description="Pagination mode, 'page' (offset based) or 'cursor' (keyset based)",
+        example="cursor",
+    )
+    after: Optional[str] = Field(
+        default=None,
+        description="Return the page that follows this cursor",
+    )
+    before: Optional[str] = Field(
+        default=None,
+        description="Return the page that precedes this cursor",
+    )
+
+    @property
+    def enabled(self):
+        """
+        bool: Whether the request asks for keyset pagination.
+        """
+        return self.mode == "cursor" or self.after is not None or self.before is not None
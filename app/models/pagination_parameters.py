@@ -13,6 +13,7 @@ class PaginationParams(BaseModel):
     Attributes:
         page (int): The current page number in the pagination sequence, starting from 1. It must be at least 1.
         page_size (int): The number of items to display per page. It must be between 1 and 100, inclusive.
+        include_count (bool): Whether to compute the total count and number of pages. Defaults to True.
 
     This model is utilized to ensure that API requests conform to the pagination standards set forth in the application,
     providing clients with consistent and manageable chunks of data. The validation constraints ensure that the page
@@ -21,6 +22,7 @@ class PaginationParams(BaseModel):
     Usage:
         - `page` helps in fetching a specific segment of the dataset.
         - `page_size` controls the volume of data returned, helping to optimize load times and manageability.
+        - `include_count=false` skips counting entirely for clients that do not display totals.
 
     The fields are accompanied by default values and constraints to guide the user and validate inputs effectively.
     """
@@ -43,3 +45,8 @@ class PaginationParams(BaseModel):
             "le": "Page size must not exceed 100",
         },
     )
+    include_count: bool = Field(
+        default=True,
+        description="Whether to compute total_count and total_pages",
+        example=True,
+    )
@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+    This model specifies input validation for the query parameters of the user search endpoint
+"""
+from typing import Literal, Optional
+
+from pydantic import BaseModel, Field
+
+# Trigram indexes can only narrow down substring matches of at least three characters
+MIN_CONTAINS_LENGTH = 3
+
+
+class UserSearchParams(BaseModel):
+    """
+    A Pydantic model that defines the parameters for searching users.
+
+    Attributes:
+        q (Optional[str]): A term matched against every searchable field; a user matches if any field does.
+        first_name (Optional[str]): A term matched against the first name.
+        last_name (Optional[str]): A term matched against the last name.
+        email (Optional[str]): A term matched against the email address.
+        phone_number (Optional[str]): A term matched against the phone number.
+        match (str): "prefix" to match the start of the fields, "contains" to match anywhere in them.
+        sort (str): The field to sort by, "id", "first_name", "last_name" or "email".
+        order (str): The sort direction, "asc" or "desc".
+        after (Optional[str]): An opaque cursor returned as `next_cursor` by the previous page.
+        page_size (int): The number of users to return, between 1 and 100.
+
+    Matching is case-insensitive and every given term must match. Prefix matches and sorting are
+    served by the search key indexes; substring matches by trigram indexes, which is why they need
+    at least three characters.
+    """
+
+    q: Optional[str] = Field(
+        default=None, description="Match any searchable field", example="tay"
+    )
+    first_name: Optional[str] = Field(default=None, description="Match the first name")
+    last_name: Optional[str] = Field(default=None, description="Match the last name")
+    email: Optional[str] = Field(default=None, description="Match the email address")
+    phone_number: Optional[str] = Field(
+        default=None, description="Match the phone number"
+    )
+    match: Literal["prefix", "contains"] = Field(
+        default="prefix",
+        description="Match the start of the fields ('prefix') or anywhere in them ('contains')",
+        example="prefix",
+    )
+    sort: Literal["id", "first_name", "last_name", "email"] = Field(
+        default="id", description="Field to sort by", example="last_name"
+    )
+    order: Literal["asc", "desc"] = Field(
+        default="asc", description="Sort direction", example="asc"
+    )
+    after: Optional[str] = Field(
+        default=None, description="Return the page that follows this cursor"
+    )
+    page_size: int = Field(
+        default=10,
+        ge=1,
+        le=100,
+        description="Number of items per page, max 100",
+        example=10,
+    )
+
+    @property
+    def filters(self):
+        """
+        dict: The per-field terms that were given, keyed by column name.
+        """
+        return {
+            name: value
+            for name, value in (
+                ("first_name", self.first_name),
+                ("last_name", self.last_name),
+                ("email", self.email),
+                ("phone_number", self.phone_number),
+            )
+            if value
+        }
+
+    @property
+    def terms(self):
+        """
+        list: Every search term that was given, including `q`.
+        """
+        return list(self.filters.values()) + ([self.q] if self.q else [])
@@ -0,0 +1,24 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+    This model is the structure of our input validation for PUT and PATCH requests for a user
+"""
+from typing import Optional
+
+from models.user import User
+
+
+class UserUpdate(User):
+    """
+    A Pydantic model that represents an update of a single user.
+
+    Attributes:
+        version (Optional[int]): The version of the user the client last read. When given, the
+            update is only applied if the user is still at that version, otherwise it is
+            rejected with 409 Conflict. Omit it to overwrite unconditionally.
+
+    All other fields are inherited from `User`. A PUT request replaces every field, while a PATCH
+    request only writes the fields present in the payload.
+    """
+
+    version: Optional[int] = None
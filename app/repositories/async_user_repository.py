@@ -0,0 +1,387 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+    The async user repository exposes the user repository to async route handlers
+"""
+from contextlib import AsyncExitStack, ExitStack, asynccontextmanager, nullcontext
+
+from database.async_engine import DATABASE_ASYNC, get_async_connection
+from database.connection_context import ConnectionContext
+from database.replicas import READ_REPLICAS_ENABLED, reads_from_primary, replica_pool
+from fastapi import Request
+from fastapi.concurrency import run_in_threadpool
+from repositories.user_repository import (
+    COUNT_CACHE_ENTRY,
+    COUNT_STRATEGIES,
+    COUNT_STRATEGY,
+    ESTIMATE_EXACT_BELOW,
+    UserRepository,
+    page_cache_entry,
+    user_cache_entry,
+)
+from services.read_cache import read_cache
+from services.user_count_cache import user_count_cache
+
+
+class AsyncUserRepository:
+    """
+    An awaitable facade over `UserRepository` backed by the asyncio engine (asyncpg).
+
+    Every method runs the corresponding `UserRepository` method through
+    `AsyncConnection.run_sync`, so the queries are written once while all database I/O is
+    awaited on the event loop through asyncpg instead of blocking a thread.
+
+    Since `run_sync` executes on the event loop thread, the read cache is kept out of it: cached
+    reads are looked up before entering it and stored after, and the invalidations of writes
+    are sent once it returned, on the threadpool when the cache goes over the network. The
+    connection is only checked out by the first call that needs the database, so cache hits
+    never take one from the pool.
+
+    Attributes:
+        cached (bool): Whether reads go through the read cache.
+    """
+
+    def __init__(self, connect, cached=True):
+        """
+        Initialize the AsyncUserRepository with a way to connect to the database.
+
+        Args:
+            connect (callable): Returns an async context manager yielding the AsyncConnection
+                to use. It is entered on the first call that needs the database.
+            cached (bool): Whether reads go through the read cache; False on replicas.
+        """
+        self.cached = cached
+        self._connect = connect
+        self._connection = None
+        self._exit_stack = AsyncExitStack()
+
+    async def close(self):
+        """
+        Return the connection to the pool, if one was checked out.
+        """
+        await self._exit_stack.aclose()
+        self._connection = None
+
+    async def _get_connection(self):
+        if self._connection is None:
+            self._connection = await self._exit_stack.enter_async_context(
+                self._connect()
+            )
+        return self._connection
+
+    async def _run(self, function):
+        connection = await self._get_connection()
+        return await connection.run_sync(function)
+
+    async def _call(self, method, *args, **kwargs):
+        stale = []
+        try:
+            return await self._run(
+                lambda sync_connection: getattr(
+                    UserRepository(
+                        sync_connection,
+                        cached=False,
+                        invalidate=lambda *namespaces: stale.extend(namespaces),
+                    ),
+                    method,
+                )(*args, **kwargs)
+            )
+        finally:
+            if stale:
+                await _use_read_cache(read_cache.invalidate, *stale)
+
+    async def _read_through(self, key, namespaces, method, *args, **kwargs):
+        if not self.cached:
+            return await self._call(method, *args, **kwargs)
+
+        found, value, versioned_key = await _use_read_cache(
+            read_cache.lookup, key, namespaces
+        )
+        if found:
+            return value
+
+        value = await self._call(method, *args, **kwargs)
+        await _use_read_cache(read_cache.store, versioned_key, value)
+        return value
+
+    async def create(self, user_data, profile_photo=None):
+        """
+        Create a new user. See `UserRepository.create`.
+        """
+        return await self._call("create", user_data, profile_photo=profile_photo)
+
+    async def update(self, user_id, user_data, expected_version=None):
+        """
+        Update an existing user's details. See `UserRepository.update`.
+        """
+        return await self._call(
+            "update", user_id, user_data, expected_version=expected_version
+        )
+
+    async def delete(self, user_id, expected_version=None):
+        """
+        Delete a user. See `UserRepository.delete`.
+        """
+        return await self._call("delete", user_id, expected_version=expected_version)
+
+    async def bulk_create(self, users_data, profile_photos=None):
+        """
+        Create many users in one transaction. See `UserRepository.bulk_create`.
+        """
+        return await self._call(
+            "bulk_create", users_data, profile_photos=profile_photos
+        )
+
+    async def bulk_update(self, users_data):
+        """
+        Update many users in one transaction. See `UserRepository.bulk_update`.
+        """
+        return await self._call("bulk_update", users_data)
+
+    async def bulk_delete(self, user_ids):
+        """
+        Delete many users in one transaction. See `UserRepository.bulk_delete`.
+        """
+        return await self._call("bulk_delete", user_ids)
+
+    async def get_all(self, page=1, page_size=10):
+        """
+        Retrieve a page of users by offset. See `UserRepository.get_all`.
+        """
+        return await self._read_through(
+            *page_cache_entry(page, page_size),
+            "get_all",
+            page=page,
+            page_size=page_size,
+        )
+
+    async def get_page_by_keyset(self, after_id=None, before_id=None, page_size=10):
+        """
+        Retrieve a page of users by keyset. See `UserRepository.get_page_by_keyset`.
+        """
+        return await self._call(
+            "get_page_by_keyset",
+            after_id=after_id,
+            before_id=before_id,
+            page_size=page_size,
+        )
+
+    async def search(self, **criteria):
+        """
+        Search users with keyset pagination. See `UserRepository.search`.
+        """
+        return await self._call("search", **criteria)
+
+    async def get_total_count(self):
+        """
+        Count users exactly. See `UserRepository.get_total_count`.
+        """
+        return await self._read_through(*COUNT_CACHE_ENTRY, "get_total_count")
+
+    async def count_users(self, strategy=None):
+        """
+        Count users with the configured strategy. See `UserRepository.count_users`.
+        """
+        strategy = strategy or COUNT_STRATEGY
+        if strategy not in COUNT_STRATEGIES:
+            raise ValueError(f"Unknown count strategy '{strategy}'")
+
+        if strategy == "cached":
+            cached_count = user_count_cache.get()
+            if cached_count is not None:
+                return cached_count, "cached"
+            total_count = await self.get_total_count()
+            user_count_cache.set(total_count)
+            return total_count, "exact"
+
+        if strategy == "estimated":
+            estimate = await self._call("get_estimated_count")
+            if estimate is not None and estimate >= ESTIMATE_EXACT_BELOW:
+                return estimate, "estimated"
+
+        return await self.get_total_count(), "exact"
+
+    async def get_by_id(self, user_id):
+        """
+        Retrieve a single user. See `UserRepository.get_by_id`.
+        """
+        return await self._read_through(
+            *user_cache_entry(user_id), "get_by_id", user_id
+        )
+
+    async def get_profile_photo_hash(self, user_id, size="original"):
+        """
+        Retrieve a user's photo hash. See `UserRepository.get_profile_photo_hash`.
+        """
+        return await self._call("get_profile_photo_hash", user_id, size=size)
+
+    async def get_profile_photo(self, user_id, size="original"):
+        """
+        Retrieve a user's photo and hash. See `UserRepository.get_profile_photo`.
+        """
+        return await self._call("get_profile_photo", user_id, size=size)
+
+    async def get_photo_blob(self, photo_hash, with_data=True):
+        """
+        Retrieve a photo from the blob store. See `UserRepository.get_photo_blob`.
+        """
+        return await self._call("get_photo_blob", photo_hash, with_data=with_data)
+
+    async def store_renditions(self, user_id, renditions):
+        """
+        Store derived photo renditions. See `UserRepository.store_renditions`.
+        """
+        return await self._call("store_renditions", user_id, renditions)
+
+
+class ThreadPoolUserRepository(AsyncUserRepository):
+    """
+    The same awaitable interface as `AsyncUserRepository`, backed by the synchronous engine.
+
+    Used when DATABASE_ASYNC is disabled: each call runs the blocking `UserRepository` method
+    on Starlette's threadpool so that async route handlers never block the event loop.
+
+    Attributes:
+        cached (bool): Whether reads go through the read cache.
+    """
+
+    def __init__(self, connect, cached=True):
+        """
+        Initialize the ThreadPoolUserRepository with a way to connect to the database.
+
+        Args:
+            connect (callable): Returns a context manager yielding the synchronous Connection
+                to use. It is entered, on the threadpool, on the first call that needs the
+                database.
+            cached (bool): Whether reads go through the read cache; False on replicas.
+        """
+        super().__init__(connect, cached=cached)
+        self._exit_stack = ExitStack()
+
+    async def close(self):
+        """
+        Return the connection to the pool, if one was checked out.
+        """
+        await run_in_threadpool(self._exit_stack.close)
+        self._connection = None
+
+    async def _get_connection(self):
+        if self._connection is None:
+            self._connection = await run_in_threadpool(
+                self._exit_stack.enter_context, self._connect()
+            )
+        return self._connection
+
+    async def _run(self, function):
+        connection = await self._get_connection()
+        return await run_in_threadpool(function, connection)
+
+
+async def _use_read_cache(function, *args):
+    """
+    Call a read cache method, on the threadpool when it makes network calls to a shared backend.
+    """
+    if read_cache.shared is None:
+        return function(*args)
+    return await run_in_threadpool(function, *args)
+
+
+async def get_async_user_repository():
+    """
+    Dependency yielding an asyncpg-backed repository.
+
+    Yields:
+        AsyncUserRepository: A repository checking a connection out of the asyncio engine when
+        it first needs one.
+    """
+    repository = AsyncUserRepository(asynccontextmanager(get_async_connection))
+    try:
+        yield repository
+    finally:
+        await repository.close()
+
+
+async def get_threadpool_user_repository():
+    """
+    Dependency yielding a repository backed by the synchronous engine.
+
+    Yields:
+        ThreadPoolUserRepository: A repository checking a connection out of the synchronous
+        engine when it first needs one.
+    """
+    repository = ThreadPoolUserRepository(ConnectionContext)
+    try:
+        yield repository
+    finally:
+        await repository.close()
+
+
+# Selected once at import time by the DATABASE_ASYNC setting
+get_user_repository = (
+    get_async_user_repository if DATABASE_ASYNC else get_threadpool_user_repository
+)
+
+
+async def get_async_read_user_repository(request: Request):
+    """
+    Dependency yielding an asyncpg-backed repository on a read replica.
+
+    Clients that wrote within DATABASE_READ_STICKY_SECONDS, and every client while all
+    replicas are ejected, get a repository on the primary instead. Replica reads bypass the
+    read cache: lagging data cached under the current version stamps would otherwise be
+    served to every client, those reading their own writes included, until the TTL expires.
+
+    Args:
+        request (Request): The incoming request, whose cookies carry the write stickiness.
+
+    Yields:
+        AsyncUserRepository: A repository bound to a replica or primary connection.
+    """
+    connection = None
+    if not reads_from_primary(request.cookies):
+        connection = await replica_pool.connect_async()
+
+    if connection is None:
+        async for repository in get_async_user_repository():
+            yield repository
+        return
+
+    try:
+        yield AsyncUserRepository(lambda: nullcontext(connection), cached=False)
+    finally:
+        await connection.close()
+
+
+async def get_threadpool_read_user_repository(request: Request):
+    """
+    Dependency yielding a repository on a read replica, backed by the synchronous engines.
+    See `get_async_read_user_repository`.
+
+    Args:
+        request (Request): The incoming request, whose cookies carry the write stickiness.
+
+    Yields:
+        ThreadPoolUserRepository: A repository bound to a replica or primary connection.
+    """
+    connection = None
+    if not reads_from_primary(request.cookies):
+        connection = await run_in_threadpool(replica_pool.connect)
+
+    if connection is None:
+        async for repository in get_threadpool_user_repository():
+            yield repository
+        return
+
+    try:
+        yield ThreadPoolUserRepository(lambda: nullcontext(connection), cached=False)
+    finally:
+        await run_in_threadpool(connection.close)
+
+
+# Reads that tolerate replication lag use this one; without replicas it is the primary's
+if not READ_REPLICAS_ENABLED:
+    get_read_user_repository = get_user_repository
+elif DATABASE_ASYNC:
+    get_read_user_repository = get_async_read_user_repository
+else:
+    get_read_user_repository = get_threadpool_read_user_repository
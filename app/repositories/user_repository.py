@@ -3,9 +3,97 @@
 """
     The user repository defines the basic interactions between our backend and database
 """
-from database.tables import User
-from services.profile_photo import fetch_profile_photo
-from sqlalchemy import delete, func, insert, select, update
+from database.tables import (
+    SEARCHABLE_COLUMNS,
+    ProfilePhotoRendition,
+    User,
+    search_key,
+)
+from services.blob_store import blob_store
+from services.photo_renditions import ORIGINAL, RENDITION_SIZES
+from services.profile_photo import PHOTO_VERSION_LENGTH, hash_profile_photo
+from services.read_cache import read_cache
+from services.user_count_cache import user_count_cache
+from settings import env_int, env_str
+from sqlalchemy import (
+    Integer,
+    String,
+    and_,
+    cast,
+    column,
+    delete,
+    func,
+    insert,
+    literal,
+    or_,
+    select,
+    text,
+    tuple_,
+    update,
+    values,
+)
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.exc import IntegrityError
+
+COUNT_STRATEGIES = ("exact", "cached", "estimated")
+COUNT_STRATEGY = env_str("USER_COUNT_STRATEGY", "exact")
+ESTIMATE_EXACT_BELOW = env_int("USER_COUNT_ESTIMATE_EXACT_BELOW", 10000)
+BULK_CHUNK_SIZE = env_int("BULK_CHUNK_SIZE", 1000)
+EXPORT_BATCH_SIZE = env_int("EXPORT_BATCH_SIZE", 1000)
+
+# Every column of a user; photos live in the blob store and are served by their own endpoint.
+USER_COLUMNS = (
+    User.id,
+    User.first_name,
+    User.last_name,
+    User.email,
+    User.phone_number,
+    User.profile_photo_hash,
+)
+
+# The versioned URL of the profile photo, built in SQL so that the rows read by the users
+# endpoints can be encoded as they are; a NULL hash yields a NULL URL
+PROFILE_PHOTO_URL = (
+    literal("/users/")
+    .concat(cast(User.id, String))
+    .concat("/photo?v=")
+    .concat(func.left(User.profile_photo_hash, PHOTO_VERSION_LENGTH))
+    .label("profile_photo_url")
+)
+
+# A user as returned by the users endpoints
+USER_VIEW_COLUMNS = USER_COLUMNS[:-1] + (
+    User.version,
+    PROFILE_PHOTO_URL,
+    User.profile_photo_hash,
+)
+
+# The columns clients can write
+EDITABLE_COLUMNS = ("first_name", "last_name", "email", "phone_number")
+
+# Read cache namespaces: every cached read belongs to USERS_NAMESPACE plus a narrower one
+USERS_NAMESPACE = "users"
+PAGES_NAMESPACE = "users:pages"
+COUNT_NAMESPACE = "users:count"
+# The read cache key and namespaces of the user count
+COUNT_CACHE_ENTRY = ("users:count", (USERS_NAMESPACE, COUNT_NAMESPACE))
+
+
+class VersionConflictError(Exception):
+    """
+    Raised when a write requires a version of a user that is no longer current.
+
+    Attributes:
+        user_id (int): The ID of the user.
+        current_version (int): The version the user is at.
+    """
+
+    def __init__(self, user_id, current_version):
+        super().__init__(
+            f"User {user_id} is at version {current_version}, it was modified concurrently"
+        )
+        self.user_id = user_id
+        self.current_version = current_version
 
 
 class UserRepository:
@@ -17,82 +105,440 @@ class UserRepository:
 
     Attributes:
         connection (Connection): The database connection to execute database operations.
+        cached (bool): Whether reads go through the read cache.
+        invalidate (callable): Invalidates read cache namespaces after a write.
     """
 
-    def __init__(self, connection):
+    def __init__(self, connection, cached=True, invalidate=None):
         """
         Initialize the UserRepository with a database connection.
 
         Args:
             connection (Connection): A database connection object.
+            cached (bool): Whether reads go through the read cache. Reads from a replica must
+                not, since what they return may be older than the cache's version stamps.
+            invalidate (callable, optional): Called with the read cache namespaces made stale
+                by a write once it is committed. Defaults to `read_cache.invalidate`; the async
+                repository collects them instead, to invalidate off the event loop.
         """
         self.connection = connection
+        self.invalidate = invalidate or read_cache.invalidate
+        self.cached = cached
 
-    def create(self, user_data):
+    def create(self, user_data, profile_photo=None):
         """
         Create a new user in the database using the provided user data.
 
+        The row is inserted and read back in one statement through RETURNING. No outbound HTTP
+        call happens inside the insert: users either get a photo that is already at hand (e.g.
+        from the photo reservoir) or are committed without one and have it attached afterwards
+        through `set_profile_photo`.
+
         Args:
             user_data (dict): A dictionary containing details of the user to be created.
+            profile_photo (dict, optional): The renditions of an already available photo to store
+                with the user, as produced by `PhotoRenderer.render`.
+
+        Returns:
+            dict: The new user, including its ID and version.
+        """
+        query = (
+            insert(User)
+            .values(
+                first_name=user_data["first_name"],
+                last_name=user_data["last_name"],
+                email=user_data["email"],
+                phone_number=user_data["phone_number"],
+                **_photo_columns(profile_photo),
+            )
+            .returning(*USER_VIEW_COLUMNS)
+        )
+        user = dict(self.connection.execute(query).mappings().one())
+        self._store_photos({user["id"]: profile_photo})
+        self.connection.commit()
+        user_count_cache.adjust(1)
+        # The ID may have been looked up, and its absence cached, before the user existed
+        self.invalidate(_user_namespace(user["id"]), PAGES_NAMESPACE, COUNT_NAMESPACE)
+
+        return user
+
+    def set_profile_photo(self, user_id, profile_photo):
+        """
+        Attach a profile photo to a user that does not have one yet.
+
+        Users that already received a photo in the meantime, or were deleted, are left untouched.
+
+        Args:
+            user_id (int): The ID of the user.
+            profile_photo (dict): The renditions of the photo, as produced by `PhotoRenderer.render`.
 
         Returns:
-            None: Indicates the user was created successfully in the database.
+            bool: True if the photo was stored.
         """
-        query = insert(User).values(
-            first_name=user_data["first_name"],
-            last_name=user_data["last_name"],
-            email=user_data["email"],
-            phone_number=user_data["phone_number"],
-            profile_photo=fetch_profile_photo(),
+        query = (
+            update(User)
+            .where(User.id == user_id, User.profile_photo_hash.is_(None))
+            .values(**_photo_columns(profile_photo))
         )
-        self.connection.execute(query)
+        result = self.connection.execute(query)
+        if result.rowcount == 0:
+            self.connection.commit()
+            return False
+
+        self._store_photos({user_id: profile_photo})
         self.connection.commit()
+        self.invalidate(_user_namespace(user_id), PAGES_NAMESPACE)
+        return True
 
-    def update(self, user_id, user_data):
+    def update(self, user_id, user_data, expected_version=None):
         """
         Update an existing user's details in the database.
 
+        Only the editable columns present in `user_data` are written, so a full replacement
+        passes all of them and a partial update only the changed ones. The row is updated and
+        read back in one statement through RETURNING, and its version is incremented.
+
+        With `expected_version`, the update only applies if the user is still at that version,
+        checked in the same statement, so concurrent writers neither lock nor read the row
+        beforehand. Only when nothing matched is the user looked up, to tell a missing user
+        from a conflict.
+
         Args:
             user_id (int): The ID of the user to update.
             user_data (dict): A dictionary containing updated details for the user.
+            expected_version (int, optional): The version the caller last read.
 
         Returns:
-            User: The updated user object, reflecting the changes made.
+            dict: The updated user, or None if there is no user with this ID.
+
+        Raises:
+            VersionConflictError: If the user is no longer at `expected_version`.
         """
         query = (
             update(User)
             .where(User.id == user_id)
             .values(
-                first_name=user_data.get("first_name"),
-                last_name=user_data.get("last_name"),
-                email=user_data.get("email"),
-                phone_number=user_data.get("phone_number"),
+                version=User.version + 1,
+                **{
+                    name: user_data[name]
+                    for name in EDITABLE_COLUMNS
+                    if name in user_data
+                },
             )
-            .execution_options(synchronize_session="fetch")
+            .returning(*USER_VIEW_COLUMNS)
         )
-        self.connection.execute(query)
+        if expected_version is not None:
+            query = query.where(User.version == expected_version)
+
+        user = self.connection.execute(query).mappings().first()
+        if user is None:
+            current_version = (
+                self.connection.execute(
+                    select(User.version).where(User.id == user_id)
+                ).scalar()
+                if expected_version is not None
+                else None
+            )
+            self.connection.rollback()
+            if current_version is not None:
+                raise VersionConflictError(user_id, current_version)
+            return None
+
         self.connection.commit()
+        self.invalidate(_user_namespace(user_id), PAGES_NAMESPACE)
 
-        return self.get_by_id(user_id)
+        return dict(user)
 
-    def delete(self, user_id):
+    def delete(self, user_id, expected_version=None):
         """
         Delete a user from the database based on their user ID.
 
+        The user's references to photo blobs are released, and blobs no longer referenced by
+        anyone are removed.
+
         Args:
             user_id (int): The ID of the user to delete.
+            expected_version (int, optional): The version the caller last read; the user is only
+                deleted if it is still at that version.
+
+        Returns:
+            bool: True if the user was deleted, False if there is no user with this ID.
+
+        Raises:
+            VersionConflictError: If the user is no longer at `expected_version`.
+        """
+        try:
+            deleted_ids, photo_hashes = self._delete_users([user_id], expected_version)
+        except VersionConflictError:
+            self.connection.rollback()
+            raise
+        self.connection.commit()
+        blob_store.collect(self.connection, photo_hashes)
+        user_count_cache.adjust(-len(deleted_ids))
+        self.invalidate(_user_namespace(user_id), PAGES_NAMESPACE, COUNT_NAMESPACE)
+
+        return bool(deleted_ids)
+
+    def bulk_create(self, users_data, profile_photos=None):
+        """
+        Create many users with multi-row INSERT statements inside a single transaction.
+
+        Users are inserted in chunks of BULK_CHUNK_SIZE rows with `ON CONFLICT (email) DO NOTHING`,
+        so each chunk costs one round trip, plus one reserving its IDs, and an email that is
+        already taken is reported instead of aborting the batch. Emails repeated within the request are reported as duplicates.
+
+        Args:
+            users_data (list): Dictionaries with the details of the users to create.
+            profile_photos (list, optional): Photo renditions aligned with `users_data`; None
+                entries mean the user is created without a photo.
+
+        Returns:
+            list: One result per input item, in order, with its "index", "status" ("created",
+            "conflict" or "duplicate") and the new "id" when created.
+        """
+        profile_photos = profile_photos or [None] * len(users_data)
+        results = [{"index": index, "id": None} for index in range(len(users_data))]
+        seen_emails = set()
+        pending = []
+
+        for index, user_data in enumerate(users_data):
+            email = user_data.get("email")
+            if email is not None and email in seen_emails:
+                results[index]["status"] = "duplicate"
+                continue
+            seen_emails.add(email)
+            pending.append(index)
+
+        for chunk in _chunks(pending, BULK_CHUNK_SIZE):
+            # IDs are reserved up front, as RETURNING does not promise the order of VALUES
+            user_ids = self.connection.execute(
+                text(
+                    "SELECT nextval(pg_get_serial_sequence('users', 'id')) "
+                    "FROM generate_series(1, :count)"
+                ),
+                {"count": len(chunk)},
+            ).scalars()
+            rows = []
+            for index, user_id in zip(chunk, user_ids):
+                user_data, profile_photo = users_data[index], profile_photos[index]
+                rows.append(
+                    {
+                        "id": user_id,
+                        "first_name": user_data.get("first_name"),
+                        "last_name": user_data.get("last_name"),
+                        "email": user_data.get("email"),
+                        "phone_number": user_data.get("phone_number"),
+                        **_photo_columns(profile_photo),
+                    }
+                )
+
+            query = (
+                pg_insert(User)
+                .values(rows)
+                .on_conflict_do_nothing(index_elements=[User.email])
+                .returning(User.id)
+            )
+            inserted = set(self.connection.execute(query).scalars())
+
+            for index, row in zip(chunk, rows):
+                created = row["id"] in inserted
+                results[index]["id"] = row["id"] if created else None
+                results[index]["status"] = "created" if created else "conflict"
+
+            self._store_photos(
+                {
+                    results[index]["id"]: profile_photos[index]
+                    for index in chunk
+                    if results[index]["status"] == "created"
+                }
+            )
+
+        self.connection.commit()
+        user_count_cache.adjust(
+            sum(result["status"] == "created" for result in results)
+        )
+        self.invalidate(
+            PAGES_NAMESPACE,
+            COUNT_NAMESPACE,
+            *(
+                _user_namespace(result["id"])
+                for result in results
+                if result["status"] == "created"
+            ),
+        )
+
+        return results
+
+    def bulk_update(self, users_data):
+        """
+        Update many users with chunked `UPDATE ... FROM (VALUES ...)` statements in one transaction.
+
+        Emails that already belong to another user, or that are repeated within the request, are
+        detected up front with a single lookup per chunk and reported as conflicts. Every chunk
+        runs in a savepoint, so a conflict introduced concurrently only fails its own chunk.
+
+        Args:
+            users_data (list): Dictionaries with the "id" and the new details of each user.
+
+        Returns:
+            list: One result per input item, in order, with its "index", "id" and "status"
+            ("updated", "not_found", "conflict", "duplicate" or "failed").
+        """
+        results = [
+            {"index": index, "id": user_data["id"]}
+            for index, user_data in enumerate(users_data)
+        ]
+        seen_ids, seen_emails = set(), set()
+        pending = []
+
+        for index, user_data in enumerate(users_data):
+            email = user_data.get("email")
+            if user_data["id"] in seen_ids or (
+                email is not None and email in seen_emails
+            ):
+                results[index]["status"] = "duplicate"
+                continue
+            seen_ids.add(user_data["id"])
+            seen_emails.add(email)
+            pending.append(index)
+
+        for chunk in _chunks(pending, BULK_CHUNK_SIZE):
+            emails = [
+                users_data[i]["email"] for i in chunk if users_data[i].get("email")
+            ]
+            owners = dict(
+                self.connection.execute(
+                    select(User.email, User.id).where(User.email.in_(emails))
+                ).all()
+            )
+
+            changes = []
+            for index in chunk:
+                user_data = users_data[index]
+                owner = owners.get(user_data.get("email"))
+                if owner is not None and owner != user_data["id"]:
+                    results[index]["status"] = "conflict"
+                    continue
+                changes.append(index)
+
+            if not changes:
+                continue
+
+            rows = values(
+                column("id", Integer),
+                column("first_name", String),
+                column("last_name", String),
+                column("email", String),
+                column("phone_number", String),
+                name="changes",
+            ).data(
+                [
+                    (
+                        users_data[i]["id"],
+                        users_data[i].get("first_name"),
+                        users_data[i].get("last_name"),
+                        users_data[i].get("email"),
+                        users_data[i].get("phone_number"),
+                    )
+                    for i in changes
+                ]
+            )
+            query = (
+                update(User)
+                .where(User.id == rows.c.id)
+                .values(
+                    first_name=rows.c.first_name,
+                    last_name=rows.c.last_name,
+                    email=rows.c.email,
+                    phone_number=rows.c.phone_number,
+                    version=User.version + 1,
+                )
+                .returning(User.id)
+            )
+
+            try:
+                with self.connection.begin_nested():
+                    updated_ids = set(self.connection.execute(query).scalars())
+            except IntegrityError as e:
+                for index in changes:
+                    results[index]["status"] = "failed"
+                    results[index]["error"] = str(e.orig)
+                continue
+
+            for index in changes:
+                updated = users_data[index]["id"] in updated_ids
+                results[index]["status"] = "updated" if updated else "not_found"
+
+        self.connection.commit()
+        self.invalidate(
+            PAGES_NAMESPACE,
+            *(
+                _user_namespace(result["id"])
+                for result in results
+                if result["status"] == "updated"
+            ),
+        )
+
+        return results
+
+    def bulk_delete(self, user_ids):
+        """
+        Delete many users with chunked `DELETE ... WHERE id IN (...)` statements in one transaction.
+
+        Args:
+            user_ids (list): The IDs of the users to delete.
 
         Returns:
-            None: Indicates the user was deleted successfully from the database.
+            list: One result per input item, in order, with its "index", "id" and "status"
+            ("deleted", "not_found" or "duplicate").
         """
-        query = delete(User).where(User.id == user_id)
-        self.connection.execute(query)
+        results = [
+            {"index": index, "id": user_id} for index, user_id in enumerate(user_ids)
+        ]
+        seen_ids = set()
+        pending = []
+
+        for index, user_id in enumerate(user_ids):
+            if user_id in seen_ids:
+                results[index]["status"] = "duplicate"
+                continue
+            seen_ids.add(user_id)
+            pending.append(index)
+
+        deleted_count = 0
+        released_hashes = []
+        for chunk in _chunks(pending, BULK_CHUNK_SIZE):
+            deleted_ids, photo_hashes = self._delete_users(
+                [user_ids[index] for index in chunk]
+            )
+            deleted_count += len(deleted_ids)
+            released_hashes += photo_hashes
+
+            for index in chunk:
+                deleted = user_ids[index] in deleted_ids
+                results[index]["status"] = "deleted" if deleted else "not_found"
+
         self.connection.commit()
+        blob_store.collect(self.connection, released_hashes)
+        user_count_cache.adjust(-deleted_count)
+        self.invalidate(
+            PAGES_NAMESPACE,
+            COUNT_NAMESPACE,
+            *(
+                _user_namespace(result["id"])
+                for result in results
+                if result["status"] == "deleted"
+            ),
+        )
+
+        return results
 
     def get_all(self, page=1, page_size=10):
         """
         Retrieve all users from the database with pagination.
 
+        Pages are served from the read cache and invalidated whenever users are written.
+
         Args:
             page (int): The current page number.
             page_size (int): The number of users to return per page.
@@ -100,35 +546,504 @@ class UserRepository:
         Returns:
             list: A list of user objects corresponding to the current page.
         """
-        offset = (page - 1) * page_size
-        query = select(User).offset(offset).limit(page_size)
+
+        def load():
+            offset = (page - 1) * page_size
+            query = select(*USER_VIEW_COLUMNS).offset(offset).limit(page_size)
+            result = self.connection.execute(query)
+            return [dict(user) for user in result.mappings().all()]
+
+        return self._read_through(*page_cache_entry(page, page_size), load)
+
+    def get_page_by_keyset(self, after_id=None, before_id=None, page_size=10):
+        """
+        Retrieve a page of users positioned relative to a known user ID (keyset pagination).
+
+        Instead of skipping rows with OFFSET, the query seeks straight to the cursor position
+        through the primary key index, so the cost of a page does not depend on its depth.
+        One extra row is fetched to find out whether another page exists in the direction
+        of travel.
+
+        Args:
+            after_id (int, optional): Return users with an ID greater than this one.
+            before_id (int, optional): Return users with an ID lower than this one.
+            page_size (int): The number of users to return.
+
+        Returns:
+            tuple: A list of user objects in ascending ID order and a boolean telling whether
+            more users exist beyond the page in the direction of travel.
+        """
+        if before_id is not None:
+            query = (
+                select(*USER_VIEW_COLUMNS)
+                .where(User.id < before_id)
+                .order_by(User.id.desc())
+                .limit(page_size + 1)
+            )
+        else:
+            query = (
+                select(*USER_VIEW_COLUMNS).order_by(User.id.asc()).limit(page_size + 1)
+            )
+            if after_id is not None:
+                query = query.where(User.id > after_id)
+
         result = self.connection.execute(query)
-        users = result.mappings().all()
-        return users
+        users = [dict(user) for user in result.mappings()]
+        has_more = len(users) > page_size
+        users = users[:page_size]
+
+        if before_id is not None:
+            users.reverse()
+
+        return users, has_more
+
+    def iter_all(self, include_photo=False, batch_size=EXPORT_BATCH_SIZE):
+        """
+        Iterate over every user in ID order through a server-side cursor.
+
+        Rows are fetched from the server `batch_size` at a time, so memory use stays constant
+        whatever the table size. The caller owns the transaction and should keep it open until
+        the iteration is exhausted.
+
+        Args:
+            include_photo (bool): Whether to include the original profile photo of each user,
+                loaded from the blob store one batch at a time.
+            batch_size (int): The number of rows fetched per round trip.
+
+        Yields:
+            list: Consecutive batches of user objects.
+        """
+        query = (
+            select(*USER_COLUMNS)
+            .order_by(User.id.asc())
+            .execution_options(stream_results=True, yield_per=batch_size)
+        )
+        result = self.connection.execute(query)
+
+        for batch in result.mappings().partitions():
+            if include_photo:
+                photos = blob_store.load_many(
+                    self.connection, [user["profile_photo_hash"] for user in batch]
+                )
+                batch = [
+                    {**user, "profile_photo": photos.get(user["profile_photo_hash"])}
+                    for user in batch
+                ]
+            yield batch
+
+    def search(
+        self,
+        filters=None,
+        any_field=None,
+        match="prefix",
+        sort="id",
+        descending=False,
+        after=None,
+        page_size=10,
+    ):
+        """
+        Search users by case-insensitive prefix or substring matches, with keyset pagination.
+
+        Prefix matches and sorting use the search key indexes declared on `User` (one btree over
+        the normalized column and the ID), so a page costs an index range scan however large the
+        table is. Substring matches use the pg_trgm indexes when they exist.
+
+        Args:
+            filters (dict, optional): Terms keyed by column name; every one of them must match.
+            any_field (str, optional): A term that must match at least one searchable column.
+            match (str): "prefix" or "contains".
+            sort (str): "id" or the name of a searchable column to sort by.
+            descending (bool): Whether to sort in descending order.
+            after (tuple, optional): The (sort key, ID) of the last user of the previous page;
+                the sort key is ignored when sorting by ID.
+            page_size (int): The number of users to return.
+
+        Returns:
+            tuple: A list of users, each with its "sort_key", and whether more users follow.
+        """
+        conditions = [
+            _match_condition(getattr(User, name), term, match)
+            for name, term in (filters or {}).items()
+        ]
+        if any_field:
+            conditions.append(
+                or_(
+                    *(
+                        _match_condition(getattr(User, name), any_field, match)
+                        for name in SEARCHABLE_COLUMNS
+                    )
+                )
+            )
+
+        if sort == "id":
+            sort_key = User.id
+            order = [User.id]
+            position = User.id
+            after_position = after[1] if after else None
+        else:
+            sort_key = search_key(getattr(User, sort))
+            order = [sort_key, User.id]
+            position = tuple_(sort_key, User.id)
+            after_position = tuple_(*after) if after else None
+
+        if after is not None:
+            conditions.append(
+                position < after_position if descending else position > after_position
+            )
+        if descending:
+            order = [expression.desc() for expression in order]
+
+        query = (
+            select(*USER_VIEW_COLUMNS, sort_key.label("sort_key"))
+            .where(*conditions)
+            .order_by(*order)
+            .limit(page_size + 1)
+        )
+
+        users = [dict(user) for user in self.connection.execute(query).mappings()]
+        return users[:page_size], len(users) > page_size
 
     def get_total_count(self):
         """
         Get the total count of users in the database.
 
+        The count is served from the read cache and invalidated whenever users are added or removed.
+
         Returns:
             int: The total number of users in the database.
         """
-        query = select(func.count()).select_from(User)
-        result = self.connection.execute(query)
-        total_count = result.scalar()
-        return total_count
+
+        def load():
+            query = select(func.count()).select_from(User)
+            result = self.connection.execute(query)
+            return result.scalar()
+
+        return self._read_through(*COUNT_CACHE_ENTRY, load)
+
+    def get_estimated_count(self):
+        """
+        Get the planner's estimate of the number of users from the table statistics.
+
+        The estimate comes from `pg_class.reltuples`, which is maintained by VACUUM/ANALYZE and
+        costs a single catalog lookup. Tables that have never been analyzed report -1.
+
+        Returns:
+            int: The estimated number of users, or None when no statistics are available.
+        """
+        query = text(
+            "SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(:table_name)"
+        )
+        result = self.connection.execute(query, {"table_name": User.__tablename__})
+        estimate = result.scalar()
+        return estimate if estimate is not None and estimate >= 0 else None
+
+    def count_users(self, strategy=None):
+        """
+        Get the number of users using the requested counting strategy.
+
+        Strategies:
+            - "exact": Always run COUNT(*) against the table.
+            - "cached": Serve an in-memory exact count kept current by create/delete and
+              refreshed from COUNT(*) once its TTL expires.
+            - "estimated": Use the planner statistics; small tables (below
+              USER_COUNT_ESTIMATE_EXACT_BELOW rows) and tables without statistics fall
+              back to an exact count, which is cheap at that size.
+
+        Args:
+            strategy (str, optional): One of COUNT_STRATEGIES. Defaults to USER_COUNT_STRATEGY.
+
+        Returns:
+            tuple: The number of users and its accuracy, one of "exact", "cached" or "estimated".
+
+        Raises:
+            ValueError: If the strategy is not one of COUNT_STRATEGIES.
+        """
+        strategy = strategy or COUNT_STRATEGY
+        if strategy not in COUNT_STRATEGIES:
+            raise ValueError(f"Unknown count strategy '{strategy}'")
+
+        if strategy == "cached":
+            cached_count = user_count_cache.get()
+            if cached_count is not None:
+                return cached_count, "cached"
+            total_count = self.get_total_count()
+            user_count_cache.set(total_count)
+            return total_count, "exact"
+
+        if strategy == "estimated":
+            estimate = self.get_estimated_count()
+            if estimate is not None and estimate >= ESTIMATE_EXACT_BELOW:
+                return estimate, "estimated"
+
+        return self.get_total_count(), "exact"
 
     def get_by_id(self, user_id):
         """
         Retrieve a single user by their ID from the database.
 
+        Users (and missing IDs) are served from the read cache and invalidated whenever the
+        user is written, including when it is created.
+
         Args:
             user_id (int): The ID of the user to retrieve.
 
         Returns:
-            User: The retrieved user object if found, otherwise None.
+            dict: The retrieved user if found, otherwise None.
         """
-        query = select(User).where(User.id == user_id)
-        result = self.connection.execute(query)
-        user = result.mappings().first()
-        return user if user else None
+
+        def load():
+            query = select(*USER_VIEW_COLUMNS).where(User.id == user_id)
+            result = self.connection.execute(query)
+            user = result.mappings().first()
+            return dict(user) if user else None
+
+        return self._read_through(*user_cache_entry(user_id), load)
+
+    def get_profile_photo_hash(self, user_id, size=ORIGINAL):
+        """
+        Retrieve only the content hash of a user's profile photo rendition.
+
+        Args:
+            user_id (int): The ID of the user.
+            size (str): The rendition, one of PHOTO_SIZES.
+
+        Returns:
+            tuple: Whether the user exists, the rendition hash (None when it is not stored) and
+            the hash of the original photo, which versions every rendition.
+        """
+        row = self.connection.execute(self._photo_query(user_id, size)).first()
+        return (True, row.photo_hash, row.version) if row else (False, None, None)
+
+    def get_profile_photo(self, user_id, size=ORIGINAL):
+        """
+        Retrieve a rendition of a user's profile photo together with its content hash.
+
+        Args:
+            user_id (int): The ID of the user.
+            size (str): The rendition, one of PHOTO_SIZES.
+
+        Returns:
+            tuple: The rendition bytes and hash and the hash of the original photo, with None
+            for whatever does not exist.
+        """
+        _, photo_hash, version = self.get_profile_photo_hash(user_id, size)
+        blob = self.get_photo_blob(photo_hash) if photo_hash else None
+        return (blob[1] if blob else None), photo_hash, version
+
+    def get_photo_blob(self, photo_hash, with_data=True):
+        """
+        Retrieve a photo from the blob store by its content hash.
+
+        Args:
+            photo_hash (str): The SHA-256 hex digest of the photo.
+            with_data (bool): Whether to read the bytes, or only the media type.
+
+        Returns:
+            tuple: The media type and the bytes (None if not requested), or None if there is no
+            such photo.
+        """
+        return blob_store.load(self.connection, photo_hash, with_data=with_data)
+
+    def store_renditions(self, user_id, renditions):
+        """
+        Store derived renditions for a user whose original photo is already stored.
+
+        Used to fill in renditions of photos stored before they were introduced, or after the
+        rendition settings changed. Renditions being replaced release their blobs.
+
+        Args:
+            user_id (int): The ID of the user.
+            renditions (dict): The renditions, as produced by `PhotoRenderer.render`.
+        """
+        # Locking the user keeps a concurrent delete from missing the renditions stored here
+        # when it releases the user's blobs, and serializes concurrent fills of the same user,
+        # which would otherwise both insert the same (user_id, size) keys
+        locked = self.connection.execute(
+            select(User.id).where(User.id == user_id).with_for_update()
+        ).first()
+        if locked is None:
+            self.connection.commit()
+            return
+
+        query = (
+            delete(ProfilePhotoRendition)
+            .where(
+                ProfilePhotoRendition.user_id == user_id,
+                ProfilePhotoRendition.size.in_(list(RENDITION_SIZES)),
+            )
+            .returning(ProfilePhotoRendition.photo_hash)
+        )
+        replaced_hashes = self.connection.execute(query).scalars().all()
+        blob_store.release(self.connection, replaced_hashes)
+        self._insert_renditions({user_id: renditions})
+        self.connection.commit()
+        blob_store.collect(self.connection, replaced_hashes)
+
+    def _read_through(self, key, namespaces, load):
+        """
+        Serve a read from the read cache, or straight from the database when not `cached`.
+        """
+        if not self.cached:
+            return load()
+        return read_cache.get_or_load(key, namespaces, load)
+
+    def _photo_query(self, user_id, size):
+        """
+        Build the query selecting the hash of a photo rendition and the original's hash.
+        """
+        if size == ORIGINAL:
+            return select(
+                User.profile_photo_hash.label("photo_hash"),
+                User.profile_photo_hash.label("version"),
+            ).where(User.id == user_id)
+
+        return (
+            select(
+                ProfilePhotoRendition.photo_hash,
+                User.profile_photo_hash.label("version"),
+            )
+            .select_from(User)
+            .outerjoin(
+                ProfilePhotoRendition,
+                and_(
+                    ProfilePhotoRendition.user_id == User.id,
+                    ProfilePhotoRendition.size == size,
+                ),
+            )
+            .where(User.id == user_id)
+        )
+
+    def _store_photos(self, renditions_by_user):
+        """
+        Store the originals and renditions of new users' photos within the current transaction.
+
+        The users rows must already reference their originals through `_photo_columns`.
+
+        Args:
+            renditions_by_user (dict): Renditions keyed by user ID; None values are skipped.
+        """
+        blob_store.acquire(
+            self.connection,
+            [
+                renditions[ORIGINAL]
+                for renditions in renditions_by_user.values()
+                if renditions
+            ],
+        )
+        self._insert_renditions(renditions_by_user)
+
+    def _insert_renditions(self, renditions_by_user):
+        """
+        Store the derived renditions of users' photos within the current transaction.
+
+        Args:
+            renditions_by_user (dict): Renditions keyed by user ID; None values are skipped.
+        """
+        rows = [
+            {"user_id": user_id, "size": size, "photo": renditions[size]}
+            for user_id, renditions in renditions_by_user.items()
+            if renditions
+            for size in RENDITION_SIZES
+            if renditions.get(size)
+        ]
+        if not rows:
+            return
+
+        photo_hashes = blob_store.acquire(
+            self.connection, [row.pop("photo") for row in rows]
+        )
+        for row, photo_hash in zip(rows, photo_hashes):
+            row["photo_hash"] = photo_hash
+        self.connection.execute(insert(ProfilePhotoRendition).values(rows))
+
+    def _delete_users(self, user_ids, expected_version=None):
+        """
+        Delete users and their renditions within the current transaction, releasing their blobs.
+
+        The users are locked first, so that no rendition can be stored for them in between.
+
+        Args:
+            user_ids (list): The IDs of the users to delete.
+            expected_version (int, optional): The version every user must be at.
+
+        Returns:
+            tuple: The set of IDs that were deleted and the hashes of the released blobs, to be
+            passed to `BlobStore.collect` once the transaction has committed.
+
+        Raises:
+            VersionConflictError: If a user is not at `expected_version`; nothing is deleted.
+        """
+        query = (
+            select(User.id, User.version, User.profile_photo_hash)
+            .where(User.id.in_(user_ids))
+            .with_for_update()
+        )
+        locked = self.connection.execute(query).all()
+        for user in locked:
+            if expected_version is not None and user.version != expected_version:
+                raise VersionConflictError(user.id, user.version)
+        if not locked:
+            return set(), []
+        photo_hashes = [user.profile_photo_hash for user in locked]
+
+        query = (
+            delete(ProfilePhotoRendition)
+            .where(ProfilePhotoRendition.user_id.in_(user_ids))
+            .returning(ProfilePhotoRendition.photo_hash)
+        )
+        photo_hashes += self.connection.execute(query).scalars().all()
+
+        query = delete(User).where(User.id.in_(user_ids)).returning(User.id)
+        deleted_ids = set(self.connection.execute(query).scalars())
+
+        blob_store.release(self.connection, photo_hashes)
+        return deleted_ids, photo_hashes
+
+
+def _photo_columns(renditions):
+    """
+    Return the users table values referencing the original rendition of a photo (or no photo).
+    """
+    original = renditions[ORIGINAL] if renditions else None
+    return {"profile_photo_hash": hash_profile_photo(original)}
+
+
+def _match_condition(column, term, match):
+    """
+    Build a case-insensitive prefix or substring condition on a column.
+
+    Prefix conditions are expressed on the column's search key so that its index can be used;
+    substring conditions use ILIKE on the raw column, which the trigram indexes support.
+    """
+    escaped = term.lower().replace("/", "//").replace("%", "/%").replace("_", "/_")
+    if match == "contains":
+        return column.ilike(f"%{escaped}%", escape="/")
+    return search_key(column).like(f"{escaped}%", escape="/")
+
+
+def page_cache_entry(page, page_size):
+    """
+    Return the read cache key and namespaces of a page of users.
+    """
+    return f"users:page:{page}:{page_size}", (USERS_NAMESPACE, PAGES_NAMESPACE)
+
+
+def user_cache_entry(user_id):
+    """
+    Return the read cache key and namespaces of a single user.
+    """
+    return f"user:{user_id}", (USERS_NAMESPACE, _user_namespace(user_id))
+
+
+def _user_namespace(user_id):
+    """
+    Return the read cache namespace of a single user.
+    """
+    return f"user:{user_id}"
+
+
+def _chunks(items, size):
+    """
+    Split a list into consecutive slices of at most `size` items.
+    """
+    return [items[start : start + size] for start in range(0, len(items), size)]
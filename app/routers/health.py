@@ -7,7 +7,21 @@
 import os
 
 import asyncpg
-from fastapi import APIRouter, HTTPException
+from database.async_engine import DATABASE_ASYNC, get_async_pool_status
+from database.connection_context import ConnectionContext
+from database.engine import get_pool_status
+from database.replicas import READ_REPLICAS_ENABLED, replica_pool
+from database.slow_queries import SLOW_QUERY_LOG_SIZE, slow_query_log
+from fastapi import APIRouter, HTTPException, Query, status
+from fastapi.responses import JSONResponse, PlainTextResponse, Response
+from services.blob_store import blob_store
+from services.change_feed import change_feed
+from services.photo_renditions import photo_renderer
+from services.photo_reservoir import photo_reservoir
+from services.photo_worker import profile_photo_worker
+from services.profiler import profile_store
+from services.read_cache import read_cache
+from services.readiness import readiness
 
 router = APIRouter()
 
@@ -23,6 +37,28 @@ def ping():
     return "Pong"
 
 
+@router.get("/ready")
+def ready():
+    """
+    Tells whether this worker has finished warming up and should receive traffic.
+
+    Unlike /ping, which only shows the process is alive, this answers 503 until the connection
+    pools are filled and the caches are loaded, see `services.readiness`.
+
+    Returns:
+        JSONResponse: The readiness and warm-up steps, with status 200 once ready and 503 before.
+    """
+    readiness_status = readiness.status()
+    return JSONResponse(
+        status_code=(
+            status.HTTP_200_OK
+            if readiness_status["ready"]
+            else status.HTTP_503_SERVICE_UNAVAILABLE
+        ),
+        content=readiness_status,
+    )
+
+
 @router.get("/test-database")
 async def test_database_connection():
     """
@@ -51,3 +87,159 @@ async def test_database_connection():
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/pool")
+def pool_status():
+    """
+    Reports the state of this worker's shared database connection pool.
+
+    The response includes the configured size and overflow, how many connections are currently
+    checked out, the resulting saturation (checked out / capacity), checkout counters and the
+    distribution of time callers spent waiting to acquire a connection. When DATABASE_ASYNC is
+    enabled, the asyncpg pool used by the users endpoints is reported under "async". When
+    DATABASE_READ_URLS is set, the health and pools of the read replicas are reported under
+    "read_replicas".
+
+    Returns:
+        dict: The pool configuration, usage and wait-time statistics.
+    """
+    status = get_pool_status()
+    if DATABASE_ASYNC:
+        status["async"] = get_async_pool_status()
+    if READ_REPLICAS_ENABLED:
+        status["read_replicas"] = replica_pool.stats()
+    return status
+
+
+@router.get("/change-feed")
+def change_feed_status():
+    """
+    Reports the state of this worker's change feed listener and its subscribed clients.
+
+    Returns:
+        dict: Whether the listener is connected, the last published sequence number, the
+        number of subscribers and the notification, gap, reset and overflow counters.
+    """
+    return change_feed.stats()
+
+
+@router.get("/photo-worker")
+def photo_worker_status():
+    """
+    Reports the configuration and job counters of the background profile photo worker.
+
+    Returns:
+        dict: The worker size, queue bound and submitted/stored/failed/dropped job counts.
+    """
+    return profile_photo_worker.stats()
+
+
+@router.get("/photo-reservoir")
+def photo_reservoir_status():
+    """
+    Reports the fill level and hit/miss/refill counters of the pre-fetched photo reservoir.
+
+    Returns:
+        dict: The reservoir watermarks, current size, hit ratio and refill statistics.
+    """
+    return photo_reservoir.stats()
+
+
+@router.get("/photo-renderer")
+def photo_renderer_status():
+    """
+    Reports the configuration and counters of the photo rendition process pool.
+
+    Returns:
+        dict: The number of worker processes, rendition sizes and render statistics.
+    """
+    return photo_renderer.stats()
+
+
+@router.get("/blob-store")
+def blob_store_status():
+    """
+    Reports the size of the photo blob store and how much storage deduplication saves.
+
+    Returns:
+        dict: The backend, blob and reference counts, stored and referenced bytes.
+    """
+    with ConnectionContext() as connection:
+        return blob_store.stats(connection)
+
+
+@router.get("/cache")
+def read_cache_status():
+    """
+    Reports the size and hit/miss/eviction counters of the user read cache.
+
+    Returns:
+        dict: The cache backend, entry count, hit ratio, eviction and invalidation counters.
+    """
+    return read_cache.stats()
+
+
+@router.get("/slow-queries")
+def slow_queries(limit: int = Query(50, ge=1, le=max(SLOW_QUERY_LOG_SIZE, 1))):
+    """
+    Lists the most recent statements that ran longer than SLOW_QUERY_THRESHOLD_MS.
+
+    Each entry has the SQL, its redacted parameters, the duration, the route that ran it and,
+    for the sampled share set by SLOW_QUERY_EXPLAIN_RATE, the captured execution plan.
+
+    Args:
+        limit (int): The maximum number of entries to return, newest first.
+
+    Returns:
+        dict: The log settings, counters and entries.
+    """
+    return slow_query_log.snapshot(limit)
+
+
+@router.delete("/slow-queries", status_code=204)
+def clear_slow_queries():
+    """
+    Empties the slow-query log, e.g. before reproducing a slowdown.
+    """
+    slow_query_log.clear()
+    return Response(status_code=204)
+
+
+@router.get("/profiles")
+def list_profiles():
+    """
+    Lists the stored request profiles, newest first.
+
+    Requests are profiled when they send `X-Profile: <PROFILING_TOKEN>` or are picked by
+    PROFILING_SAMPLE_RATE; the id of a profile is returned in their `X-Profile-Id` header.
+
+    Returns:
+        list: The method, path, route, status, duration and sample count of each profile.
+    """
+    return profile_store.summaries()
+
+
+@router.get("/profiles/{profile_id}")
+def download_profile(profile_id: int):
+    """
+    Downloads a request profile as collapsed stacks, ready for flamegraph.pl or speedscope.
+
+    Args:
+        profile_id (int): The id from the `X-Profile-Id` response header.
+
+    Returns:
+        PlainTextResponse: One "frame;frame;frame count" line per stack, or a 404 JSON response.
+    """
+    profile = profile_store.get(profile_id)
+    if profile is None:
+        return JSONResponse(
+            status_code=status.HTTP_404_NOT_FOUND,
+            content={"message": "Profile not found"},
+        )
+    return PlainTextResponse(
+        profile["collapsed"],
+        headers={
+            "Content-Disposition": f'attachment; filename="profile-{profile_id}.folded"'
+        },
+    )
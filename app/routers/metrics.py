@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+    The "metrics" endpoint exports the metrics of this worker process in the Prometheus text format
+"""
+from database.async_engine import DATABASE_ASYNC, get_async_pool_status
+from database.engine import get_pool_status
+from fastapi import APIRouter
+from fastapi.responses import Response
+from services.metrics import PROMETHEUS_CONTENT_TYPE, metrics_registry
+
+router = APIRouter()
+
+
+@router.get("/metrics", include_in_schema=False)
+def read_metrics():
+    """
+    Export the request, database, pool and photo-fetch metrics for Prometheus to scrape.
+
+    Metrics are kept per worker process; with several uvicorn workers every scrape reaches one
+    of them, so run a single worker per scrape target (or one target per worker port).
+
+    Returns:
+        Response: The metrics in the Prometheus text exposition format.
+    """
+    return Response(metrics_registry.render(), media_type=PROMETHEUS_CONTENT_TYPE)
+
+
+def pool_metrics():
+    """
+    Describe the connection pools at scrape time.
+
+    Returns:
+        list: (name, documentation, kind, samples) tuples, one pool per "pool" label.
+    """
+    pools = {"sync": get_pool_status()}
+    if DATABASE_ASYNC:
+        pools["async"] = get_async_pool_status()
+
+    def samples(field):
+        return [({"pool": name}, status[field]) for name, status in pools.items()]
+
+    return [
+        (
+            "db_pool_checked_out",
+            "Connections currently checked out of the pool.",
+            "gauge",
+            samples("checked_out"),
+        ),
+        (
+            "db_pool_capacity",
+            "Pool size plus the allowed overflow.",
+            "gauge",
+            samples("capacity"),
+        ),
+        (
+            "db_pool_checkouts",
+            "Connections checked out of the pool.",
+            "counter",
+            samples("checkouts"),
+        ),
+        (
+            "db_pool_acquire_timeouts",
+            "Acquisitions that gave up after the pool timeout.",
+            "counter",
+            samples("acquire_timeouts"),
+        ),
+    ]
+
+
+metrics_registry.add_collector(pool_metrics)
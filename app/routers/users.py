@@ -1,103 +1,503 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 """
-    The users endpoints provide a way to perform CRUD operations on our database for our users table
+    The users endpoints provide a way to perform CRUD operations on our database for our users table.
+
+    Handlers are async and use an awaitable repository: asyncpg-backed when DATABASE_ASYNC is set,
+    otherwise the synchronous repository run on the threadpool.
 """
-import base64
+import io
+import os
 from logging import getLogger
+from typing import List, Literal, Optional
 
 from database.connection_context import get_connection
-from fastapi import APIRouter, Depends, status
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, Depends, Query, Request, UploadFile, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, Response, StreamingResponse
+from models.bulk_user_delete import BulkUserDelete
+from models.bulk_user_update import BulkUserUpdate
+from models.cursor_parameters import CursorParams
 from models.pagination_parameters import PaginationParams
 from models.user import User
-from repositories.user_repository import UserRepository
+from models.user_search_parameters import MIN_CONTAINS_LENGTH, UserSearchParams
+from models.user_update import UserUpdate
+from repositories.async_user_repository import (
+    AsyncUserRepository,
+    get_read_user_repository,
+    get_user_repository,
+)
+from repositories.user_repository import VersionConflictError
+from services.blob_store import blob_store
+from services.change_feed import CHANGE_FEED_ENABLED, change_feed
+from services.cursor import decode_cursor, encode_cursor
+from services.photo_renditions import ORIGINAL, photo_renderer
+from services.photo_reservoir import photo_reservoir
+from services.photo_worker import profile_photo_worker
+from services.profile_photo import (
+    PHOTO_VERSION_LENGTH,
+    detect_content_type,
+    hash_profile_photo,
+)
+from services.serialization import ORJSONResponse
+from services.user_export import EXPORT_MEDIA_TYPES, export_users
+from services.user_import import detect_import_format, import_users
+from settings import env_int
 from sqlalchemy.orm import Session
 
-router = APIRouter()
+router = APIRouter(default_response_class=ORJSONResponse)
 logger = getLogger(__name__)
 
+PHOTO_CACHE_MAX_AGE = env_int("PROFILE_PHOTO_CACHE_MAX_AGE", 31536000)
+BULK_MAX_ITEMS = env_int("BULK_MAX_ITEMS", 10000)
+
 
 @router.post("/")
-def create(user_data: User, db: Session = Depends(get_connection)):
+async def create(
+    user_data: User, user_repo: AsyncUserRepository = Depends(get_user_repository)
+):
     """
     Create a new user in the database.
 
+    The profile photo is taken from the pre-fetched photo reservoir. When the reservoir is empty
+    the user is committed without one and the background photo worker attaches a photo once it
+    arrives, so creation latency never depends on the photo service.
+
     Args:
         user_data (User): The user data from the request payload.
-        db (Session): Database session dependency.
+        user_repo (AsyncUserRepository): User repository dependency.
 
     Returns:
-        JSONResponse: A response object with status code, message, and user data or error details.
+        JSONResponse: A 201 response with the new user, including its ID and version, and its
+        URL in the Location header, or the error details.
     """
     try:
         logger.info("Attempting to create a new user")
-        user_repo = UserRepository(db)
-        user_repo.create(user_data.model_dump())
+        profile_photo = photo_reservoir.take()
+        user = await user_repo.create(
+            user_data.model_dump(), profile_photo=profile_photo
+        )
 
-        return JSONResponse(
+        if profile_photo is None:
+            profile_photo_worker.submit(user["id"])
+
+        return ORJSONResponse(
             status_code=status.HTTP_201_CREATED,
+            headers={"Location": f"/users/{user['id']}"},
             content={
                 "message": "User created successfully",
-                "data": user_data.model_dump(),
+                "data": user,
             },
         )
     except Exception as e:
         logger.exception("Failed to create user")
-        return JSONResponse(
+        return ORJSONResponse(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             content={"message": str(e)},
         )
 
 
+def summarize_bulk_results(results):
+    """
+    Count the per-item results of a bulk operation by status.
+
+    Args:
+        results (list): The per-item results returned by the repository.
+
+    Returns:
+        dict: The number of items for each status.
+    """
+    summary = {}
+    for result in results:
+        summary[result["status"]] = summary.get(result["status"], 0) + 1
+    return summary
+
+
+def bulk_too_large(items):
+    """
+    Build the error response for bulk requests above BULK_MAX_ITEMS, if needed.
+
+    Args:
+        items (list): The items of the bulk request.
+
+    Returns:
+        JSONResponse: A 413 response when the request is too large, otherwise None.
+    """
+    if len(items) <= BULK_MAX_ITEMS:
+        return None
+    return ORJSONResponse(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        content={
+            "message": f"A bulk request may contain at most {BULK_MAX_ITEMS} items"
+        },
+    )
+
+
+@router.post("/bulk")
+async def bulk_create(
+    users_data: List[User],
+    user_repo: AsyncUserRepository = Depends(get_user_repository),
+):
+    """
+    Create many users in a single transaction.
+
+    Users are inserted with chunked multi-row INSERT statements and one commit. Photos are
+    taken from the photo reservoir while it lasts; the remaining users get theirs from the
+    background photo worker.
+
+    Args:
+        users_data (List[User]): The users to create.
+        user_repo (AsyncUserRepository): User repository dependency.
+
+    Returns:
+        JSONResponse: A response object with one result per item ("created", "conflict" when
+        the email is already taken, or "duplicate" when it is repeated in the request).
+    """
+    too_large = bulk_too_large(users_data)
+    if too_large:
+        return too_large
+
+    try:
+        logger.info(f"Attempting to create {len(users_data)} users in bulk")
+        profile_photos = photo_reservoir.take_many(len(users_data))
+        profile_photos += [None] * (len(users_data) - len(profile_photos))
+        results = await user_repo.bulk_create(
+            [user.model_dump() for user in users_data], profile_photos=profile_photos
+        )
+
+        for result, profile_photo in zip(results, profile_photos):
+            if result["status"] == "created" and profile_photo is None:
+                profile_photo_worker.submit(result["id"])
+
+        return ORJSONResponse(
+            status_code=status.HTTP_200_OK,
+            content={
+                "message": "Bulk create completed",
+                "summary": summarize_bulk_results(results),
+                "data": results,
+            },
+        )
+    except Exception as e:
+        logger.exception("Failed to create users in bulk")
+        return ORJSONResponse(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            content={
+                "message": "An error occurred while creating the users",
+                "error": str(e),
+            },
+        )
+
+
+@router.put("/bulk")
+async def bulk_update(
+    users_data: List[BulkUserUpdate],
+    user_repo: AsyncUserRepository = Depends(get_user_repository),
+):
+    """
+    Update many users in a single transaction.
+
+    Args:
+        users_data (List[BulkUserUpdate]): The ID and new details of every user to update.
+        user_repo (AsyncUserRepository): User repository dependency.
+
+    Returns:
+        JSONResponse: A response object with one result per item ("updated", "not_found",
+        "conflict" when the email belongs to another user, "duplicate" or "failed").
+    """
+    too_large = bulk_too_large(users_data)
+    if too_large:
+        return too_large
+
+    try:
+        logger.info(f"Attempting to update {len(users_data)} users in bulk")
+        results = await user_repo.bulk_update(
+            [user.model_dump() for user in users_data]
+        )
+
+        return ORJSONResponse(
+            status_code=status.HTTP_200_OK,
+            content={
+                "message": "Bulk update completed",
+                "summary": summarize_bulk_results(results),
+                "data": results,
+            },
+        )
+    except Exception as e:
+        logger.exception("Failed to update users in bulk")
+        return ORJSONResponse(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            content={
+                "message": "An error occurred while updating the users",
+                "error": str(e),
+            },
+        )
+
+
+@router.delete("/bulk")
+async def bulk_delete(
+    request_data: BulkUserDelete,
+    user_repo: AsyncUserRepository = Depends(get_user_repository),
+):
+    """
+    Delete many users in a single transaction.
+
+    Args:
+        request_data (BulkUserDelete): The IDs of the users to delete.
+        user_repo (AsyncUserRepository): User repository dependency.
+
+    Returns:
+        JSONResponse: A response object with one result per ID ("deleted", "not_found" or
+        "duplicate").
+    """
+    too_large = bulk_too_large(request_data.ids)
+    if too_large:
+        return too_large
+
+    try:
+        logger.info(f"Attempting to delete {len(request_data.ids)} users in bulk")
+        results = await user_repo.bulk_delete(request_data.ids)
+
+        return ORJSONResponse(
+            status_code=status.HTTP_200_OK,
+            content={
+                "message": "Bulk delete completed",
+                "summary": summarize_bulk_results(results),
+                "data": results,
+            },
+        )
+    except Exception as e:
+        logger.exception("Failed to delete users in bulk")
+        return ORJSONResponse(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            content={
+                "message": "An error occurred while deleting the users",
+                "error": str(e),
+            },
+        )
+
+
+@router.post("/import")
+def import_file(
+    file: UploadFile,
+    file_format: Optional[Literal["csv", "ndjson"]] = Query(
+        default=None, alias="format"
+    ),
+    on_conflict: Literal["skip", "update"] = "skip",
+    db: Session = Depends(get_connection),
+):
+    """
+    Import users from an uploaded CSV (with a header row) or NDJSON file.
+
+    The upload is read line by line and loaded in chunks through COPY into a staging table,
+    then merged into the users table on email; memory use does not grow with the file size.
+    Imported users do not get profile photos.
+
+    Args:
+        file (UploadFile): The uploaded file.
+        file_format (Optional[str]): "csv" or "ndjson"; inferred from the file name when omitted.
+        on_conflict (str): "skip" keeps existing users with the same email, "update" overwrites them.
+        db (Session): Database session dependency.
+
+    Returns:
+        JSONResponse: A response object with the import summary (rows read, valid, invalid,
+        inserted, updated, skipped, duration, rows per second and the first errors).
+    """
+    file_format = file_format or detect_import_format(file.filename)
+    if file_format is None:
+        return ORJSONResponse(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            content={"message": "Could not determine the file format, pass ?format="},
+        )
+
+    try:
+        logger.info(f"Importing users from {file.filename} ({file_format})")
+        stream = io.TextIOWrapper(file.file, encoding="utf-8", newline="")
+        summary = import_users(db, stream, file_format, on_conflict=on_conflict)
+
+        return ORJSONResponse(
+            status_code=status.HTTP_200_OK,
+            content={"message": "Import completed", "data": summary},
+        )
+    except Exception as e:
+        logger.exception("Failed to import users")
+        return ORJSONResponse(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            content={
+                "message": "An error occurred while importing users",
+                "error": str(e),
+            },
+        )
+
+
+def photo_cache_headers(photo_hash, versioned):
+    """
+    Build the caching headers for a profile photo response.
+
+    Args:
+        photo_hash (str): The SHA-256 hex digest of the photo, used as a strong ETag.
+        versioned (bool): Whether the request URL pinned this exact photo version, in which case
+            the response can never change and is marked immutable.
+
+    Returns:
+        dict: The ETag and Cache-Control headers.
+    """
+    cache_control = f"public, max-age={PHOTO_CACHE_MAX_AGE}"
+    cache_control += ", immutable" if versioned else ", no-cache"
+    return {"ETag": f'"{photo_hash}"', "Cache-Control": cache_control}
+
+
+def is_versioned(v, version):
+    """
+    Tell whether a photo request pinned the current photo version.
+
+    Args:
+        v (Optional[str]): The `v` query parameter of the request.
+        version (Optional[str]): The hash of the user's original photo.
+
+    Returns:
+        bool: True if `v` is the version prefix of `version`.
+    """
+    return bool(version) and v == version[:PHOTO_VERSION_LENGTH]
+
+
+def etag_matches(if_none_match, photo_hash):
+    """
+    Check whether an If-None-Match header matches the photo's ETag.
+
+    Args:
+        if_none_match (str): The raw If-None-Match request header.
+        photo_hash (str): The SHA-256 hex digest of the photo.
+
+    Returns:
+        bool: True when the client already holds the current photo.
+    """
+    candidates = [
+        tag.strip().removeprefix("W/").strip('"') for tag in if_none_match.split(",")
+    ]
+    return "*" in candidates or photo_hash in candidates
+
+
 @router.get("/")
-def read_all(
+async def read_all(
     pagination: PaginationParams = Depends(),
-    db: Session = Depends(get_connection),
+    cursor: CursorParams = Depends(),
+    user_repo: AsyncUserRepository = Depends(get_read_user_repository),
 ):
     """
     Retrieve all users from the database with pagination.
 
+    Two pagination modes are supported. The default page mode uses `page`/`page_size` and
+    reports the total count and number of pages, computed with the configured count strategy
+    (USER_COUNT_STRATEGY) and labelled by `count_accuracy` as "exact", "cached" or
+    "estimated"; `include_count=false` skips the count altogether. Cursor mode (`mode=cursor`,
+    or any of `after`/`before`) seeks by user ID and returns `next_cursor`/`prev_cursor`
+    tokens, so every page costs the same no matter how deep it is. When DATABASE_READ_URLS is
+    set, pages are read from a replica unless the client wrote moments ago.
+
     Args:
         pagination (PaginationParams): Pagination parameters.
-        db (Session): Database session dependency.
+        cursor (CursorParams): Keyset pagination parameters.
+        user_repo (AsyncUserRepository): User repository dependency.
 
     Returns:
         JSONResponse: A response object with all users and pagination details.
     """
+    if cursor.enabled:
+        return await read_page_by_cursor(cursor, pagination.page_size, user_repo)
+
     try:
         logger.info("Fetching users from database")
-        user_repo = UserRepository(db)
-        users = user_repo.get_all(page=pagination.page, page_size=pagination.page_size)
-        total_users = user_repo.get_total_count()
-        total_pages = (total_users + pagination.page_size - 1) // pagination.page_size
+        users = await user_repo.get_all(
+            page=pagination.page, page_size=pagination.page_size
+        )
+
+        total_users, total_pages, count_accuracy = None, None, None
+        if pagination.include_count:
+            total_users, count_accuracy = await user_repo.count_users()
+            total_pages = (
+                total_users + pagination.page_size - 1
+            ) // pagination.page_size
 
-        return JSONResponse(
+        return ORJSONResponse(
             status_code=status.HTTP_200_OK,
             content={
                 "message": "Users fetched successfully",
-                "data": [
-                    {
-                        "id": user.id,
-                        "first_name": user.first_name,
-                        "last_name": user.last_name,
-                        "email": user.email,
-                        "phone_number": user.phone_number,
-                        "profile_photo": (
-                            base64.b64encode(user.profile_photo).decode("utf-8")
-                            if user.profile_photo
-                            else None
-                        ),
-                    }
-                    for user in users
-                ],
+                "data": users,
                 "total_pages": total_pages,
                 "total_count": total_users,
+                "count_accuracy": count_accuracy,
             },
         )
     except Exception as e:
         logger.exception("Failed to fetch users")
-        return JSONResponse(
+        return ORJSONResponse(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            content={
+                "message": "An error occurred while fetching users",
+                "error": str(e),
+            },
+        )
+
+
+async def read_page_by_cursor(cursor, page_size, user_repo):
+    """
+    Retrieve a page of users using keyset pagination.
+
+    Args:
+        cursor (CursorParams): Keyset pagination parameters.
+        page_size (int): The number of users to return.
+        user_repo (AsyncUserRepository): The user repository.
+
+    Returns:
+        JSONResponse: A response object with the users and the cursors of the adjacent pages.
+    """
+    if cursor.after is not None and cursor.before is not None:
+        return ORJSONResponse(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            content={"message": "Only one of 'after' or 'before' may be provided"},
+        )
+
+    try:
+        after_id = decode_cursor(cursor.after)["id"] if cursor.after else None
+        before_id = decode_cursor(cursor.before)["id"] if cursor.before else None
+    except ValueError as e:
+        return ORJSONResponse(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            content={"message": "Invalid pagination cursor", "error": str(e)},
+        )
+
+    try:
+        logger.info("Fetching users from database by cursor")
+        users, has_more = await user_repo.get_page_by_keyset(
+            after_id=after_id, before_id=before_id, page_size=page_size
+        )
+
+        if before_id is not None:
+            has_next, has_prev = True, has_more
+        else:
+            has_next, has_prev = has_more, after_id is not None
+
+        return ORJSONResponse(
+            status_code=status.HTTP_200_OK,
+            content={
+                "message": "Users fetched successfully",
+                "data": users,
+                "page_size": page_size,
+                "next_cursor": (
+                    encode_cursor({"id": users[-1]["id"]})
+                    if users and has_next
+                    else None
+                ),
+                "prev_cursor": (
+                    encode_cursor({"id": users[0]["id"]})
+                    if users and has_prev
+                    else None
+                ),
+            },
+        )
+    except Exception as e:
+        logger.exception("Failed to fetch users by cursor")
+        return ORJSONResponse(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             content={
                 "message": "An error occurred while fetching users",
@@ -106,41 +506,398 @@ def read_all(
         )
 
 
+@router.get("/search")
+async def search(
+    params: UserSearchParams = Depends(),
+    user_repo: AsyncUserRepository = Depends(get_user_repository),
+):
+    """
+    Search users by prefix or substring on their names, email and phone number.
+
+    Results are paged with keyset pagination: pass the returned `next_cursor` as `after` to get
+    the next page. Cursors are tied to the sort they were issued for.
+
+    Args:
+        params (UserSearchParams): The search terms, sort and pagination parameters.
+        user_repo (AsyncUserRepository): User repository dependency.
+
+    Returns:
+        JSONResponse: A response object with the matching users and the next page cursor.
+    """
+    if params.match == "contains" and any(
+        len(term) < MIN_CONTAINS_LENGTH for term in params.terms
+    ):
+        return ORJSONResponse(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            content={
+                "message": f"Substring searches need at least {MIN_CONTAINS_LENGTH} characters"
+            },
+        )
+
+    after = None
+    if params.after:
+        try:
+            position = decode_cursor(params.after)
+            if position.get("sort") != params.sort:
+                raise ValueError("The cursor was issued for another sort")
+            after = (position["key"], position["id"])
+            key_type = int if params.sort == "id" else str
+            if type(after[0]) is not key_type or type(after[1]) is not int:
+                raise ValueError("The cursor does not hold a valid position")
+        except (KeyError, ValueError) as e:
+            return ORJSONResponse(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                content={"message": "Invalid pagination cursor", "error": str(e)},
+            )
+
+    try:
+        logger.info("Searching users")
+        users, has_more = await user_repo.search(
+            filters=params.filters,
+            any_field=params.q,
+            match=params.match,
+            sort=params.sort,
+            descending=params.order == "desc",
+            after=after,
+            page_size=params.page_size,
+        )
+
+        next_cursor = None
+        if users and has_more:
+            last = users[-1]
+            next_cursor = encode_cursor(
+                {"id": last["id"], "key": last["sort_key"], "sort": params.sort}
+            )
+        for user in users:
+            del user["sort_key"]
+
+        return ORJSONResponse(
+            status_code=status.HTTP_200_OK,
+            content={
+                "message": "Users fetched successfully",
+                "data": users,
+                "page_size": params.page_size,
+                "next_cursor": next_cursor,
+            },
+        )
+    except Exception as e:
+        logger.exception("Failed to search users")
+        return ORJSONResponse(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            content={
+                "message": "An error occurred while searching users",
+                "error": str(e),
+            },
+        )
+
+
+@router.get("/export")
+async def export(
+    file_format: Literal["ndjson", "csv"] = Query(default="ndjson", alias="format"),
+    include_photos: bool = False,
+):
+    """
+    Stream every user as NDJSON or CSV.
+
+    Rows are read from a server-side cursor inside a single read-only snapshot and sent as a
+    chunked response while they are fetched, so memory use stays constant whatever the table
+    size and the export is consistent even under concurrent writes.
+
+    Args:
+        file_format (str): "ndjson" (the default) or "csv".
+        include_photos (bool): Whether to include base64 encoded profile photos.
+
+    Returns:
+        StreamingResponse: The export, served as an attachment.
+    """
+    logger.info(f"Exporting users as {file_format}")
+    return StreamingResponse(
+        export_users(file_format, include_photos=include_photos),
+        media_type=EXPORT_MEDIA_TYPES[file_format],
+        headers={"Content-Disposition": f'attachment; filename="users.{file_format}"'},
+    )
+
+
+@router.get("/changes")
+async def changes(request: Request, after: Optional[int] = Query(default=None, ge=0)):
+    """
+    Stream the changes made to users as server-sent events, so clients keep their view of the
+    users up to date without polling.
+
+    Each "created", "updated" or "deleted" event carries its sequence number as the event ID,
+    and as data the operation, the user ID and version after the change, and the user as it is
+    now (null once deleted). Browsers resume after the last event they received through the
+    Last-Event-ID header when they reconnect; other clients can pass `after` instead. A "reset"
+    event means that changes were missed and the users should be reloaded.
+
+    Args:
+        request (Request): The request, for its Last-Event-ID header.
+        after (int, optional): The last sequence number received; without it, or the header,
+            only changes from now on are sent.
+
+    Returns:
+        StreamingResponse: The event stream, or a 503 response when the change feed is not
+        listening yet.
+    """
+    last_event_id = request.headers.get("last-event-id", "")
+    if last_event_id.isdigit():
+        after = int(last_event_id)
+
+    if not CHANGE_FEED_ENABLED or change_feed.published_seq is None:
+        return ORJSONResponse(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            content={"message": "The change feed is not available"},
+        )
+
+    logger.info(f"Streaming user changes after {after}")
+    return StreamingResponse(
+        change_feed.stream(after),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/{user_id}")
+async def read(
+    user_id: int, user_repo: AsyncUserRepository = Depends(get_read_user_repository)
+):
+    """
+    Retrieve a single user by their ID, from a replica when DATABASE_READ_URLS is set.
+
+    Args:
+        user_id (int): The ID of the user to retrieve.
+        user_repo (AsyncUserRepository): User repository dependency.
+
+    Returns:
+        JSONResponse: A response object with the user, or a 404 if the user does not exist.
+    """
+    try:
+        logger.info(f"Fetching user with ID {user_id}")
+        user = await user_repo.get_by_id(user_id)
+
+        if not user:
+            return ORJSONResponse(
+                status_code=status.HTTP_404_NOT_FOUND,
+                content={"message": "User not found"},
+            )
+
+        return ORJSONResponse(
+            status_code=status.HTTP_200_OK,
+            content={
+                "message": "User fetched successfully",
+                "data": user,
+            },
+        )
+    except Exception as e:
+        logger.exception(f"Failed to fetch user with ID {user_id}")
+        return ORJSONResponse(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            content={
+                "message": "An error occurred while fetching the user",
+                "error": str(e),
+            },
+        )
+
+
+@router.get("/{user_id}/photo")
+async def read_photo(
+    user_id: int,
+    request: Request,
+    v: Optional[str] = None,
+    size: Literal["small", "medium", "original"] = "original",
+    user_repo: AsyncUserRepository = Depends(get_user_repository),
+):
+    """
+    Serve a rendition of a user's profile photo.
+
+    `size` selects a small (64px) or medium (256px) square thumbnail or the full-size original.
+    Thumbnails of photos stored before renditions existed are rendered on first request in the
+    photo process pool and stored. The photo is sent from the blob store with its content type
+    and a strong ETag derived from its SHA-256 hash; with the filesystem blob store it is streamed
+    from its file. Conditional requests carrying a matching If-None-Match are answered with
+    304 Not Modified after reading only the hash, without loading the photo.
+    Requests whose `v` parameter matches the hash of the original (as produced by
+    `profile_photo_url`) are marked immutable so that browsers never revalidate them.
+
+    Args:
+        user_id (int): The ID of the user whose photo is requested.
+        request (Request): The incoming request, used for conditional headers.
+        v (Optional[str]): The photo version from `profile_photo_url`.
+        size (str): The rendition to serve, "small", "medium" or "original".
+        user_repo (AsyncUserRepository): User repository dependency.
+
+    Returns:
+        Response: The image bytes, a 304 response, or a 404 JSON response if there is no photo.
+    """
+    try:
+        if_none_match = request.headers.get("if-none-match")
+        _, photo_hash, version = await user_repo.get_profile_photo_hash(
+            user_id, size=size
+        )
+        headers = photo_cache_headers(photo_hash, is_versioned(v, version))
+
+        if photo_hash and if_none_match and etag_matches(if_none_match, photo_hash):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+        if photo_hash is None and version is not None and size != ORIGINAL:
+            photo, photo_hash = await render_missing_rendition(user_id, size, user_repo)
+            if photo:
+                return Response(
+                    content=photo,
+                    media_type=detect_content_type(photo),
+                    headers=photo_cache_headers(photo_hash, is_versioned(v, version)),
+                )
+
+        blob = (
+            await user_repo.get_photo_blob(
+                photo_hash, with_data=not blob_store.serves_files
+            )
+            if photo_hash
+            else None
+        )
+        if blob is None:
+            return ORJSONResponse(
+                status_code=status.HTTP_404_NOT_FOUND,
+                content={"message": "Profile photo not found"},
+            )
+
+        content_type, photo = blob
+        if blob_store.serves_files:
+            # FileResponse opens the file after this handler returned; a blob collected since
+            # the lookup must be answered here rather than fail while the response is sent
+            path = blob_store.path(photo_hash)
+            try:
+                stat_result = await run_in_threadpool(os.stat, path)
+            except FileNotFoundError:
+                return ORJSONResponse(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    content={"message": "Profile photo not found"},
+                )
+            return FileResponse(
+                path, media_type=content_type, headers=headers, stat_result=stat_result
+            )
+        return Response(content=photo, media_type=content_type, headers=headers)
+    except Exception as e:
+        logger.exception(f"Failed to fetch profile photo for user with ID {user_id}")
+        return ORJSONResponse(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            content={
+                "message": "An error occurred while fetching the profile photo",
+                "error": str(e),
+            },
+        )
+
+
+async def render_missing_rendition(user_id, size, user_repo):
+    """
+    Render and store the renditions of a photo stored before they existed.
+
+    Args:
+        user_id (int): The ID of the user.
+        size (str): The rendition that was requested.
+        user_repo (AsyncUserRepository): The user repository.
+
+    Returns:
+        tuple: The requested rendition and its hash, or (None, None) if it could not be rendered.
+    """
+    original, _, _ = await user_repo.get_profile_photo(user_id)
+    renditions = await photo_renderer.render_async(original) if original else None
+    if not renditions:
+        return None, None
+
+    await user_repo.store_renditions(user_id, renditions)
+    return renditions[size], hash_profile_photo(renditions[size])
+
+
 @router.put("/{user_id}")
-def update(user_id: int, user_data: User, db: Session = Depends(get_connection)):
+async def update(
+    user_id: int,
+    user_data: UserUpdate,
+    user_repo: AsyncUserRepository = Depends(get_user_repository),
+):
     """
-    Update an existing user in the database.
+    Replace the details of an existing user.
 
     Args:
         user_id (int): The ID of the user to update.
-        user_data (User): The new data for the user.
-        db (Session): Database session dependency.
+        user_data (UserUpdate): The new data for the user, optionally with the version it was
+            read at.
+        user_repo (AsyncUserRepository): User repository dependency.
+
+    Returns:
+        JSONResponse: A response object with the updated user, or a 404 or 409 response.
+    """
+    return await apply_update(
+        user_id, user_data.model_dump(exclude={"version"}), user_data.version, user_repo
+    )
+
+
+@router.patch("/{user_id}")
+async def patch(
+    user_id: int,
+    user_data: UserUpdate,
+    user_repo: AsyncUserRepository = Depends(get_user_repository),
+):
+    """
+    Change some details of an existing user, leaving the fields absent from the payload as
+    they are.
+
+    Args:
+        user_id (int): The ID of the user to update.
+        user_data (UserUpdate): The fields to change, optionally with the version the user was
+            read at.
+        user_repo (AsyncUserRepository): User repository dependency.
+
+    Returns:
+        JSONResponse: A response object with the updated user, or a 400, 404 or 409 response.
+    """
+    user_fields = user_data.model_dump(exclude_unset=True, exclude={"version"})
+    if not user_fields:
+        return ORJSONResponse(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            content={"message": "No fields to update"},
+        )
+    return await apply_update(user_id, user_fields, user_data.version, user_repo)
+
+
+async def apply_update(user_id, user_fields, version, user_repo):
+    """
+    Write the fields of a PUT or PATCH request and build its response.
+
+    Args:
+        user_id (int): The ID of the user to update.
+        user_fields (dict): The fields to write.
+        version (int): The version the user must be at, or None.
+        user_repo (AsyncUserRepository): The user repository.
 
     Returns:
         JSONResponse: A response object indicating the outcome of the update operation.
     """
     try:
         logger.info(f"Updating user with ID {user_id}")
-        user_repo = UserRepository(db)
-        updated_user = user_repo.update(user_id, user_data.model_dump())
+        updated_user = await user_repo.update(
+            user_id, user_fields, expected_version=version
+        )
 
         if not updated_user:
             logger.error(f"User with ID {user_id} not found")
-            return JSONResponse(
+            return ORJSONResponse(
                 status_code=status.HTTP_404_NOT_FOUND,
                 content={"message": "User not found"},
             )
 
-        return JSONResponse(
+        return ORJSONResponse(
             status_code=status.HTTP_200_OK,
             content={
                 "message": "User updated successfully",
-                "data": user_data.model_dump(),
+                "data": updated_user,
             },
         )
+    except VersionConflictError as e:
+        return version_conflict(e)
     except Exception as e:
         logger.exception(f"Failed to update user with ID {user_id}")
-        return JSONResponse(
+        return ORJSONResponse(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             content={
                 "message": "An error occurred while updating the user",
@@ -149,30 +906,61 @@ def update(user_id: int, user_data: User, db: Session = Depends(get_connection))
         )
 
 
+def version_conflict(error):
+    """
+    Build the 409 response of a write that lost a race with another writer.
+
+    Args:
+        error (VersionConflictError): The conflict raised by the repository.
+
+    Returns:
+        JSONResponse: A 409 response with the user's current version.
+    """
+    return ORJSONResponse(
+        status_code=status.HTTP_409_CONFLICT,
+        content={
+            "message": "User was modified by another request",
+            "error": str(error),
+            "version": error.current_version,
+        },
+    )
+
+
 @router.delete("/{user_id}")
-def delete(user_id: int, db: Session = Depends(get_connection)):
+async def delete(
+    user_id: int,
+    version: Optional[int] = Query(
+        None, description="Only delete the user if it is still at this version"
+    ),
+    user_repo: AsyncUserRepository = Depends(get_user_repository),
+):
     """
     Delete a user by their ID from the database.
 
     Args:
         user_id (int): The ID of the user to delete.
-        db (Session): Database session dependency.
+        version (int, optional): The version the user must be at to be deleted.
+        user_repo (AsyncUserRepository): User repository dependency.
 
     Returns:
-        JSONResponse: A response object indicating the outcome of the deletion operation.
+        Response: An empty 204 response, or a JSON response describing the error (404 when the
+        user does not exist, 409 when it is at another version).
     """
     try:
         logger.info(f"Attempting to delete user with ID {user_id}")
-        user_repo = UserRepository(db)
-        user_repo.delete(user_id)
+        if not await user_repo.delete(user_id, expected_version=version):
+            return ORJSONResponse(
+                status_code=status.HTTP_404_NOT_FOUND,
+                content={"message": "User not found"},
+            )
 
-        return JSONResponse(
-            status_code=status.HTTP_204_NO_CONTENT,
-            content={"message": "User deleted successfully"},
-        )
+        # A 204 response must not have a body
+        return Response(status_code=status.HTTP_204_NO_CONTENT)
+    except VersionConflictError as e:
+        return version_conflict(e)
     except Exception as e:
         logger.exception(f"Failed to delete user with ID {user_id}")
-        return JSONResponse(
+        return ORJSONResponse(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             content={
                 "message": "An error occurred while deleting the user",
@@ -0,0 +1,410 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+    This file stores photo bytes once per distinct content, addressed by their SHA-256 hash
+"""
+import os
+import tempfile
+from abc import ABC, abstractmethod
+from collections import Counter
+from logging import getLogger
+
+from database.tables import PhotoBlob
+from services.profile_photo import detect_content_type, hash_profile_photo
+from settings import env_str
+from sqlalchemy import (
+    BigInteger,
+    Integer,
+    String,
+    cast,
+    column,
+    delete,
+    func,
+    select,
+    update,
+    values,
+)
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.exc import MissingGreenlet
+from sqlalchemy.util import await_only
+from starlette.concurrency import run_in_threadpool
+
+logger = getLogger(__name__)
+
+BLOB_BACKENDS = ("postgres", "filesystem")
+PHOTO_STORAGE = env_str("PHOTO_STORAGE", "postgres")
+PHOTO_STORAGE_DIRECTORY = env_str(
+    "PHOTO_STORAGE_DIRECTORY", "/var/lib/users-api/photos"
+)
+
+
+class BlobStore(ABC):
+    """
+    A content-addressed store of photo blobs with reference counting.
+
+    Every blob has a row in the `photo_blobs` table holding its hash, media type, size and the
+    number of rows (users and renditions) that reference it, so identical photos are stored only
+    once. Reference counts are changed on the caller's connection, in the same transaction as the
+    rows that gain or lose the reference. Blobs whose count dropped to zero are removed by
+    `collect` once that transaction has committed. Subclasses decide where the bytes live.
+
+    Attributes:
+        name (str): The backend name, one of BLOB_BACKENDS.
+        serves_files (bool): Whether blobs are files that can be sent with a `FileResponse`.
+    """
+
+    name = None
+    serves_files = False
+
+    def acquire(self, connection, blobs):
+        """
+        Store blobs that are not stored yet and take one reference to each of them.
+
+        Blobs that already exist only get their reference count bumped, so their bytes are not
+        sent to the database again.
+
+        Args:
+            connection (Connection): The connection whose transaction the references belong to.
+            blobs (list): The bytes to store; None entries are skipped.
+
+        Returns:
+            list: The hash of each blob, aligned with `blobs`.
+        """
+        hashes = [hash_profile_photo(blob) for blob in blobs]
+        references = Counter(photo_hash for photo_hash in hashes if photo_hash)
+        if not references:
+            return hashes
+
+        existing = set(
+            connection.execute(
+                self._adjust_query(references, PhotoBlob.ref_count.op("+"))
+            ).scalars()
+        )
+        distinct = {
+            photo_hash: blob for photo_hash, blob in zip(hashes, blobs) if photo_hash
+        }
+        missing = {
+            photo_hash: blob
+            for photo_hash, blob in distinct.items()
+            if photo_hash not in existing
+        }
+        if missing:
+            query = pg_insert(PhotoBlob).values(
+                [
+                    {
+                        "hash": photo_hash,
+                        "content_type": detect_content_type(blob),
+                        "byte_size": len(blob),
+                        "ref_count": references[photo_hash],
+                        "data": self._stored_data(blob),
+                    }
+                    for photo_hash, blob in missing.items()
+                ]
+            )
+            # Another transaction may have stored the same content in the meantime
+            query = query.on_conflict_do_update(
+                index_elements=[PhotoBlob.hash],
+                set_={"ref_count": PhotoBlob.ref_count + query.excluded.ref_count},
+            )
+            connection.execute(query)
+
+        # Written while the row locks are held, so `collect` cannot remove them concurrently
+        for photo_hash, blob in distinct.items():
+            self._write(photo_hash, blob)
+
+        return hashes
+
+    def add_references(self, connection, references):
+        """
+        Take more references to blobs that are already stored, without their bytes at hand.
+
+        Args:
+            connection (Connection): The connection whose transaction the references belong to.
+            references (dict): The number of references to add, keyed by blob hash.
+        """
+        if references:
+            connection.execute(
+                self._adjust_query(references, PhotoBlob.ref_count.op("+"))
+            )
+
+    def release(self, connection, hashes):
+        """
+        Drop one reference to each of the given blobs.
+
+        Args:
+            connection (Connection): The connection whose transaction the references belong to.
+            hashes (list): The hashes of the released blobs; None entries are skipped.
+        """
+        references = Counter(photo_hash for photo_hash in hashes if photo_hash)
+        if references:
+            connection.execute(
+                self._adjust_query(references, PhotoBlob.ref_count.op("-"))
+            )
+
+    def collect(self, connection, hashes):
+        """
+        Remove the given blobs if nothing references them anymore, in a transaction of its own.
+
+        Meant to be called with the hashes passed to `release`, after its transaction committed.
+
+        Args:
+            connection (Connection): A connection without a pending transaction.
+            hashes (list): The hashes of the candidate blobs; None entries are skipped.
+
+        Returns:
+            int: The number of blobs removed.
+        """
+        candidates = {photo_hash for photo_hash in hashes if photo_hash}
+        if not candidates:
+            return 0
+
+        query = (
+            delete(PhotoBlob)
+            .where(PhotoBlob.hash.in_(candidates), PhotoBlob.ref_count <= 0)
+            .returning(PhotoBlob.hash)
+        )
+        removed = connection.execute(query).scalars().all()
+        # Files are unlinked before the rows are gone for good: a concurrent `acquire` of the
+        # same content waits on the deleted rows and writes its file again afterwards
+        for photo_hash in removed:
+            self._remove(photo_hash)
+        connection.commit()
+        return len(removed)
+
+    def load(self, connection, photo_hash, with_data=True):
+        """
+        Retrieve the media type and, optionally, the bytes of a blob.
+
+        Args:
+            connection (Connection): The database connection.
+            photo_hash (str): The hash of the blob.
+            with_data (bool): Whether to read the bytes.
+
+        Returns:
+            tuple: The media type and the bytes (None if not requested), or None if the blob
+            does not exist.
+        """
+        columns = [PhotoBlob.content_type]
+        if with_data:
+            columns.append(PhotoBlob.data)
+        row = connection.execute(
+            select(*columns).where(PhotoBlob.hash == photo_hash)
+        ).first()
+        if row is None:
+            return None
+        return row.content_type, self._read(photo_hash, row) if with_data else None
+
+    def load_many(self, connection, hashes):
+        """
+        Retrieve the bytes of several blobs at once.
+
+        Args:
+            connection (Connection): The database connection.
+            hashes (list): The hashes of the blobs; None entries are skipped.
+
+        Returns:
+            dict: The bytes of each blob that exists, keyed by hash.
+        """
+        wanted = {photo_hash for photo_hash in hashes if photo_hash}
+        if not wanted:
+            return {}
+        rows = connection.execute(
+            select(PhotoBlob.hash, PhotoBlob.data).where(PhotoBlob.hash.in_(wanted))
+        )
+        return {row.hash: self._read(row.hash, row) for row in rows}
+
+    def stats(self, connection):
+        """
+        Describe the stored blobs and how much storage deduplication saves.
+
+        Args:
+            connection (Connection): The database connection.
+
+        Returns:
+            dict: The backend, blob count, stored and referenced bytes and deduplication ratio.
+        """
+        row = connection.execute(
+            select(
+                func.count(),
+                func.coalesce(func.sum(PhotoBlob.byte_size), 0),
+                func.coalesce(
+                    func.sum(
+                        cast(PhotoBlob.byte_size, BigInteger) * PhotoBlob.ref_count
+                    ),
+                    0,
+                ),
+                func.coalesce(func.sum(PhotoBlob.ref_count), 0),
+            )
+        ).one()
+        blobs, stored_bytes, referenced_bytes, references = row
+        return {
+            "backend": self.name,
+            "blobs": blobs,
+            "references": int(references),
+            "stored_bytes": int(stored_bytes),
+            "referenced_bytes": int(referenced_bytes),
+            "deduplication_ratio": (
+                round(int(referenced_bytes) / int(stored_bytes), 2)
+                if stored_bytes
+                else None
+            ),
+        }
+
+    def _adjust_query(self, references, operator):
+        """
+        Build an UPDATE applying `operator` with each blob's reference delta, returning the hashes.
+        """
+        deltas = values(
+            column("hash", String), column("delta", Integer), name="deltas"
+        ).data(sorted(references.items()))
+        return (
+            update(PhotoBlob)
+            .where(PhotoBlob.hash == deltas.c.hash)
+            .values(ref_count=operator(deltas.c.delta))
+            .returning(PhotoBlob.hash)
+        )
+
+    def _stored_data(self, blob):
+        return None
+
+    def _write(self, photo_hash, blob):
+        pass
+
+    @abstractmethod
+    def _read(self, photo_hash, row):
+        """
+        Return the bytes of a blob from its `photo_blobs` row.
+        """
+
+    def _remove(self, photo_hash):
+        pass
+
+
+class PostgresBlobStore(BlobStore):
+    """
+    Keeps blob bytes in the `photo_blobs.data` column, next to their reference counts.
+
+    Blobs live in their own table rather than in `users`, so user rows stay narrow and identical
+    photos share storage; their bytes are written and removed transactionally with their rows.
+    """
+
+    name = "postgres"
+
+    def _stored_data(self, blob):
+        return blob
+
+    def _read(self, photo_hash, row):
+        return row.data
+
+
+class FileSystemBlobStore(BlobStore):
+    """
+    Keeps blob bytes as files under a local directory, named after their hash.
+
+    Files are spread over two levels of subdirectories (`ab/cd/abcd...`) and written atomically
+    through a temporary file, so readers never see a partial blob. Routes send them with a
+    `FileResponse`, which streams straight from disk instead of going through the database.
+    File I/O made from async handlers through `AsyncConnection.run_sync` runs on the
+    threadpool, not on the event loop.
+
+    Attributes:
+        directory (str): The root directory of the blob files.
+    """
+
+    name = "filesystem"
+    serves_files = True
+
+    def __init__(self, directory):
+        """
+        Initialize the store, creating its directory if needed.
+
+        Args:
+            directory (str): The root directory of the blob files.
+        """
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, photo_hash):
+        """
+        Return the path of the file holding a blob.
+
+        Args:
+            photo_hash (str): The hash of the blob.
+
+        Returns:
+            str: The file path.
+        """
+        return os.path.join(self.directory, photo_hash[:2], photo_hash[2:4], photo_hash)
+
+    def _write(self, photo_hash, blob):
+        _run_blocking(self._write_file, self.path(photo_hash), blob)
+
+    def _read(self, photo_hash, row):
+        return _run_blocking(self._read_file, photo_hash)
+
+    def _remove(self, photo_hash):
+        _run_blocking(self._remove_file, self.path(photo_hash))
+
+    def _write_file(self, path, blob):
+        if os.path.exists(path):
+            return
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        descriptor, temporary_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        try:
+            with os.fdopen(descriptor, "wb") as file:
+                file.write(blob)
+            os.replace(temporary_path, path)
+        except BaseException:
+            os.unlink(temporary_path)
+            raise
+
+    def _read_file(self, photo_hash):
+        try:
+            with open(self.path(photo_hash), "rb") as file:
+                return file.read()
+        except FileNotFoundError:
+            logger.error(f"Photo blob {photo_hash} is missing from {self.directory}")
+            return None
+
+    def _remove_file(self, path):
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+
+def _run_blocking(function, *args):
+    """
+    Run blocking file I/O. Under `AsyncConnection.run_sync`, whose code executes on the event
+    loop thread, it is handed to the threadpool and awaited so that other requests keep being
+    served; elsewhere, e.g. on the threadpool already or in a CLI, it runs in place.
+    """
+    try:
+        return await_only(run_in_threadpool(function, *args))
+    except MissingGreenlet:
+        return function(*args)
+
+
+def create_blob_store():
+    """
+    Create the photo blob store selected by PHOTO_STORAGE.
+
+    Switching backends does not move blobs that are already stored.
+
+    Returns:
+        BlobStore: A store keeping bytes in Postgres, or under PHOTO_STORAGE_DIRECTORY.
+
+    Raises:
+        ValueError: If PHOTO_STORAGE is not one of BLOB_BACKENDS.
+    """
+    if PHOTO_STORAGE == "postgres":
+        return PostgresBlobStore()
+    if PHOTO_STORAGE == "filesystem":
+        return FileSystemBlobStore(PHOTO_STORAGE_DIRECTORY)
+    raise ValueError(
+        f"PHOTO_STORAGE must be one of {', '.join(BLOB_BACKENDS)}, got {PHOTO_STORAGE!r}"
+    )
+
+
+blob_store = create_blob_store()
@@ -0,0 +1,495 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+    This file streams the changes made to the users table to subscribed clients as server-sent events
+"""
+import asyncio
+import select as selectors
+import threading
+from collections import deque, namedtuple
+from logging import getLogger
+from time import monotonic, sleep
+
+import orjson
+from database.connection_context import ConnectionContext
+from database.engine import get_engine
+from database.tables import User, UserChange
+from repositories.user_repository import USER_VIEW_COLUMNS
+from settings import env_bool, env_float, env_int
+from sqlalchemy import and_, create_engine, delete, func, select, text
+from sqlalchemy.pool import NullPool
+from starlette.concurrency import run_in_threadpool
+
+logger = getLogger(__name__)
+
+CHANGE_FEED_ENABLED = env_bool("CHANGE_FEED_ENABLED", True)
+CHANGE_FEED_RETENTION = env_int("CHANGE_FEED_RETENTION", 100000)
+CHANGE_FEED_CLIENT_BUFFER = env_int("CHANGE_FEED_CLIENT_BUFFER", 1000)
+CHANGE_FEED_HEARTBEAT_SECONDS = env_float("CHANGE_FEED_HEARTBEAT", 15.0)
+CHANGE_FEED_GAP_TIMEOUT = env_float("CHANGE_FEED_GAP_TIMEOUT", 10.0)
+CHANGE_FEED_BATCH_SIZE = 500
+PRUNE_INTERVAL_SECONDS = 60.0
+RECONNECT_SECONDS = 1.0
+LISTEN_POLL_SECONDS = 1.0
+GAP_POLL_SECONDS = 0.02
+# Sent first so that browsers wait this long before reconnecting
+RETRY_MILLISECONDS = 2000
+
+# The channel the triggers on `users` notify, with the last sequence number as payload
+CHANGE_FEED_CHANNEL = "user_changes"
+# Arbitrary application-wide key of the advisory lock writers hold in shared mode until commit
+CHANGE_FEED_LOCK = 72340002
+# Set to 'off' in a session to keep its writes out of the change feed, e.g. for bulk loads
+CHANGE_FEED_SETTING = "users.change_feed"
+
+USER_VIEW_KEYS = tuple(column.key for column in USER_VIEW_COLUMNS)
+IN_FLIGHT_WRITERS = text(
+    "SELECT virtualtransaction FROM pg_locks "
+    "WHERE locktype = 'advisory' AND classid = 0 AND objid = :key AND objsubid = 1 "
+    "AND granted"
+)
+
+# A change ready to send: its sequence number, event name and encoded SSE message
+Change = namedtuple("Change", ("seq", "event", "message"))
+
+
+class _Subscription:
+    """
+    The changes waiting to be sent to one client, bounded so that a stalled client cannot make
+    the worker buffer changes forever.
+    """
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.pending = deque()
+        self.overflowed = False
+        self.ready = asyncio.Event()
+
+    def deliver(self, changes):
+        if len(self.pending) + len(changes) > self.limit:
+            # The client fell too far behind: drop its backlog and tell it to start over
+            self.pending.clear()
+            self.overflowed = True
+        else:
+            self.pending.extend(changes)
+        self.ready.set()
+
+
+class ChangeFeed:
+    """
+    Fans the changes made to `users` out to every client subscribed to this worker.
+
+    Triggers on `users` record each change in `user_changes` under an increasing sequence
+    number and NOTIFY the CHANGE_FEED_CHANNEL channel on commit. Each worker process has a
+    single listener: a background thread holding one dedicated connection that LISTENs on the
+    channel, reads the new changes once, together with the current state of the users, encodes
+    them as server-sent events and hands them to the subscriptions on the event loop. Clients
+    therefore cost no database connection, and a change costs one query per worker whatever
+    the number of clients.
+
+    Sequence numbers are taken before commit, so a change may become visible before one with a
+    lower number. When the listener finds such a gap, it waits until the writers in flight at
+    that time are done (they hold the CHANGE_FEED_LOCK advisory lock in shared mode) and then
+    skips the numbers of the ones that rolled back. Changes are thus sent in sequence order,
+    none is skipped, and a client resuming after the last sequence number it received misses
+    nothing. Clients resuming from a change that was pruned, that fall more than
+    CHANGE_FEED_CLIENT_BUFFER changes behind, or that wait for a writer stuck for more than
+    CHANGE_FEED_GAP_TIMEOUT seconds get a "reset" event instead, telling them to reload.
+
+    Attributes:
+        published_seq (int): The sequence number of the last change handed to the
+            subscriptions, None until the listener first connects.
+        notifications (int): Number of notifications received.
+        published (int): Number of changes handed to the subscriptions.
+        gaps (int): Number of times the listener waited for writers in flight.
+        resets (int): Number of reset events published.
+        overflows (int): Number of times a client fell behind and was reset.
+    """
+
+    def __init__(self, client_buffer):
+        """
+        Initialize the feed; call `start` from the event loop to begin listening.
+
+        Args:
+            client_buffer (int): The maximum number of changes buffered per client.
+        """
+        self.client_buffer = client_buffer
+        self.published_seq = None
+        self.notifications = 0
+        self.published = 0
+        self.gaps = 0
+        self.resets = 0
+        self.overflows = 0
+        self._read_seq = None
+        self._connected = False
+        self._subscriptions = set()
+        self._loop = None
+        self._thread = None
+        self._stopping = threading.Event()
+
+    def start(self):
+        """
+        Start the listener thread, delivering changes to the running event loop.
+        """
+        if self._thread is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._stopping.clear()
+        self._thread = threading.Thread(
+            target=self._listen_loop, name="change-feed", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop the listener thread.
+        """
+        if self._thread is None:
+            return
+        self._stopping.set()
+        self._thread.join(timeout=5)
+        self._thread = None
+
+    async def stream(self, after=None):
+        """
+        Stream the changes as server-sent events, starting after a given sequence number.
+
+        Changes up to the last one published are replayed from `user_changes` through a pooled
+        connection, then live changes are sent as the listener publishes them. A comment is
+        sent every CHANGE_FEED_HEARTBEAT seconds without changes, so that proxies keep the
+        connection open and a client that went away is noticed.
+
+        Args:
+            after (int, optional): The last sequence number the client received, from its
+                Last-Event-ID header; without one, only changes from now on are sent.
+
+        Yields:
+            bytes: Server-sent event messages, starting with a "ready" or "reset" event.
+        """
+        subscription = _Subscription(self.client_buffer)
+        self._subscriptions.add(subscription)
+        try:
+            yield b"retry: %d\n\n" % RETRY_MILLISECONDS
+            # Everything after `horizon` reaches the subscription, everything up to it is replayed
+            horizon = self.published_seq
+            if after is None or after == horizon:
+                after = horizon
+                yield _message(horizon, "ready", {"seq": horizon})
+            elif not await run_in_threadpool(_is_retained, after, horizon):
+                after = horizon
+                yield _message(horizon, "reset", {"seq": horizon})
+            else:
+                yield _message(after, "ready", {"seq": after})
+                while after < horizon:
+                    changes = await run_in_threadpool(_replay, after, horizon)
+                    yield b"".join(change.message for change in changes)
+                    after = changes[-1].seq if changes else horizon
+
+            while True:
+                try:
+                    await asyncio.wait_for(
+                        subscription.ready.wait(), CHANGE_FEED_HEARTBEAT_SECONDS
+                    )
+                except asyncio.TimeoutError:
+                    yield b": keep-alive\n\n"
+                    continue
+
+                subscription.ready.clear()
+                if subscription.overflowed:
+                    subscription.overflowed = False
+                    self.overflows += 1
+                    subscription.pending.clear()
+                    after = self.published_seq
+                    yield _message(after, "reset", {"seq": after})
+                    continue
+
+                messages = []
+                while subscription.pending:
+                    change = subscription.pending.popleft()
+                    if change.seq > after or change.event == "reset":
+                        messages.append(change.message)
+                        after = change.seq
+                if messages:
+                    yield b"".join(messages)
+        finally:
+            self._subscriptions.discard(subscription)
+
+    def stats(self):
+        """
+        Describe the listener and its subscriptions.
+
+        Returns:
+            dict: Whether the listener is connected, the last published sequence number, the
+            number of subscribed clients and the feed counters.
+        """
+        return {
+            "enabled": CHANGE_FEED_ENABLED,
+            "connected": self._connected,
+            "published_seq": self.published_seq,
+            "subscribers": len(self._subscriptions),
+            "notifications": self.notifications,
+            "published": self.published,
+            "gaps": self.gaps,
+            "resets": self.resets,
+            "overflows": self.overflows,
+            "retention": CHANGE_FEED_RETENTION,
+        }
+
+    def _listen_loop(self):
+        # A dedicated connection: LISTEN is bound to the session, which must outlive checkouts
+        engine = create_engine(get_engine().url, poolclass=NullPool)
+        while not self._stopping.is_set():
+            try:
+                with engine.connect().execution_options(
+                    isolation_level="AUTOCOMMIT"
+                ) as connection:
+                    connection.execute(text(f"LISTEN {CHANGE_FEED_CHANNEL}"))
+                    self._connected = True
+                    self._resume(connection)
+                    self._listen(connection)
+            except Exception:
+                logger.exception("Change feed listener failed, reconnecting")
+            finally:
+                self._connected = False
+            self._stopping.wait(RECONNECT_SECONDS)
+        engine.dispose()
+
+    def _resume(self, connection):
+        if self._read_seq is None:
+            # Start after the changes committed so far, none of them still in flight
+            _wait_for_writers(connection)
+            self._read_seq = _seq_range(connection)[1]
+            logger.info(f"Change feed listening after sequence number {self._read_seq}")
+            self._loop.call_soon_threadsafe(self._fan_out, [], self._read_seq)
+            return
+
+        oldest_seq, latest_seq = _seq_range(connection)
+        if oldest_seq - 1 <= self._read_seq <= latest_seq:
+            self._catch_up(connection)
+        else:
+            # Changes missed while disconnected were pruned, or the table was recreated
+            self._publish_reset(latest_seq)
+
+    def _listen(self, connection):
+        dbapi_connection = connection.connection.dbapi_connection
+        next_prune = monotonic()
+        while not self._stopping.is_set():
+            if selectors.select([dbapi_connection], [], [], LISTEN_POLL_SECONDS)[0]:
+                dbapi_connection.poll()
+                payloads = [notify.payload for notify in dbapi_connection.notifies]
+                dbapi_connection.notifies.clear()
+                self.notifications += len(payloads)
+                notified_seq = max(
+                    (int(payload) for payload in payloads if payload.isdigit()),
+                    default=0,
+                )
+                if notified_seq > self._read_seq:
+                    self._catch_up(connection)
+
+            if monotonic() >= next_prune:
+                next_prune = monotonic() + PRUNE_INTERVAL_SECONDS
+                prune_changes(connection, CHANGE_FEED_RETENTION)
+
+    def _catch_up(self, connection):
+        while not self._stopping.is_set():
+            changes = read_changes(connection, self._read_seq, CHANGE_FEED_BATCH_SIZE)
+            if not changes:
+                return
+
+            contiguous = changes[-1].seq - self._read_seq == len(changes)
+            if not contiguous:
+                # A writer holding a lower sequence number may not have committed yet
+                self.gaps += 1
+                if not _wait_for_writers(connection):
+                    self._publish_reset(_seq_range(connection)[1])
+                    return
+                changes = read_changes(
+                    connection,
+                    self._read_seq,
+                    CHANGE_FEED_BATCH_SIZE,
+                    until=changes[-1].seq,
+                )
+
+            self._read_seq = changes[-1].seq
+            self._loop.call_soon_threadsafe(self._fan_out, changes, self._read_seq)
+            if contiguous and len(changes) < CHANGE_FEED_BATCH_SIZE:
+                return
+
+    def _publish_reset(self, seq):
+        logger.warning(f"Change feed reset at sequence number {seq}")
+        self._read_seq = seq
+        self.resets += 1
+        reset = Change(seq, "reset", _message(seq, "reset", {"seq": seq}))
+        self._loop.call_soon_threadsafe(self._fan_out, [reset], seq)
+
+    def _fan_out(self, changes, seq):
+        # Runs on the event loop, like `stream`, so that `published_seq` and the subscriptions
+        # always agree on which changes a new subscriber must replay
+        self.published_seq = seq
+        self.published += len(changes)
+        if changes:
+            for subscription in self._subscriptions:
+                subscription.deliver(changes)
+
+
+def read_changes(connection, after, limit, until=None):
+    """
+    Read the changes following a sequence number, with the current state of their users.
+
+    Args:
+        connection (Connection): The connection to read through.
+        after (int): The sequence number to read after.
+        limit (int): The maximum number of changes to read.
+        until (int, optional): The last sequence number to read.
+
+    Returns:
+        list: The `Change` tuples, in sequence order.
+    """
+    query = (
+        select(
+            UserChange.seq,
+            UserChange.operation,
+            UserChange.user_id,
+            UserChange.version.label("change_version"),
+            UserChange.changed_at,
+            *USER_VIEW_COLUMNS,
+        )
+        .select_from(
+            UserChange.__table__.outerjoin(
+                User.__table__,
+                and_(User.id == UserChange.user_id, UserChange.operation != "deleted"),
+            )
+        )
+        .where(UserChange.seq > after)
+        .order_by(UserChange.seq)
+        .limit(limit)
+    )
+    if until is not None:
+        query = query.where(UserChange.seq <= until)
+
+    changes = []
+    for row in connection.execute(query).mappings():
+        # The user as it is now, which may be newer than the change; None once deleted
+        user = (
+            {key: row[key] for key in USER_VIEW_KEYS} if row["id"] is not None else None
+        )
+        event = {
+            "seq": row["seq"],
+            "op": row["operation"],
+            "id": row["user_id"],
+            "version": row["change_version"],
+            "at": row["changed_at"],
+            "user": user,
+        }
+        changes.append(
+            Change(
+                row["seq"],
+                row["operation"],
+                _message(row["seq"], row["operation"], event),
+            )
+        )
+    return changes
+
+
+def prune_changes(connection, retention):
+    """
+    Delete all but the most recent changes.
+
+    Args:
+        connection (Connection): The connection to delete through.
+        retention (int): The number of changes to keep.
+
+    Returns:
+        int: The number of changes deleted.
+    """
+    latest_seq = _seq_range(connection)[1]
+    result = connection.execute(
+        delete(UserChange).where(UserChange.seq <= latest_seq - retention)
+    )
+    if result.rowcount:
+        logger.info(f"Pruned {result.rowcount} changes from the change feed")
+    return result.rowcount
+
+
+def record_reset(connection):
+    """
+    Record a reset in the change feed, telling clients to reload, e.g. after a bulk load that
+    was kept out of the feed. The reset is published when the caller commits.
+
+    Args:
+        connection (Connection): The connection to record it through.
+    """
+    connection.execute(select(func.pg_advisory_xact_lock_shared(CHANGE_FEED_LOCK)))
+    seq = connection.scalar(
+        UserChange.__table__.insert()
+        .values(operation="reset")
+        .returning(UserChange.seq)
+    )
+    connection.execute(select(func.pg_notify(CHANGE_FEED_CHANNEL, str(seq))))
+
+
+def _replay(after, until):
+    """
+    Read a batch of past changes for a resuming client through a pooled connection.
+    """
+    with ConnectionContext() as connection:
+        return read_changes(connection, after, CHANGE_FEED_BATCH_SIZE, until=until)
+
+
+def _seq_range(connection):
+    """
+    Read the sequence numbers of the oldest and latest changes kept, (1, 0) in an empty feed.
+    """
+    oldest_seq, latest_seq = connection.execute(
+        select(func.min(UserChange.seq), func.max(UserChange.seq))
+    ).one()
+    if latest_seq is None:
+        return 1, 0
+    return oldest_seq, latest_seq
+
+
+def _is_retained(after, horizon):
+    """
+    Tell whether every change from `after` to `horizon` can still be replayed.
+    """
+    if after > horizon:
+        return False
+    with ConnectionContext() as connection:
+        return _seq_range(connection)[0] - 1 <= after
+
+
+def _wait_for_writers(connection):
+    """
+    Wait until the transactions writing to `users` right now have committed or rolled back.
+
+    Returns:
+        bool: False if some were still running after CHANGE_FEED_GAP_TIMEOUT seconds.
+    """
+    deadline = monotonic() + CHANGE_FEED_GAP_TIMEOUT
+    pending = connection.scalars(IN_FLIGHT_WRITERS, {"key": CHANGE_FEED_LOCK}).all()
+    while pending:
+        if monotonic() >= deadline:
+            logger.warning(
+                f"{len(pending)} writers did not finish within {CHANGE_FEED_GAP_TIMEOUT}s"
+            )
+            return False
+        sleep(GAP_POLL_SECONDS)
+        pending = connection.scalars(
+            text(f"{IN_FLIGHT_WRITERS.text} AND virtualtransaction = ANY(:pending)"),
+            {"key": CHANGE_FEED_LOCK, "pending": pending},
+        ).all()
+    return True
+
+
+def _message(seq, event, data):
+    """
+    Encode a server-sent event.
+    """
+    return b"id: %d\nevent: %s\ndata: %s\n\n" % (
+        seq,
+        event.encode(),
+        orjson.dumps(data),
+    )
+
+
+change_feed = ChangeFeed(client_buffer=CHANGE_FEED_CLIENT_BUFFER)
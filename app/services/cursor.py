@@ -0,0 +1,46 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+    This file encodes and decodes the opaque cursor tokens used for keyset pagination
+"""
+import base64
+import json
+
+
+def encode_cursor(position):
+    """
+    Encode a keyset position into an opaque, URL-safe token.
+
+    Args:
+        position (dict): The sort key values of the row the cursor points at, e.g. {"id": 42}.
+
+    Returns:
+        str: A URL-safe token that can be handed to clients as `after`/`before`.
+    """
+    payload = json.dumps(position, separators=(",", ":"), sort_keys=True).encode("utf-8")
+    return base64.urlsafe_b64encode(payload).rstrip(b"=").decode("ascii")
+
+
+def decode_cursor(token):
+    """
+    Decode a token produced by `encode_cursor` back into its keyset position.
+
+    Args:
+        token (str): The opaque cursor token received from a client.
+
+    Returns:
+        dict: The sort key values the cursor points at.
+
+    Raises:
+        ValueError: If the token is malformed or does not contain a keyset position.
+    """
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        position = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except (ValueError, UnicodeEncodeError) as e:
+        raise ValueError("Invalid cursor") from e
+
+    if not isinstance(position, dict) or not isinstance(position.get("id"), int):
+        raise ValueError("Invalid cursor")
+
+    return position
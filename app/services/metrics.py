@@ -0,0 +1,430 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+    This file keeps the in-process metrics of the API and renders them in the Prometheus text format
+"""
+import threading
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from settings import env_bool
+
+METRICS_ENABLED = env_bool("METRICS_ENABLED", True)
+
+# Latency buckets in seconds, from sub-millisecond queries to slow photo fetches
+LATENCY_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+STATEMENT_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 25, 50, 100)
+COMPRESSION_BUCKETS = (
+    0.0001,
+    0.00025,
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+)
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+UNMATCHED_ROUTE = "unmatched"
+
+
+class _Metric(ABC):
+    """
+    Base class of the metric families: a name, a help text, label names and one child per
+    combination of label values.
+    """
+
+    kind = None
+
+    def __init__(self, name, documentation, label_names=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values):
+        """
+        Return the child for the given label values, creating it on first use.
+
+        Args:
+            *values (str): One value per label name, in order.
+
+        Returns:
+            The child holding the values of this label combination.
+        """
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.get(values)
+                if child is None:
+                    child = self._children[values] = self._new_child()
+        return child
+
+    def collect(self):
+        """
+        Render the metric family as Prometheus exposition lines.
+
+        Returns:
+            list: The HELP, TYPE and sample lines.
+        """
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+        for values, child in sorted(self._children.items()):
+            lines.extend(self._samples(_format_labels(self.label_names, values), child))
+        return lines
+
+    @abstractmethod
+    def _new_child(self):
+        """
+        Create the value holder of a new combination of label values.
+        """
+
+    @abstractmethod
+    def _samples(self, labels, child):
+        """
+        Render the sample lines of one child, given its formatted labels.
+        """
+
+
+class _Value:
+    """
+    A single number guarded by a lock, shared by counter and gauge children.
+    """
+
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1.0):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount=1.0):
+        with self._lock:
+            self.value -= amount
+
+    def set(self, value):
+        self.value = value
+
+
+class Counter(_Metric):
+    """
+    A monotonically increasing count, e.g. of handled requests.
+    """
+
+    kind = "counter"
+
+    def _new_child(self):
+        return _Value()
+
+    def _samples(self, labels, child):
+        return [f"{self.name}_total{labels} {_format_number(child.value)}"]
+
+
+class Gauge(_Metric):
+    """
+    A value that goes up and down, e.g. the number of requests in flight.
+    """
+
+    kind = "gauge"
+
+    def _new_child(self):
+        return _Value()
+
+    def _samples(self, labels, child):
+        return [f"{self.name}{labels} {_format_number(child.value)}"]
+
+
+class _HistogramValue:
+    """
+    The bucket counts, sum and count of one histogram child.
+    """
+
+    __slots__ = ("bounds", "counts", "sum", "_lock")
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+
+class Histogram(_Metric):
+    """
+    A distribution of observations over fixed buckets, e.g. request latencies.
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, label_names=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, label_names)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def _samples(self, labels, child):
+        with child._lock:
+            counts = list(child.counts)
+            total = child.sum
+
+        separator = "," if labels else ""
+        prefix = labels[:-1] + separator if labels else "{"
+        samples = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += count
+            samples.append(
+                f'{self.name}_bucket{prefix}le="{_format_number(bound)}"}} {cumulative}'
+            )
+        samples.append(f"{self.name}_sum{labels} {_format_number(total)}")
+        samples.append(f"{self.name}_count{labels} {cumulative}")
+        return samples
+
+
+class MetricsRegistry:
+    """
+    Holds the metric families of this worker process and renders them on demand.
+
+    Values that already live elsewhere (pool statistics, cache sizes) are not copied on every
+    change; instead a collector callback returning `(name, documentation, kind, samples)`
+    tuples is registered and evaluated at scrape time.
+    """
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def register(self, metric):
+        """
+        Add a metric family to the registry.
+
+        Args:
+            metric (_Metric): The counter, gauge or histogram.
+
+        Returns:
+            _Metric: The registered metric, for module-level assignment.
+        """
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector):
+        """
+        Add a callback producing metrics at scrape time.
+
+        Args:
+            collector (callable): Returns an iterable of (name, documentation, kind, samples)
+                where samples is a list of (labels dict, value) pairs. Counter names are given
+                without their "_total" suffix.
+        """
+        self._collectors.append(collector)
+
+    def render(self):
+        """
+        Render every metric in the Prometheus text exposition format.
+
+        Returns:
+            str: The exposition document.
+        """
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.collect())
+        for collector in self._collectors:
+            for name, documentation, kind, samples in collector():
+                lines.append(f"# HELP {name} {documentation}")
+                lines.append(f"# TYPE {name} {kind}")
+                sample_name = f"{name}_total" if kind == "counter" else name
+                for labels, value in samples:
+                    if value is None:
+                        continue
+                    rendered = _format_labels(tuple(labels), tuple(labels.values()))
+                    lines.append(f"{sample_name}{rendered} {_format_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+class RequestStatistics:
+    """
+    The database work done on behalf of the request currently being handled.
+
+    An instance is bound to `current_request` by the metrics middleware; the statement hooks
+    add to it from whichever thread runs the endpoint, since the threadpool copies the context.
+    """
+
+    @property
+    def route(self):
+        """
+        str: The route template of the request, once it has been routed.
+        """
+        return route_template(self.scope)
+
+    __slots__ = ("scope", "statements", "statement_seconds")
+
+    def __init__(self, scope):
+        self.scope = scope
+        self.statements = 0
+        self.statement_seconds = 0.0
+
+
+current_request = ContextVar("current_request", default=None)
+
+metrics_registry = MetricsRegistry()
+
+http_requests = metrics_registry.register(
+    Counter(
+        "http_requests",
+        "HTTP requests handled, by method, route template and status code.",
+        ("method", "route", "status"),
+    )
+)
+http_request_duration = metrics_registry.register(
+    Histogram(
+        "http_request_duration_seconds",
+        "Time from receiving an HTTP request to sending the end of its response.",
+        ("method", "route"),
+    )
+)
+http_requests_in_progress = metrics_registry.register(
+    Gauge(
+        "http_requests_in_progress",
+        "HTTP requests currently being handled, by method.",
+        ("method",),
+    )
+)
+db_statement_duration = metrics_registry.register(
+    Histogram(
+        "db_statement_duration_seconds",
+        "Execution time of SQL statements, by statement type.",
+        ("operation",),
+    )
+)
+db_request_statements = metrics_registry.register(
+    Histogram(
+        "db_request_statements",
+        "SQL statements executed per HTTP request, by route template.",
+        ("route",),
+        buckets=STATEMENT_COUNT_BUCKETS,
+    )
+)
+db_request_duration = metrics_registry.register(
+    Histogram(
+        "db_request_duration_seconds",
+        "Time spent executing SQL statements per HTTP request, by route template.",
+        ("route",),
+    )
+)
+photo_fetch_duration = metrics_registry.register(
+    Histogram(
+        "photo_fetch_duration_seconds",
+        "Latency of profile photo fetches from the photo service, by outcome.",
+        ("outcome",),
+    )
+)
+
+http_compressed_responses = metrics_registry.register(
+    Counter(
+        "http_compressed_responses",
+        "HTTP responses compressed, by content encoding.",
+        ("encoding",),
+    )
+)
+http_uncompressed_responses = metrics_registry.register(
+    Counter(
+        "http_uncompressed_responses",
+        "HTTP responses sent uncompressed, by reason (small, content_type, encoded, "
+        "not_accepted, no_body).",
+        ("reason",),
+    )
+)
+http_compression_input_bytes = metrics_registry.register(
+    Counter(
+        "http_compression_input_bytes",
+        "Response body bytes before compression, by content encoding.",
+        ("encoding",),
+    )
+)
+http_compression_output_bytes = metrics_registry.register(
+    Counter(
+        "http_compression_output_bytes",
+        "Response body bytes after compression, by content encoding.",
+        ("encoding",),
+    )
+)
+http_compression_duration = metrics_registry.register(
+    Histogram(
+        "http_compression_duration_seconds",
+        "Time spent compressing the body of a response, by content encoding.",
+        ("encoding",),
+        buckets=COMPRESSION_BUCKETS,
+    )
+)
+
+
+def route_template(scope):
+    """
+    Return the path template of the route that handled a request.
+
+    Args:
+        scope (dict): The ASGI scope, after routing.
+
+    Returns:
+        str: The full template including router prefixes, e.g. "/users/{user_id}", or
+        "unmatched" when no route matched.
+    """
+    route = scope.get("route")
+    if route is None:
+        return UNMATCHED_ROUTE
+    # Newer FastAPI releases no longer copy included routes with their prefix; the prefixed
+    # route is then only described by the effective route context
+    effective_route = scope.get("fastapi", {}).get("effective_route_context")
+    return getattr(effective_route, "path", None) or route.path
+
+
+def _format_labels(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(
+        f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)
+    )
+    return "{" + pairs + "}"
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_number(value):
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
@@ -0,0 +1,207 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+    This file derives compact, resized renditions of profile photos in a pool of worker processes
+"""
+import asyncio
+import io
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from logging import getLogger
+from time import perf_counter
+
+from PIL import Image, ImageOps
+from settings import env_int, env_str
+
+logger = getLogger(__name__)
+
+ORIGINAL = "original"
+# Square renditions derived from the original, by name and edge length in pixels
+RENDITION_SIZES = {
+    "small": env_int("PHOTO_SMALL_SIZE", 64),
+    "medium": env_int("PHOTO_MEDIUM_SIZE", 256),
+}
+PHOTO_SIZES = tuple(RENDITION_SIZES) + (ORIGINAL,)
+
+PHOTO_RENDITION_FORMAT = env_str("PHOTO_RENDITION_FORMAT", "WEBP").upper()
+PHOTO_RENDITION_QUALITY = env_int("PHOTO_RENDITION_QUALITY", 80)
+PHOTO_ORIGINAL_QUALITY = env_int("PHOTO_ORIGINAL_QUALITY", 85)
+PHOTO_ORIGINAL_MAX_SIZE = env_int("PHOTO_ORIGINAL_MAX_SIZE", 1024)
+PHOTO_PROCESS_WORKERS = env_int("PHOTO_PROCESS_WORKERS", 2)
+
+
+def render_renditions(photo):
+    """
+    Decode a photo once and encode every rendition of it.
+
+    The original is re-encoded in PHOTO_RENDITION_FORMAT at PHOTO_ORIGINAL_QUALITY and scaled
+    down to PHOTO_ORIGINAL_MAX_SIZE if needed, unless that would not make it smaller, in which
+    case the upstream bytes are kept. The other renditions are center-cropped squares. This is
+    CPU-bound and meant to run in a worker process.
+
+    Args:
+        photo (bytes): The upstream image bytes.
+
+    Returns:
+        dict: The encoded image bytes of each rendition, keyed by PHOTO_SIZES.
+
+    Raises:
+        OSError: If the bytes are not a supported image.
+    """
+    with Image.open(io.BytesIO(photo)) as source:
+        image = ImageOps.exif_transpose(source).convert("RGB")
+
+    original = image.copy()
+    original.thumbnail(
+        (PHOTO_ORIGINAL_MAX_SIZE, PHOTO_ORIGINAL_MAX_SIZE), Image.LANCZOS
+    )
+    encoded_original = _encode(original, PHOTO_ORIGINAL_QUALITY)
+    if original.size == image.size and len(encoded_original) >= len(photo):
+        encoded_original = photo
+
+    renditions = {ORIGINAL: encoded_original}
+    for name, edge in RENDITION_SIZES.items():
+        thumbnail = ImageOps.fit(image, (edge, edge), Image.LANCZOS)
+        renditions[name] = _encode(thumbnail, PHOTO_RENDITION_QUALITY)
+
+    return renditions
+
+
+def _encode(image, quality):
+    """
+    Encode an image in PHOTO_RENDITION_FORMAT.
+    """
+    buffer = io.BytesIO()
+    options = {"method": 4} if PHOTO_RENDITION_FORMAT == "WEBP" else {"optimize": True}
+    image.save(buffer, format=PHOTO_RENDITION_FORMAT, quality=quality, **options)
+    return buffer.getvalue()
+
+
+class PhotoRenderer:
+    """
+    Renders photo renditions in a pool of worker processes.
+
+    Resizing and encoding hold the GIL for tens of milliseconds per photo, so they run in
+    separate processes rather than on the event loop or on request and worker threads. The pool
+    is started lazily and uses the "spawn" start method, which is safe in a threaded server.
+    With zero workers, photos are rendered in the calling thread.
+
+    Attributes:
+        workers (int): The number of worker processes.
+        rendered (int): Number of photos rendered.
+        failed (int): Number of photos that could not be rendered.
+        seconds (float): Total wall time spent waiting for renders.
+    """
+
+    def __init__(self, workers):
+        """
+        Initialize the renderer without starting any process.
+
+        Args:
+            workers (int): The number of worker processes.
+        """
+        self.workers = workers
+        self.rendered = 0
+        self.failed = 0
+        self.seconds = 0.0
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def render(self, photo):
+        """
+        Render every rendition of a photo, blocking the calling thread until it is done.
+
+        Args:
+            photo (bytes): The upstream image bytes.
+
+        Returns:
+            dict: The renditions keyed by PHOTO_SIZES, or None if the photo could not be rendered.
+        """
+        started = perf_counter()
+        try:
+            if self.workers <= 0:
+                renditions = render_renditions(photo)
+            else:
+                renditions = (
+                    self._get_executor().submit(render_renditions, photo).result()
+                )
+        except Exception as e:
+            return self._record_failure(e)
+        return self._record_success(renditions, started)
+
+    async def render_async(self, photo):
+        """
+        Render every rendition of a photo without blocking the event loop.
+
+        Args:
+            photo (bytes): The upstream image bytes.
+
+        Returns:
+            dict: The renditions keyed by PHOTO_SIZES, or None if the photo could not be rendered.
+        """
+        if self.workers <= 0:
+            return await asyncio.to_thread(self.render, photo)
+
+        started = perf_counter()
+        try:
+            future = self._get_executor().submit(render_renditions, photo)
+            renditions = await asyncio.wrap_future(future)
+        except Exception as e:
+            return self._record_failure(e)
+        return self._record_success(renditions, started)
+
+    def shutdown(self):
+        """
+        Stop the worker processes, if they were started.
+        """
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def stats(self):
+        """
+        Describe the renderer configuration and counters.
+
+        Returns:
+            dict: The renderer metrics.
+        """
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "started": self._executor is not None,
+                "format": PHOTO_RENDITION_FORMAT,
+                "sizes": {**RENDITION_SIZES, ORIGINAL: PHOTO_ORIGINAL_MAX_SIZE},
+                "rendered": self.rendered,
+                "failed": self.failed,
+                "average_ms": (
+                    round(self.seconds / self.rendered * 1000, 2)
+                    if self.rendered
+                    else None
+                ),
+            }
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            return self._executor
+
+    def _record_success(self, renditions, started):
+        with self._lock:
+            self.rendered += 1
+            self.seconds += perf_counter() - started
+        return renditions
+
+    def _record_failure(self, error):
+        logger.error(f"Failed to render profile photo: {error}")
+        with self._lock:
+            self.failed += 1
+        return None
+
+
+photo_renderer = PhotoRenderer(workers=PHOTO_PROCESS_WORKERS)
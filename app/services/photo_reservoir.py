@@ -0,0 +1,185 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+    This file keeps a bounded buffer of pre-fetched profile photos so new users can get one instantly
+"""
+import threading
+from collections import deque
+
+from services.photo_renditions import photo_renderer
+from services.profile_photo import fetch_profile_photo
+from settings import env_float, env_int
+
+FAILURE_BACKOFF_SECONDS = 5.0
+
+
+class PhotoReservoir:
+    """
+    A bounded in-process reservoir of profile photos, refilled in the background.
+
+    `take` pops a photo in O(1) without any I/O and returns None when the reservoir is empty.
+    Whenever the number of buffered photos drops to the low watermark, a single background
+    thread fetches photos until the high watermark is reached again, waiting
+    `refill_interval_seconds` between fetches so the load on the photo service stays tunable
+    (and at least FAILURE_BACKOFF_SECONDS after a failed fetch). Fetched photos are buffered as
+    renditions, already rendered by `photo_renderer`.
+
+    Attributes:
+        high_watermark (int): The maximum number of buffered photos.
+        low_watermark (int): The level at or below which a refill is started.
+        refill_interval_seconds (float): Pause between two fetches while refilling.
+        hits (int): Number of `take` calls that returned a photo.
+        misses (int): Number of `take` calls that found the reservoir empty.
+        refills (int): Number of photos fetched into the reservoir.
+        refill_failures (int): Number of fetches that failed while refilling.
+    """
+
+    def __init__(self, high_watermark, low_watermark, refill_interval_seconds):
+        """
+        Initialize an empty reservoir; call `start` to begin filling it.
+
+        Args:
+            high_watermark (int): The maximum number of buffered photos.
+            low_watermark (int): The level at or below which a refill is started.
+            refill_interval_seconds (float): Pause between two fetches while refilling.
+        """
+        self.high_watermark = high_watermark
+        self.low_watermark = min(low_watermark, high_watermark)
+        self.refill_interval_seconds = refill_interval_seconds
+        self._photos = deque(maxlen=max(high_watermark, 1))
+        self._lock = threading.Lock()
+        self._refill_needed = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+        self.hits = 0
+        self.misses = 0
+        self.refills = 0
+        self.refill_failures = 0
+
+    @property
+    def enabled(self):
+        """
+        bool: Whether the reservoir is configured to hold any photos.
+        """
+        return self.high_watermark > 0
+
+    def start(self):
+        """
+        Start the background refill thread and fill the reservoir up to the high watermark.
+        """
+        if not self.enabled or self._thread is not None:
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(
+            target=self._refill_loop, name="photo-reservoir", daemon=True
+        )
+        self._thread.start()
+        self._refill_needed.set()
+
+    def stop(self):
+        """
+        Stop the background refill thread.
+        """
+        if self._thread is None:
+            return
+        self._stopping.set()
+        self._refill_needed.set()
+        self._thread.join(timeout=5)
+        self._thread = None
+
+    def take(self):
+        """
+        Take a pre-fetched photo out of the reservoir.
+
+        Returns:
+            dict: The renditions of a photo keyed by PHOTO_SIZES, as produced by
+            `photo_renderer.render`, or None when the reservoir is empty.
+        """
+        with self._lock:
+            photo = self._photos.popleft() if self._photos else None
+            if photo is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            remaining = len(self._photos)
+
+        if self.enabled and remaining <= self.low_watermark:
+            self._refill_needed.set()
+
+        return photo
+
+    def take_many(self, count):
+        """
+        Take up to `count` pre-fetched photos out of the reservoir at once.
+
+        A batch that could not be served completely counts as a single miss.
+
+        Args:
+            count (int): The number of photos wanted.
+
+        Returns:
+            list: The renditions of between zero and `count` photos, each a dict keyed by
+            PHOTO_SIZES as produced by `photo_renderer.render`.
+        """
+        with self._lock:
+            photos = [
+                self._photos.popleft() for _ in range(min(count, len(self._photos)))
+            ]
+            self.hits += len(photos)
+            if len(photos) < count:
+                self.misses += 1
+            remaining = len(self._photos)
+
+        if self.enabled and remaining <= self.low_watermark:
+            self._refill_needed.set()
+
+        return photos
+
+    def stats(self):
+        """
+        Describe the reservoir configuration, fill level and hit/miss/refill counters.
+
+        Returns:
+            dict: The reservoir metrics.
+        """
+        with self._lock:
+            taken = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "size": len(self._photos),
+                "high_watermark": self.high_watermark,
+                "low_watermark": self.low_watermark,
+                "refill_interval_seconds": self.refill_interval_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / taken, 4) if taken else None,
+                "refills": self.refills,
+                "refill_failures": self.refill_failures,
+            }
+
+    def _refill_loop(self):
+        while not self._stopping.is_set():
+            self._refill_needed.wait()
+            self._refill_needed.clear()
+
+            while not self._stopping.is_set() and len(self._photos) < self.high_watermark:
+                photo = fetch_profile_photo()
+                if photo is not None:
+                    photo = photo_renderer.render(photo)
+                with self._lock:
+                    if photo is None:
+                        self.refill_failures += 1
+                    else:
+                        self._photos.append(photo)
+                        self.refills += 1
+                delay = self.refill_interval_seconds
+                if photo is None:
+                    delay = max(delay, FAILURE_BACKOFF_SECONDS)
+                self._stopping.wait(delay)
+
+
+photo_reservoir = PhotoReservoir(
+    high_watermark=env_int("PHOTO_RESERVOIR_HIGH_WATERMARK", 20),
+    low_watermark=env_int("PHOTO_RESERVOIR_LOW_WATERMARK", 5),
+    refill_interval_seconds=env_float("PHOTO_RESERVOIR_REFILL_INTERVAL", 0.2),
+)
@@ -0,0 +1,155 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+    This file attaches profile photos to newly created users in the background, off the request path
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from logging import getLogger
+from time import sleep
+
+from database.connection_context import ConnectionContext
+from repositories.user_repository import UserRepository
+from services.photo_renditions import photo_renderer
+from services.profile_photo import fetch_profile_photo
+from settings import env_float, env_int
+
+logger = getLogger(__name__)
+
+
+class ProfilePhotoWorker:
+    """
+    A bounded background worker pool that fetches and stores profile photos.
+
+    Jobs are accepted without blocking the caller. At most `queue_size` jobs may be pending or
+    running at once; further jobs are dropped (the user simply keeps the default avatar) so that
+    a slow photo service can never build up unbounded memory or stall user creation. Each job
+    retries the fetch with exponential backoff before giving up, then has the photo rendered by
+    `photo_renderer` before storing it.
+
+    Attributes:
+        threads (int): Number of worker threads fetching photos concurrently.
+        queue_size (int): Maximum number of jobs pending or in progress.
+        retries (int): Number of additional attempts after a failed fetch.
+        backoff_seconds (float): Delay before the first retry, doubled on every further retry.
+    """
+
+    def __init__(self, threads, queue_size, retries, backoff_seconds):
+        """
+        Initialize the worker; threads are started lazily on the first submitted job.
+
+        Args:
+            threads (int): Number of worker threads fetching photos concurrently.
+            queue_size (int): Maximum number of jobs pending or in progress.
+            retries (int): Number of additional attempts after a failed fetch.
+            backoff_seconds (float): Delay before the first retry, doubled on every further retry.
+        """
+        self.threads = threads
+        self.queue_size = queue_size
+        self.retries = retries
+        self.backoff_seconds = backoff_seconds
+        self._slots = threading.BoundedSemaphore(queue_size)
+        self._executor = None
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.stored = 0
+        self.failed = 0
+        self.dropped = 0
+
+    def submit(self, user_id):
+        """
+        Schedule a photo to be fetched and attached to a user.
+
+        Args:
+            user_id (int): The ID of the user that needs a photo.
+
+        Returns:
+            bool: True if the job was accepted, False if the queue was full.
+        """
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.dropped += 1
+            logger.warning(f"Photo queue full, user {user_id} keeps the default photo")
+            return False
+
+        with self._lock:
+            self.submitted += 1
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.threads, thread_name_prefix="profile-photo"
+                )
+            executor = self._executor
+
+        try:
+            executor.submit(self._run, user_id)
+        except RuntimeError:
+            # The executor is shutting down
+            self._slots.release()
+            return False
+        return True
+
+    def shutdown(self):
+        """
+        Stop accepting jobs and wait for the running ones to finish.
+        """
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def stats(self):
+        """
+        Describe the worker configuration and job counters.
+
+        Returns:
+            dict: Configuration and submitted/stored/failed/dropped counters.
+        """
+        with self._lock:
+            return {
+                "threads": self.threads,
+                "queue_size": self.queue_size,
+                "submitted": self.submitted,
+                "stored": self.stored,
+                "failed": self.failed,
+                "dropped": self.dropped,
+            }
+
+    def _run(self, user_id):
+        try:
+            photo = self._fetch_with_retries()
+            if photo is not None:
+                photo = photo_renderer.render(photo)
+            if photo is None:
+                with self._lock:
+                    self.failed += 1
+                return
+
+            with ConnectionContext() as connection:
+                UserRepository(connection).set_profile_photo(user_id, photo)
+            with self._lock:
+                self.stored += 1
+        except Exception:
+            logger.exception(f"Failed to attach a profile photo to user {user_id}")
+            with self._lock:
+                self.failed += 1
+        finally:
+            self._slots.release()
+
+    def _fetch_with_retries(self):
+        delay = self.backoff_seconds
+        for attempt in range(self.retries + 1):
+            photo = fetch_profile_photo()
+            if photo is not None:
+                return photo
+            if attempt < self.retries:
+                sleep(delay)
+                delay *= 2
+        return None
+
+
+profile_photo_worker = ProfilePhotoWorker(
+    threads=env_int("PHOTO_WORKER_THREADS", 4),
+    queue_size=env_int("PHOTO_WORKER_QUEUE_SIZE", 1000),
+    retries=env_int("PHOTO_FETCH_RETRIES", 2),
+    backoff_seconds=env_float("PHOTO_FETCH_BACKOFF", 0.5),
+)
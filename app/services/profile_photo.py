@@ -1,23 +1,107 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 """
+    This file fetches profile photos from the upstream photo service and inspects their contents
 """
+import hashlib
 from logging import getLogger
+from time import perf_counter
 
 import requests
+from requests.adapters import HTTPAdapter
+from services.metrics import photo_fetch_duration
+from settings import env_float, env_int, env_str
 
 logger = getLogger(__name__)
 
+PROFILE_PHOTO_URL = env_str("PROFILE_PHOTO_URL", "https://thispersondoesnotexist.com")
+PROFILE_PHOTO_TIMEOUT = env_float("PROFILE_PHOTO_TIMEOUT", 10.0)
+PROFILE_PHOTO_HTTP_POOL_SIZE = env_int("PROFILE_PHOTO_HTTP_POOL_SIZE", 8)
+
+# Number of hash characters in the `v` parameter of profile photo URLs
+PHOTO_VERSION_LENGTH = 16
+
+IMAGE_SIGNATURES = (
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+)
+
+
+def create_http_session():
+    """
+    Create an HTTP session that keeps connections to the photo service alive between fetches.
+
+    Returns:
+        Session: A requests session with a connection pool sized by PROFILE_PHOTO_HTTP_POOL_SIZE.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=PROFILE_PHOTO_HTTP_POOL_SIZE,
+        pool_maxsize=PROFILE_PHOTO_HTTP_POOL_SIZE,
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+http_session = create_http_session()
+
 
 def fetch_profile_photo():
-    """Fetch a profile photo from the thispersondoesnotexist API."""
+    """
+    Fetch a profile photo from the photo service (thispersondoesnotexist by default).
+
+    The URL can be pointed at a local stub image server through PROFILE_PHOTO_URL, and the
+    request reuses the pooled `http_session`. Its latency is recorded in the
+    `photo_fetch_duration_seconds` histogram, labelled "ok", "status" (non-200) or "error".
+
+    Returns:
+        bytes: The photo bytes, or None if the fetch failed.
+    """
+    started = perf_counter()
     try:
-        response = requests.get("https://thispersondoesnotexist.com", timeout=10)
+        response = http_session.get(PROFILE_PHOTO_URL, timeout=PROFILE_PHOTO_TIMEOUT)
         if response.status_code == 200:
+            photo_fetch_duration.labels("ok").observe(perf_counter() - started)
             return response.content
         else:
+            photo_fetch_duration.labels("status").observe(perf_counter() - started)
             logger.error(f"Failed to fetch profile photo: {response.status_code}")
             return None
     except Exception as e:
+        photo_fetch_duration.labels("error").observe(perf_counter() - started)
         logger.error(f"Error fetching profile photo: {e}")
         return None
+
+
+def hash_profile_photo(photo):
+    """
+    Compute the content hash used to identify a profile photo.
+
+    Args:
+        photo (bytes): The raw image bytes.
+
+    Returns:
+        str: The SHA-256 hex digest of the photo, or None when there is no photo.
+    """
+    return hashlib.sha256(photo).hexdigest() if photo else None
+
+
+def detect_content_type(photo):
+    """
+    Detect the media type of an image from its leading magic bytes.
+
+    Args:
+        photo (bytes): The raw image bytes.
+
+    Returns:
+        str: The detected media type, falling back to "application/octet-stream".
+    """
+    if photo[:4] == b"RIFF" and photo[8:12] == b"WEBP":
+        return "image/webp"
+    for signature, content_type in IMAGE_SIGNATURES:
+        if photo.startswith(signature):
+            return content_type
+    return "application/octet-stream"
@@ -0,0 +1,216 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+    This file samples the Python stacks of a running request and keeps the resulting profiles
+"""
+import os
+import sys
+import sysconfig
+import threading
+from collections import Counter, deque
+from datetime import datetime, timezone
+from itertools import count
+
+from settings import env_float, env_int, env_str
+
+PROFILING_TOKEN = env_str("PROFILING_TOKEN")
+PROFILING_SAMPLE_RATE = env_float("PROFILING_SAMPLE_RATE", 0.0)
+PROFILING_INTERVAL_MS = env_float("PROFILING_INTERVAL_MS", 1.0)
+PROFILING_STORE_SIZE = env_int("PROFILING_STORE_SIZE", 50)
+
+PROFILING_ENABLED = bool(PROFILING_TOKEN) or PROFILING_SAMPLE_RATE > 0
+
+# Leaf frames of threads that are waiting rather than working; their samples are dropped
+IDLE_FRAMES = {
+    ("selectors.py", "select"),
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("queue.py", "get"),
+    ("thread.py", "_worker"),
+}
+
+_PATH_PREFIXES = sorted(
+    {
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))) + os.sep,
+        sysconfig.get_paths()["purelib"] + os.sep,
+        sysconfig.get_paths()["stdlib"] + os.sep,
+    },
+    key=len,
+    reverse=True,
+)
+
+
+class SamplingProfiler:
+    """
+    A statistical profiler that periodically records the stacks of a set of busy threads.
+
+    Sync endpoints run in threadpool threads and async ones on the event loop, so a profiler
+    bound to one thread (cProfile) misses part of a request; sampling `sys._current_frames`
+    sees all of them. Other requests running on the same threads at the same time are sampled
+    too, so profile a request on an otherwise quiet worker. Stacks are kept in the collapsed
+    format ("root;child;leaf count") read by flamegraph.pl, speedscope and similar tools.
+
+    Attributes:
+        interval (float): The time between samples in seconds.
+        samples (int): Number of sampling rounds taken.
+        stacks (Counter): Sample counts by collapsed stack.
+    """
+
+    def __init__(self, interval, thread_filter=None):
+        """
+        Initialize a stopped profiler.
+
+        Args:
+            interval (float): The time between samples in seconds.
+            thread_filter (callable, optional): Called with each `threading.Thread`, returns
+                whether to sample it; every thread is sampled by default.
+        """
+        self.interval = interval
+        self.thread_filter = thread_filter
+        self.samples = 0
+        self.stacks = Counter()
+        self._labels = {}
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """
+        Start sampling in a background thread.
+        """
+        self._thread = threading.Thread(
+            target=self._run, name="request-profiler", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop sampling and wait for the sampling thread to finish.
+        """
+        self._stopped.set()
+        self._thread.join()
+
+    def collapsed(self):
+        """
+        Render the samples in the collapsed stack format, heaviest stacks first.
+
+        Returns:
+            str: One "frame;frame;frame count" line per distinct stack.
+        """
+        return "".join(
+            f"{stack} {samples}\n" for stack, samples in self.stacks.most_common()
+        )
+
+    def _run(self):
+        own_thread = threading.get_ident()
+        while not self._stopped.wait(self.interval):
+            threads = {thread.ident: thread for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                thread = threads.get(thread_id)
+                if thread_id == own_thread or thread is None:
+                    continue
+                if self.thread_filter is not None and not self.thread_filter(thread):
+                    continue
+                stack = self._collapse(frame)
+                if stack is not None:
+                    self.stacks[stack] += 1
+            self.samples += 1
+
+    def _collapse(self, frame):
+        code = frame.f_code
+        if (os.path.basename(code.co_filename), code.co_name) in IDLE_FRAMES:
+            return None
+
+        labels = []
+        while frame is not None:
+            labels.append(self._label(frame.f_code))
+            frame = frame.f_back
+        return ";".join(reversed(labels))
+
+    def _label(self, code):
+        label = self._labels.get(code)
+        if label is None:
+            path = code.co_filename
+            for prefix in _PATH_PREFIXES:
+                if path.startswith(prefix):
+                    path = path[len(prefix) :]
+                    break
+            label = self._labels[code] = f"{path}:{code.co_qualname}"
+        return label
+
+
+class ProfileStore:
+    """
+    Keeps the most recent request profiles for download.
+
+    Attributes:
+        size (int): How many profiles to keep.
+    """
+
+    def __init__(self, size):
+        self._profiles = deque(maxlen=size)
+        self._ids = count(1)
+        self._lock = threading.Lock()
+
+    def next_id(self):
+        """
+        Reserve the identifier of a profile about to be taken.
+
+        Returns:
+            int: The identifier.
+        """
+        return next(self._ids)
+
+    def add(self, profile_id, request, profiler, duration):
+        """
+        Store a finished profile.
+
+        Args:
+            profile_id (int): The identifier from `next_id`.
+            request (dict): The method, path, route and status of the profiled request.
+            profiler (SamplingProfiler): The stopped profiler.
+            duration (float): The request duration in seconds.
+        """
+        profile = {
+            "id": profile_id,
+            "recorded_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            **request,
+            "duration_ms": round(duration * 1000, 3),
+            "interval_ms": round(profiler.interval * 1000, 3),
+            "samples": profiler.samples,
+            "collapsed": profiler.collapsed(),
+        }
+        with self._lock:
+            self._profiles.append(profile)
+
+    def summaries(self):
+        """
+        Describe the stored profiles, newest first, without their stacks.
+
+        Returns:
+            list: One summary per profile.
+        """
+        with self._lock:
+            profiles = list(reversed(self._profiles))
+        return [
+            {key: value for key, value in profile.items() if key != "collapsed"}
+            for profile in profiles
+        ]
+
+    def get(self, profile_id):
+        """
+        Find a stored profile.
+
+        Args:
+            profile_id (int): The profile identifier.
+
+        Returns:
+            dict: The profile including its "collapsed" stacks, or None if it is not kept.
+        """
+        with self._lock:
+            for profile in self._profiles:
+                if profile["id"] == profile_id:
+                    return profile
+        return None
+
+
+profile_store = ProfileStore(PROFILING_STORE_SIZE)
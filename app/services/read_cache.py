@@ -0,0 +1,425 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+    This file provides a read-through cache for hot user reads, invalidated through version stamps
+"""
+import json
+import threading
+from collections import OrderedDict
+from logging import getLogger
+from time import monotonic
+
+from settings import env_bool, env_float, env_int, env_str
+
+logger = getLogger(__name__)
+
+READ_CACHE_REDIS_URL = env_str("READ_CACHE_REDIS_URL")
+# Without Redis, invalidations only reach the worker that wrote, so the cache is opt-in
+READ_CACHE_ENABLED = env_bool("READ_CACHE_ENABLED", READ_CACHE_REDIS_URL is not None)
+READ_CACHE_MAX_ENTRIES = env_int("READ_CACHE_MAX_ENTRIES", 10000)
+READ_CACHE_TTL = env_float("READ_CACHE_TTL", 30.0)
+READ_CACHE_REDIS_TIMEOUT = env_float("READ_CACHE_REDIS_TIMEOUT", 0.25)
+READ_CACHE_KEY_PREFIX = env_str("READ_CACHE_KEY_PREFIX", "users-api")
+
+
+class LRUCache:
+    """
+    A thread-safe, bounded, in-process LRU cache whose entries expire after a TTL.
+
+    Attributes:
+        max_entries (int): The number of entries kept before the least recently used is evicted.
+        ttl_seconds (float): How long an entry is served after it was stored.
+    """
+
+    def __init__(self, max_entries, ttl_seconds):
+        """
+        Initialize an empty cache.
+
+        Args:
+            max_entries (int): The number of entries kept before the least recently used is evicted.
+            ttl_seconds (float): How long an entry is served after it was stored.
+        """
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+
+    def get(self, key):
+        """
+        Look up a fresh entry and mark it as recently used.
+
+        Args:
+            key (str): The cache key.
+
+        Returns:
+            tuple: Whether a fresh entry was found and its value (None when not found).
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._misses += 1
+                return False, None
+
+            expires_at, value = entry
+            if monotonic() >= expires_at:
+                del self._entries[key]
+                self._expirations += 1
+                self._misses += 1
+                return False, None
+
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return True, value
+
+    def set(self, key, value):
+        """
+        Store a value, evicting the least recently used entries beyond `max_entries`.
+
+        Args:
+            key (str): The cache key.
+            value: The value to store; callers must not mutate it afterwards.
+        """
+        with self._lock:
+            self._entries[key] = (monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+
+    def clear(self):
+        """
+        Drop every entry.
+        """
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """
+        Report the cache counters.
+
+        Returns:
+            dict: The entry count and the hit, miss, eviction and expiration counters.
+        """
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_ratio": round(self._hits / lookups, 4) if lookups else None,
+                "evictions": self._evictions,
+                "expirations": self._expirations,
+            }
+
+
+class LocalVersionStore:
+    """
+    Per-process version stamps, used when no shared backend is configured.
+
+    Invalidations are only seen by the process that made them; other worker processes keep
+    serving their copies until the TTL expires. The cache is therefore disabled by default
+    without READ_CACHE_REDIS_URL; enable it explicitly only for a single worker process or
+    where reads up to READ_CACHE_TTL seconds stale are acceptable.
+    """
+
+    def __init__(self):
+        """
+        Initialize the store with every namespace at version 0.
+        """
+        self._lock = threading.Lock()
+        self._versions = {}
+
+    def get_many(self, namespaces):
+        """
+        Return the current version of each namespace.
+
+        Args:
+            namespaces (tuple): The namespaces to look up.
+
+        Returns:
+            list: The versions, in the order of `namespaces`.
+        """
+        with self._lock:
+            return [self._versions.get(namespace, 0) for namespace in namespaces]
+
+    def bump(self, namespaces):
+        """
+        Move each namespace to a new version, orphaning every entry stamped with the old one.
+
+        Args:
+            namespaces (Iterable[str]): The namespaces to invalidate.
+        """
+        with self._lock:
+            for namespace in namespaces:
+                self._versions[namespace] = self._versions.get(namespace, 0) + 1
+
+
+class RedisBackend:
+    """
+    A Redis backend shared by every worker process, holding both version stamps and values.
+
+    Because every process reads the version stamps from Redis, an invalidation made by one
+    worker is seen by all of them on their next read. Values are stored under version-stamped
+    keys with the cache TTL, so stale values are never looked up again and simply expire.
+
+    Attributes:
+        client (Redis): The Redis client.
+        prefix (str): The prefix of every key written by this backend.
+        ttl_seconds (float): The expiry of stored values.
+    """
+
+    def __init__(self, url, prefix, ttl_seconds, timeout):
+        """
+        Connect to Redis. The `redis` package is only needed when this backend is configured.
+
+        Args:
+            url (str): The Redis URL, e.g. redis://localhost:6379/0.
+            prefix (str): The prefix of every key written by this backend.
+            ttl_seconds (float): The expiry of stored values.
+            timeout (float): The socket timeout in seconds.
+        """
+        import redis
+
+        self.client = redis.Redis.from_url(
+            url, socket_timeout=timeout, socket_connect_timeout=timeout
+        )
+        self.prefix = prefix
+        self.ttl_seconds = ttl_seconds
+
+    def get_many(self, namespaces):
+        """
+        Return the current version of each namespace. See `LocalVersionStore.get_many`.
+        """
+        keys = [f"{self.prefix}:version:{namespace}" for namespace in namespaces]
+        return [int(version or 0) for version in self.client.mget(keys)]
+
+    def bump(self, namespaces):
+        """
+        Invalidate namespaces for every worker. See `LocalVersionStore.bump`.
+        """
+        pipeline = self.client.pipeline(transaction=False)
+        for namespace in namespaces:
+            pipeline.incr(f"{self.prefix}:version:{namespace}")
+        pipeline.execute()
+
+    def get(self, key):
+        """
+        Look up a stored value.
+
+        Args:
+            key (str): The version-stamped cache key.
+
+        Returns:
+            tuple: Whether the value was found and the value.
+        """
+        payload = self.client.get(f"{self.prefix}:value:{key}")
+        return (True, json.loads(payload)) if payload is not None else (False, None)
+
+    def set(self, key, value):
+        """
+        Store a JSON serializable value with the cache TTL.
+
+        Args:
+            key (str): The version-stamped cache key.
+            value: The value to store.
+        """
+        self.client.set(
+            f"{self.prefix}:value:{key}",
+            json.dumps(value),
+            px=int(self.ttl_seconds * 1000),
+        )
+
+
+class ReadThroughCache:
+    """
+    A read-through cache keyed by version stamps.
+
+    Every cached value belongs to one or more namespaces (e.g. "user:42" or "users:pages") and is
+    stored under its key suffixed with the current version of those namespaces. Invalidating a
+    namespace bumps its version, so the affected entries are never looked up again and age out
+    of the LRU on their own, while entries of other namespaces stay valid. Writers must
+    invalidate only after their transaction has committed.
+
+    Values are kept in the in-process LRU and, when a shared backend is configured, in the
+    backend as well. Backend failures are logged and fall back to loading from the database.
+
+    Attributes:
+        local (LRUCache): The in-process cache.
+        shared (RedisBackend): The shared backend, or None.
+        versions (LocalVersionStore | RedisBackend): Where version stamps are kept.
+        enabled (bool): When False, every read goes straight to the loader.
+    """
+
+    def __init__(self, local, shared=None, enabled=True):
+        """
+        Initialize the cache.
+
+        Args:
+            local (LRUCache): The in-process cache.
+            shared (RedisBackend, optional): A backend shared by every worker process.
+            enabled (bool): When False, every read goes straight to the loader.
+        """
+        self.local = local
+        self.shared = shared
+        self.versions = shared if shared is not None else LocalVersionStore()
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._shared_hits = 0
+        self._shared_errors = 0
+        self._invalidations = 0
+
+    def get_or_load(self, key, namespaces, loader):
+        """
+        Return the cached value for a key, loading and caching it on a miss.
+
+        Args:
+            key (str): The cache key, unique for the read and its arguments.
+            namespaces (tuple): The namespaces whose invalidation makes the value stale.
+            loader (callable): Loads the value from the database; it must return plain,
+                JSON serializable data.
+
+        Returns:
+            The cached or freshly loaded value.
+        """
+        found, value, versioned_key = self.lookup(key, namespaces)
+        if found:
+            return value
+
+        value = loader()
+        self.store(versioned_key, value)
+        return value
+
+    def lookup(self, key, namespaces):
+        """
+        Look up the current value of a key, first in the in-process LRU, then in the backend.
+
+        With a shared backend this makes network calls; async callers should run it, and
+        `store`, off the event loop.
+
+        Args:
+            key (str): The cache key, unique for the read and its arguments.
+            namespaces (tuple): The namespaces whose invalidation makes the value stale.
+
+        Returns:
+            tuple: Whether a value was found, the value (None when not found) and the
+            version-stamped key to pass to `store` after loading it, None if it must not be
+            cached.
+        """
+        if not self.enabled:
+            return False, None, None
+
+        try:
+            stamp = self.versions.get_many(namespaces)
+        except Exception as e:
+            self._record_shared_error(e)
+            return False, None, None
+        versioned_key = f"{key}@{'.'.join(str(version) for version in stamp)}"
+
+        found, value = self.local.get(versioned_key)
+        if found:
+            return True, value, versioned_key
+
+        if self.shared is not None:
+            try:
+                found, value = self.shared.get(versioned_key)
+            except Exception as e:
+                self._record_shared_error(e)
+                found = False
+            if found:
+                with self._lock:
+                    self._shared_hits += 1
+                self.local.set(versioned_key, value)
+                return True, value, versioned_key
+
+        return False, None, versioned_key
+
+    def store(self, versioned_key, value):
+        """
+        Cache a value loaded after a `lookup` miss.
+
+        Args:
+            versioned_key (str): The key returned by `lookup`; nothing is stored when None.
+            value: The loaded value; it must be plain, JSON serializable data.
+        """
+        if versioned_key is None:
+            return
+
+        self.local.set(versioned_key, value)
+        if self.shared is not None:
+            try:
+                self.shared.set(versioned_key, value)
+            except Exception as e:
+                self._record_shared_error(e)
+
+    def invalidate(self, *namespaces):
+        """
+        Invalidate every entry belonging to any of the given namespaces.
+
+        Args:
+            *namespaces (str): The namespaces to invalidate.
+        """
+        if not self.enabled or not namespaces:
+            return
+
+        with self._lock:
+            self._invalidations += 1
+        try:
+            self.versions.bump(namespaces)
+        except Exception as e:
+            # Other workers may serve stale data until the TTL expires; this one must not
+            self._record_shared_error(e)
+            self.local.clear()
+
+    def stats(self):
+        """
+        Report the cache counters.
+
+        Returns:
+            dict: The local LRU counters plus the backend, shared hit and invalidation counters.
+        """
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "backend": "redis" if self.shared is not None else "local",
+                **self.local.stats(),
+                "shared_hits": self._shared_hits,
+                "shared_errors": self._shared_errors,
+                "invalidations": self._invalidations,
+            }
+
+    def _record_shared_error(self, error):
+        with self._lock:
+            self._shared_errors += 1
+        logger.warning(f"Read cache backend unavailable: {error}")
+
+
+def create_read_cache():
+    """
+    Build the read cache from the READ_CACHE_* settings.
+
+    Returns:
+        ReadThroughCache: The configured cache.
+    """
+    shared = None
+    if READ_CACHE_ENABLED and READ_CACHE_REDIS_URL:
+        shared = RedisBackend(
+            READ_CACHE_REDIS_URL,
+            prefix=READ_CACHE_KEY_PREFIX,
+            ttl_seconds=READ_CACHE_TTL,
+            timeout=READ_CACHE_REDIS_TIMEOUT,
+        )
+
+    return ReadThroughCache(
+        LRUCache(max_entries=READ_CACHE_MAX_ENTRIES, ttl_seconds=READ_CACHE_TTL),
+        shared=shared,
+        enabled=READ_CACHE_ENABLED,
+    )
+
+
+read_cache = create_read_cache()
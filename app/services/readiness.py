@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+    This file warms up a freshly started worker and reports whether it is ready to take traffic
+"""
+import asyncio
+from logging import getLogger
+from time import perf_counter
+
+from database.async_engine import DATABASE_ASYNC, get_async_engine
+from database.connection_context import ConnectionContext
+from database.engine import POOL_SIZE, get_engine
+from models.pagination_parameters import PaginationParams
+from repositories.user_repository import UserRepository
+from settings import env_bool
+from sqlalchemy import text
+from starlette.concurrency import run_in_threadpool
+
+logger = getLogger(__name__)
+
+WARMUP_POOL = env_bool("WARMUP_POOL", True)
+WARMUP_CACHES = env_bool("WARMUP_CACHES", True)
+
+
+class Readiness:
+    """
+    Runs the warm-up steps of a worker in the background and tracks whether they are done.
+
+    Liveness (/health/ping) answers as soon as the server accepts connections; readiness
+    (/health/ready) only once the connection pools hold open connections and the caches serve
+    the first listing page, so that a load balancer does not route traffic to a worker that
+    would pay for TCP and authentication handshakes and cold caches on its first requests. A
+    failing step is logged and recorded but does not keep the worker unready, since warm-up
+    only saves latency.
+
+    Attributes:
+        ready (bool): Whether warm-up has finished.
+    """
+
+    def __init__(self):
+        self.ready = False
+        self._steps = {}
+        self._task = None
+
+    def start(self):
+        """
+        Start warming up on the running event loop.
+        """
+        self.ready = False
+        self._task = asyncio.get_running_loop().create_task(self._warm_up())
+
+    async def stop(self):
+        """
+        Cancel a warm-up that is still running.
+        """
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    def status(self):
+        """
+        Describe the readiness of this worker.
+
+        Returns:
+            dict: Whether the worker is ready and the outcome and duration of each warm-up step.
+        """
+        return {"ready": self.ready, "steps": dict(self._steps)}
+
+    async def _warm_up(self):
+        steps = []
+        if WARMUP_POOL:
+            steps.append(("pool", lambda: run_in_threadpool(prefill_pool)))
+            if DATABASE_ASYNC:
+                steps.append(("async_pool", prefill_async_pool))
+        if WARMUP_CACHES:
+            steps.append(("caches", lambda: run_in_threadpool(warm_caches)))
+
+        for name, step in steps:
+            self._steps[name] = {"status": "running"}
+            started = perf_counter()
+            try:
+                await step()
+                self._steps[name] = {"status": "done"}
+            except Exception as e:
+                logger.exception(f"Warm-up step '{name}' failed")
+                self._steps[name] = {"status": "failed", "error": str(e)}
+            self._steps[name]["duration_ms"] = round(
+                (perf_counter() - started) * 1000, 3
+            )
+
+        self.ready = True
+        logger.info(f"Worker ready: {self._steps}")
+
+
+def prefill_pool():
+    """
+    Open POOL_SIZE connections of the synchronous pool at once and return them to it.
+    """
+    engine = get_engine()
+    connections = []
+    try:
+        for _ in range(POOL_SIZE):
+            connection = engine.connect()
+            connections.append(connection)
+            connection.execute(text("SELECT 1"))
+    finally:
+        for connection in connections:
+            connection.close()
+
+
+async def prefill_async_pool():
+    """
+    Open POOL_SIZE connections of the asyncio pool at once and return them to it.
+    """
+    engine = get_async_engine()
+    connections = []
+    try:
+        for _ in range(POOL_SIZE):
+            connection = await engine.connect()
+            connections.append(connection)
+            await connection.execute(text("SELECT 1"))
+    finally:
+        for connection in connections:
+            await connection.close()
+
+
+def warm_caches():
+    """
+    Load the user count and the default first listing page into the read caches.
+    """
+    defaults = PaginationParams()
+    with ConnectionContext() as connection:
+        repository = UserRepository(connection)
+        repository.count_users()
+        repository.get_all(defaults.page, defaults.page_size)
+
+
+readiness = Readiness()
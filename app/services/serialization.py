@@ -0,0 +1,41 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+    This file provides the JSON response class of the users endpoints, encoding with orjson
+"""
+from collections.abc import Mapping
+
+import orjson
+from fastapi.responses import JSONResponse
+
+
+class ORJSONResponse(JSONResponse):
+    """
+    A JSON response encoded by orjson instead of the standard library.
+
+    orjson encodes dicts, lists, strings, numbers, datetimes and UUIDs natively, several times
+    faster than `json.dumps`, so rows read from the database are encoded as they are rather
+    than rebuilt field by field. Other mappings, such as SQLAlchemy row mappings, are encoded
+    through a plain dict.
+    """
+
+    def render(self, content):
+        """
+        Encode the response content.
+
+        Args:
+            content: The JSON-serializable content.
+
+        Returns:
+            bytes: The UTF-8 encoded JSON document.
+        """
+        return orjson.dumps(content, default=_encode_default)
+
+
+def _encode_default(value):
+    """
+    Convert values orjson cannot encode natively.
+    """
+    if isinstance(value, Mapping):
+        return dict(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
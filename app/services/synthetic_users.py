@@ -0,0 +1,411 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+    This file generates large numbers of realistic synthetic users and loads them with COPY
+"""
+import io
+import random
+from collections import Counter
+from logging import getLogger
+from time import perf_counter
+
+from database.bulk_copy import copy_rows
+from database.search_indexes import expected_indexes
+from PIL import Image, ImageDraw
+from repositories.user_repository import USERS_NAMESPACE
+from services.blob_store import blob_store
+from services.change_feed import CHANGE_FEED_SETTING, record_reset
+from services.photo_renditions import ORIGINAL, RENDITION_SIZES, render_renditions
+from services.read_cache import read_cache
+from services.user_count_cache import user_count_cache
+from settings import env_int, env_str
+from sqlalchemy import text
+
+logger = getLogger(__name__)
+
+SEED_CHUNK_SIZE = env_int("SEED_CHUNK_SIZE", 50000)
+SEED_INDEX_BUILD_MEMORY = env_str("SEED_INDEX_BUILD_MEMORY", "256MB")
+PLACEHOLDER_PHOTO_COUNT = 12
+USER_COLUMNS = ("id", "first_name", "last_name", "email", "phone_number")
+RENDITION_COLUMNS = ("user_id", "size", "photo_hash")
+
+# Common given names and surnames with their approximate relative frequencies, so that
+# generated data has the skew of real data (many Smiths, few Quinns)
+FIRST_NAMES = (
+    ("James", 3.3),
+    ("Mary", 2.6),
+    ("Robert", 3.1),
+    ("Patricia", 1.1),
+    ("John", 3.2),
+    ("Jennifer", 1.0),
+    ("Michael", 2.6),
+    ("Linda", 1.0),
+    ("David", 2.4),
+    ("Elizabeth", 0.9),
+    ("William", 2.4),
+    ("Barbara", 0.9),
+    ("Richard", 1.7),
+    ("Susan", 0.8),
+    ("Joseph", 1.6),
+    ("Jessica", 0.7),
+    ("Thomas", 1.5),
+    ("Sarah", 0.7),
+    ("Christopher", 1.1),
+    ("Karen", 0.7),
+    ("Charles", 1.5),
+    ("Lisa", 0.6),
+    ("Daniel", 1.1),
+    ("Nancy", 0.6),
+    ("Matthew", 0.9),
+    ("Betty", 0.6),
+    ("Anthony", 0.8),
+    ("Sandra", 0.5),
+    ("Mark", 0.8),
+    ("Margaret", 0.5),
+    ("Donald", 0.8),
+    ("Ashley", 0.5),
+    ("Steven", 0.8),
+    ("Kimberly", 0.5),
+    ("Andrew", 0.6),
+    ("Emily", 0.5),
+    ("Paul", 0.7),
+    ("Donna", 0.5),
+    ("Joshua", 0.6),
+    ("Michelle", 0.5),
+    ("Kevin", 0.5),
+    ("Carol", 0.5),
+    ("Brian", 0.5),
+    ("Amanda", 0.4),
+    ("George", 0.5),
+    ("Melissa", 0.4),
+    ("Alex", 0.3),
+    ("Jordan", 0.2),
+    ("Casey", 0.1),
+    ("Taylor", 0.2),
+    ("Morgan", 0.1),
+    ("Riley", 0.1),
+    ("Cameron", 0.1),
+    ("Quinn", 0.05),
+)
+LAST_NAMES = (
+    ("Smith", 2.4),
+    ("Johnson", 1.9),
+    ("Williams", 1.6),
+    ("Brown", 1.4),
+    ("Jones", 1.4),
+    ("Garcia", 1.2),
+    ("Miller", 1.1),
+    ("Davis", 1.1),
+    ("Rodriguez", 1.1),
+    ("Martinez", 1.1),
+    ("Hernandez", 1.0),
+    ("Lopez", 0.9),
+    ("Gonzalez", 0.8),
+    ("Wilson", 0.8),
+    ("Anderson", 0.8),
+    ("Thomas", 0.8),
+    ("Taylor", 0.7),
+    ("Moore", 0.7),
+    ("Jackson", 0.7),
+    ("Martin", 0.7),
+    ("Lee", 0.7),
+    ("Perez", 0.6),
+    ("Thompson", 0.6),
+    ("White", 0.6),
+    ("Harris", 0.6),
+    ("Sanchez", 0.6),
+    ("Clark", 0.5),
+    ("Ramirez", 0.5),
+    ("Lewis", 0.5),
+    ("Robinson", 0.5),
+    ("Walker", 0.5),
+    ("Young", 0.5),
+    ("Allen", 0.5),
+    ("King", 0.5),
+    ("Wright", 0.5),
+    ("Scott", 0.4),
+    ("Torres", 0.4),
+    ("Nguyen", 0.4),
+    ("Hill", 0.4),
+    ("Flores", 0.4),
+    ("Green", 0.4),
+    ("Adams", 0.4),
+    ("Nelson", 0.4),
+    ("Baker", 0.4),
+    ("Hall", 0.4),
+    ("Parker", 0.3),
+    ("Morgan", 0.3),
+    ("Reed", 0.3),
+    ("Blake", 0.1),
+    ("Hayes", 0.1),
+)
+EMAIL_DOMAINS = (("example.com", 6), ("example.org", 3), ("example.net", 1))
+
+
+class _WeightedChoice:
+    """
+    Draws values with the given relative weights.
+    """
+
+    def __init__(self, weighted_values):
+        self.values = [value for value, _ in weighted_values]
+        self.cumulative_weights = []
+        total = 0
+        for _, weight in weighted_values:
+            total += weight
+            self.cumulative_weights.append(total)
+
+    def sample(self, rng, count):
+        return rng.choices(self.values, cum_weights=self.cumulative_weights, k=count)
+
+
+def generate_users(rng, user_ids):
+    """
+    Generate synthetic users for the given IDs.
+
+    Emails embed the user ID, which makes them unique without any lookup.
+
+    Args:
+        rng (Random): The random number generator to draw from.
+        user_ids (list): The IDs of the users to generate.
+
+    Returns:
+        list: One (id, first_name, last_name, email, phone_number) tuple per ID.
+    """
+    count = len(user_ids)
+    first_names = _FIRST_NAMES.sample(rng, count)
+    last_names = _LAST_NAMES.sample(rng, count)
+    domains = _EMAIL_DOMAINS.sample(rng, count)
+
+    return [
+        (
+            user_id,
+            first_name,
+            last_name,
+            f"{first_name.lower()}.{last_name.lower()}.{user_id}@{domain}",
+            f"+1{rng.randrange(200, 1000)}{rng.randrange(0, 10000000):07d}",
+        )
+        for user_id, first_name, last_name, domain in zip(
+            user_ids, first_names, last_names, domains
+        )
+    ]
+
+
+def render_placeholder_photos(rng, count=PLACEHOLDER_PHOTO_COUNT):
+    """
+    Render small generic avatar photos in distinct colors, with all their renditions.
+
+    Args:
+        rng (Random): The random number generator picking the colors.
+        count (int): The number of distinct photos.
+
+    Returns:
+        list: The renditions of each photo, keyed by PHOTO_SIZES.
+    """
+    photos = []
+    for _ in range(count):
+        background = tuple(rng.randrange(90, 230) for _ in range(3))
+        figure = tuple(min(channel + 25, 255) for channel in background)
+
+        image = Image.new("RGB", (128, 128), background)
+        draw = ImageDraw.Draw(image)
+        draw.ellipse((40, 22, 88, 70), fill=figure)
+        draw.ellipse((18, 78, 110, 170), fill=figure)
+
+        buffer = io.BytesIO()
+        image.save(buffer, format="PNG")
+        photos.append(render_renditions(buffer.getvalue()))
+    return photos
+
+
+def seed_users(
+    connection, count, seed=0, photos=False, defer_indexes=False, progress=None
+):
+    """
+    Generate `count` synthetic users deterministically from `seed` and load them with COPY.
+
+    Users are generated and loaded in chunks of SEED_CHUNK_SIZE, each committed on its own, so
+    memory use stays flat whatever the count. Their IDs are reserved from the `users` sequence up
+    front, so concurrent inserts are safe and, in an empty table, the same seed always yields
+    the same users. With `photos`, every user gets one of a few placeholder avatars, stored once
+    in the blob store together with their renditions.
+
+    Maintaining the search indexes row by row dominates the cost of large loads, so with
+    `defer_indexes` the non-unique indexes of `users` are dropped first and rebuilt in one pass
+    at the end, even if the load fails. Searches scan the table in the meantime.
+
+    Args:
+        connection (Connection): A SQLAlchemy connection using the psycopg2 driver.
+        count (int): The number of users to create.
+        seed (int): The seed of the random number generator.
+        photos (bool): Whether to give the users placeholder photos.
+        defer_indexes (bool): Whether to rebuild the secondary indexes after loading.
+        progress (callable, optional): Called with the running summary after every chunk.
+
+    Returns:
+        dict: The number of users inserted, the range of their IDs, timing and throughput.
+    """
+    rng = random.Random(seed)
+    summary = {
+        "inserted": 0,
+        "first_id": None,
+        "last_id": None,
+        "photos": photos,
+        "seconds": 0.0,
+        "rows_per_second": 0.0,
+    }
+    started = perf_counter()
+
+    dropped_indexes = _drop_secondary_indexes(connection) if defer_indexes else []
+    # Loaded users are not recorded one by one in the change feed, a single reset is instead
+    connection.execute(text(f"SET {CHANGE_FEED_SETTING} = 'off'"))
+    try:
+        _load_users(connection, count, rng, photos, summary, started, progress)
+    finally:
+        connection.rollback()
+        connection.execute(text(f"RESET {CHANGE_FEED_SETTING}"))
+        if summary["inserted"]:
+            record_reset(connection)
+        connection.commit()
+        _create_indexes(connection, dropped_indexes)
+
+    elapsed = perf_counter() - started
+    summary["seconds"] = round(elapsed, 3)
+    summary["rows_per_second"] = round(summary["inserted"] / elapsed, 1)
+    user_count_cache.invalidate()
+    read_cache.invalidate(USERS_NAMESPACE)
+
+    logger.info(
+        f"Seeded {summary['inserted']} users in {summary['seconds']}s "
+        f"({summary['rows_per_second']} rows/s)"
+    )
+    return summary
+
+
+def _load_users(connection, count, rng, photos, summary, started, progress):
+    """
+    Generate and COPY the users chunk by chunk, updating the summary after every chunk.
+    """
+    placeholders = render_placeholder_photos(rng) if photos else []
+    placeholder_hashes = [
+        blob_store.acquire(
+            connection, [renditions[size] for size in (ORIGINAL, *RENDITION_SIZES)]
+        )
+        for renditions in placeholders
+    ]
+
+    while summary["inserted"] < count:
+        chunk_size = min(SEED_CHUNK_SIZE, count - summary["inserted"])
+        user_ids = connection.execute(
+            text(
+                "SELECT nextval(pg_get_serial_sequence('users', 'id')) "
+                "FROM generate_series(1, :count)"
+            ),
+            {"count": chunk_size},
+        ).scalars()
+        users = generate_users(rng, sorted(user_ids))
+
+        if placeholders:
+            choices = rng.choices(range(len(placeholders)), k=len(users))
+            hashes = [placeholder_hashes[choice] for choice in choices]
+            copy_rows(
+                connection,
+                "users",
+                USER_COLUMNS + ("profile_photo_hash",),
+                (
+                    user + (photo_hashes[0],)
+                    for user, photo_hashes in zip(users, hashes)
+                ),
+            )
+            copy_rows(
+                connection,
+                "profile_photo_renditions",
+                RENDITION_COLUMNS,
+                (
+                    (user[0], size, photo_hash)
+                    for user, photo_hashes in zip(users, hashes)
+                    for size, photo_hash in zip(RENDITION_SIZES, photo_hashes[1:])
+                ),
+            )
+            blob_store.add_references(
+                connection,
+                Counter(
+                    photo_hash for photo_hashes in hashes for photo_hash in photo_hashes
+                ),
+            )
+        else:
+            copy_rows(connection, "users", USER_COLUMNS, users)
+        connection.commit()
+
+        summary["inserted"] += len(users)
+        summary["first_id"] = summary["first_id"] or users[0][0]
+        summary["last_id"] = users[-1][0]
+        elapsed = perf_counter() - started
+        summary["seconds"] = round(elapsed, 3)
+        summary["rows_per_second"] = round(summary["inserted"] / elapsed, 1)
+        if progress is not None:
+            progress(summary)
+
+    # Drop the references taken while storing the placeholders, now held by the users
+    released = [photo_hash for hashes in placeholder_hashes for photo_hash in hashes]
+    blob_store.release(connection, released)
+    connection.commit()
+    blob_store.collect(connection, released)
+
+
+def _drop_secondary_indexes(connection):
+    """
+    Drop the non-unique indexes of the users table that `expected_indexes` can rebuild.
+
+    Returns:
+        list: The names of the dropped indexes, to be passed to `_create_indexes`.
+    """
+    expected = expected_indexes(connection)
+    names = [
+        name
+        for name in connection.scalars(
+            text(
+                "SELECT index_class.relname "
+                "FROM pg_index AS info "
+                "JOIN pg_class AS index_class ON index_class.oid = info.indexrelid "
+                "WHERE info.indrelid = 'users'::regclass AND NOT info.indisunique"
+            )
+        )
+        if name in expected
+    ]
+    for name in names:
+        connection.execute(text(f'DROP INDEX IF EXISTS "{name}"'))
+    connection.commit()
+
+    logger.info(f"Dropped {len(names)} indexes of users for the duration of the load")
+    return names
+
+
+def _create_indexes(connection, names):
+    """
+    Rebuild dropped indexes from the model, giving the build SEED_INDEX_BUILD_MEMORY to sort in.
+
+    The statements come from `expected_indexes` rather than from the dropped definitions, so
+    that if this process dies before getting here, the next startup rebuilds the very same
+    indexes, see `database.initialize.rebuild_missing_indexes`.
+    """
+    if not names:
+        return
+
+    started = perf_counter()
+    statements = expected_indexes(connection)
+    connection.execute(
+        text("SELECT set_config('maintenance_work_mem', :memory, true)"),
+        {"memory": SEED_INDEX_BUILD_MEMORY},
+    )
+    for name in names:
+        connection.execute(text(statements[name]))
+    connection.commit()
+    logger.info(
+        f"Rebuilt {len(names)} indexes of users in {perf_counter() - started:.1f}s"
+    )
+
+
+_FIRST_NAMES = _WeightedChoice(FIRST_NAMES)
+_LAST_NAMES = _WeightedChoice(LAST_NAMES)
+_EMAIL_DOMAINS = _WeightedChoice(EMAIL_DOMAINS)
@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+    This file keeps an in-memory copy of the total user count so listings do not have to scan the table
+"""
+import threading
+from time import monotonic
+
+from settings import env_float
+
+
+class UserCountCache:
+    """
+    A thread-safe, per-process cache for the exact number of users.
+
+    The value is loaded with an exact COUNT(*) and then kept current by the repository, which
+    adjusts it whenever this process creates or deletes users. Writes made by other worker
+    processes are not seen, so the value is re-read from the database once the TTL expires.
+
+    Attributes:
+        ttl_seconds (float): How long a loaded count is trusted before it is refreshed.
+    """
+
+    def __init__(self, ttl_seconds):
+        """
+        Initialize an empty cache.
+
+        Args:
+            ttl_seconds (float): How long a loaded count is trusted before it is refreshed.
+        """
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._value = None
+        self._expires_at = 0.0
+
+    def get(self):
+        """
+        Return the cached count if it is still fresh.
+
+        Returns:
+            int: The cached count, or None when nothing is cached or the TTL has expired.
+        """
+        with self._lock:
+            if self._value is None or monotonic() >= self._expires_at:
+                return None
+            return self._value
+
+    def set(self, value):
+        """
+        Store a freshly counted value and restart the TTL.
+
+        Args:
+            value (int): The exact number of users.
+        """
+        with self._lock:
+            self._value = value
+            self._expires_at = monotonic() + self.ttl_seconds
+
+    def adjust(self, delta):
+        """
+        Apply a known change to the cached count without touching the TTL.
+
+        Args:
+            delta (int): The number of users added (positive) or removed (negative).
+        """
+        with self._lock:
+            if self._value is not None:
+                self._value = max(self._value + delta, 0)
+
+    def invalidate(self):
+        """
+        Forget the cached count so that the next read goes to the database.
+        """
+        with self._lock:
+            self._value = None
+
+
+user_count_cache = UserCountCache(ttl_seconds=env_float("USER_COUNT_CACHE_TTL", 60.0))
@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+    This file streams the users table as CSV or NDJSON from a server-side cursor
+"""
+import base64
+import csv
+import io
+import json
+from logging import getLogger
+
+from database.connection_context import ConnectionContext
+from repositories.user_repository import UserRepository
+from sqlalchemy import text
+
+logger = getLogger(__name__)
+
+EXPORT_MEDIA_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+}
+EXPORT_COLUMNS = (
+    "id",
+    "first_name",
+    "last_name",
+    "email",
+    "phone_number",
+    "profile_photo_hash",
+)
+
+
+def export_users(file_format, include_photos=False):
+    """
+    Stream every user as CSV or NDJSON, one chunk of text per fetched batch.
+
+    The export runs in a single REPEATABLE READ, READ ONLY transaction, so it reflects one
+    consistent snapshot of the table even while other requests keep writing to it. The
+    connection is checked out when iteration starts and returned when it ends or the client
+    goes away.
+
+    Args:
+        file_format (str): One of EXPORT_MEDIA_TYPES.
+        include_photos (bool): Whether to include base64 encoded profile photos.
+
+    Yields:
+        str: Chunks of the export, the CSV header first.
+    """
+    columns = EXPORT_COLUMNS + (("profile_photo",) if include_photos else ())
+    format_batch = _format_csv if file_format == "csv" else _format_ndjson
+
+    if file_format == "csv":
+        yield _format_csv_row(columns)
+
+    exported = 0
+    with ConnectionContext() as connection:
+        connection.execution_options(isolation_level="REPEATABLE READ")
+        with connection.begin():
+            connection.execute(text("SET TRANSACTION READ ONLY"))
+            user_repo = UserRepository(connection)
+
+            for batch in user_repo.iter_all(include_photo=include_photos):
+                yield format_batch(batch, columns)
+                exported += len(batch)
+
+    logger.info(f"Exported {exported} users as {file_format}")
+
+
+def _export_record(user, columns):
+    """
+    Pick the exported columns of a user, base64 encoding the photo when present.
+    """
+    record = {name: user[name] for name in columns}
+    if record.get("profile_photo") is not None:
+        record["profile_photo"] = base64.b64encode(record["profile_photo"]).decode(
+            "ascii"
+        )
+    return record
+
+
+def _format_csv_row(values):
+    """
+    Render a single CSV line.
+    """
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(values)
+    return buffer.getvalue()
+
+
+def _format_csv(batch, columns):
+    """
+    Render a batch of users as CSV lines.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for user in batch:
+        record = _export_record(user, columns)
+        writer.writerow(record[name] for name in columns)
+    return buffer.getvalue()
+
+
+def _format_ndjson(batch, columns):
+    """
+    Render a batch of users as newline delimited JSON objects.
+    """
+    return "".join(json.dumps(_export_record(user, columns)) + "\n" for user in batch)
@@ -0,0 +1,221 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+    This file imports users from CSV or NDJSON streams through a COPY-loaded staging table
+"""
+import csv
+import json
+from logging import getLogger
+from time import perf_counter
+
+from database.bulk_copy import copy_rows
+from models.user import User
+from pydantic import ValidationError
+from repositories.user_repository import USERS_NAMESPACE
+from services.read_cache import read_cache
+from services.user_count_cache import user_count_cache
+from settings import env_int
+from sqlalchemy import text
+
+logger = getLogger(__name__)
+
+IMPORT_FORMATS = ("csv", "ndjson")
+IMPORT_CONFLICT_MODES = ("skip", "update")
+IMPORT_CHUNK_SIZE = env_int("IMPORT_CHUNK_SIZE", 5000)
+MAX_REPORTED_ERRORS = 20
+
+STAGING_TABLE = "users_import_staging"
+STAGING_COLUMNS = ("line_number", "first_name", "last_name", "email", "phone_number")
+
+CREATE_STAGING_TABLE = text(
+    f"CREATE TEMPORARY TABLE IF NOT EXISTS {STAGING_TABLE} ("
+    "line_number integer, first_name text, last_name text, email text, phone_number text"
+    ")"
+)
+
+# The last occurrence of an email within a chunk wins; rows without an email are all kept.
+MERGE_STAGING_TABLE = f"""
+    INSERT INTO users (first_name, last_name, email, phone_number)
+    SELECT first_name, last_name, email, phone_number
+    FROM (
+        SELECT DISTINCT ON (email, CASE WHEN email IS NULL THEN line_number END) *
+        FROM {STAGING_TABLE}
+        ORDER BY email, CASE WHEN email IS NULL THEN line_number END, line_number DESC
+    ) AS latest
+    ORDER BY line_number
+    ON CONFLICT (email) DO {{conflict_action}}
+    RETURNING (xmax = 0) AS inserted
+"""
+
+CONFLICT_ACTIONS = {
+    "skip": "NOTHING",
+    "update": (
+        "UPDATE SET first_name = EXCLUDED.first_name, last_name = EXCLUDED.last_name, "
+        "phone_number = EXCLUDED.phone_number, version = users.version + 1"
+    ),
+}
+
+
+def detect_import_format(filename):
+    """
+    Guess the import format from a file name.
+
+    Args:
+        filename (str): The name of the uploaded or local file.
+
+    Returns:
+        str: "csv" or "ndjson", or None when the extension is not recognized.
+    """
+    extension = (filename or "").rsplit(".", 1)[-1].lower()
+    if extension == "csv":
+        return "csv"
+    if extension in ("ndjson", "jsonl"):
+        return "ndjson"
+    return None
+
+
+def read_records(stream, file_format):
+    """
+    Lazily parse records from a text stream.
+
+    Args:
+        stream (TextIO): The text stream to read from; it is consumed line by line.
+        file_format (str): Either "csv" (with a header row) or "ndjson" (one JSON object per line).
+
+    Yields:
+        tuple: The line number and the parsed record (a dict), or the line number and a
+        parsing error message when the line could not be parsed.
+    """
+    if file_format == "csv":
+        reader = csv.DictReader(stream)
+        for record in reader:
+            # Empty CSV cells mean "not provided"
+            yield reader.line_num, {
+                key: value if value != "" else None for key, value in record.items()
+            }
+        return
+
+    for line_number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield line_number, f"Invalid JSON: {e}"
+            continue
+        if not isinstance(record, dict):
+            yield line_number, "Expected a JSON object"
+            continue
+        yield line_number, record
+
+
+def import_users(connection, stream, file_format, on_conflict="skip", progress=None):
+    """
+    Import users from a CSV or NDJSON stream.
+
+    The stream is consumed in chunks of IMPORT_CHUNK_SIZE records, so memory use stays flat
+    regardless of the file size. Each record is validated with the `User` model; valid ones are
+    loaded into a temporary staging table with COPY and merged into `users` with a single
+    INSERT ... SELECT ... ON CONFLICT (email) per chunk, which is then committed.
+
+    Args:
+        connection (Connection): A SQLAlchemy connection using the psycopg2 driver.
+        stream (TextIO): The text stream to import from.
+        file_format (str): One of IMPORT_FORMATS.
+        on_conflict (str): "skip" keeps existing users with the same email, "update" overwrites
+            their names and phone numbers.
+        progress (callable, optional): Called with the running summary after every chunk.
+
+    Returns:
+        dict: The import summary with row counts, timing, throughput and the first errors.
+
+    Raises:
+        ValueError: If the format or conflict mode is not supported.
+    """
+    if file_format not in IMPORT_FORMATS:
+        raise ValueError(f"Unsupported import format '{file_format}'")
+    if on_conflict not in IMPORT_CONFLICT_MODES:
+        raise ValueError(f"Unsupported conflict mode '{on_conflict}'")
+
+    merge = text(
+        MERGE_STAGING_TABLE.format(conflict_action=CONFLICT_ACTIONS[on_conflict])
+    )
+    summary = {
+        "rows_read": 0,
+        "rows_valid": 0,
+        "rows_invalid": 0,
+        "inserted": 0,
+        "updated": 0,
+        "skipped": 0,
+        "seconds": 0.0,
+        "rows_per_second": 0.0,
+        "errors": [],
+    }
+    started = perf_counter()
+
+    connection.execute(CREATE_STAGING_TABLE)
+    connection.execute(text(f"TRUNCATE {STAGING_TABLE}"))
+
+    chunk = []
+    for line_number, record in read_records(stream, file_format):
+        summary["rows_read"] += 1
+        try:
+            if isinstance(record, str):
+                raise ValueError(record)
+            user = User.model_validate(record)
+        except (ValidationError, ValueError) as e:
+            summary["rows_invalid"] += 1
+            if len(summary["errors"]) < MAX_REPORTED_ERRORS:
+                summary["errors"].append({"line": line_number, "error": str(e)})
+            continue
+
+        chunk.append(
+            (
+                line_number,
+                user.first_name,
+                user.last_name,
+                user.email,
+                user.phone_number,
+            )
+        )
+        if len(chunk) >= IMPORT_CHUNK_SIZE:
+            _load_chunk(connection, chunk, merge, summary, started, progress)
+            chunk = []
+
+    _load_chunk(connection, chunk, merge, summary, started, progress)
+    connection.execute(text(f"DROP TABLE IF EXISTS {STAGING_TABLE}"))
+    connection.commit()
+    user_count_cache.invalidate()
+    read_cache.invalidate(USERS_NAMESPACE)
+
+    logger.info(
+        f"Imported {summary['rows_valid']} users in {summary['seconds']}s "
+        f"({summary['rows_per_second']} rows/s)"
+    )
+    return summary
+
+
+def _load_chunk(connection, chunk, merge, summary, started, progress):
+    """
+    COPY one chunk into the staging table, merge it into users and commit.
+    """
+    if chunk:
+        copy_rows(connection, STAGING_TABLE, STAGING_COLUMNS, chunk)
+        inserted_flags = connection.execute(merge).scalars().all()
+        connection.execute(text(f"TRUNCATE {STAGING_TABLE}"))
+        connection.commit()
+
+        inserted = sum(1 for flag in inserted_flags if flag)
+        summary["rows_valid"] += len(chunk)
+        summary["inserted"] += inserted
+        summary["updated"] += len(inserted_flags) - inserted
+        summary["skipped"] += len(chunk) - len(inserted_flags)
+
+    elapsed = perf_counter() - started
+    summary["seconds"] = round(elapsed, 3)
+    summary["rows_per_second"] = (
+        round(summary["rows_read"] / elapsed, 1) if elapsed else 0.0
+    )
+
+    if progress is not None and chunk:
+        progress(summary)
@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+    This file provides small helpers for reading typed configuration values from the environment
+"""
+import os
+
+TRUTHY_VALUES = {"1", "true", "yes", "on"}
+
+
+def env_str(name, default=None):
+    """
+    Read a string setting from the environment.
+
+    Args:
+        name (str): The name of the environment variable.
+        default (str, optional): The value to use when the variable is unset or empty.
+
+    Returns:
+        str: The configured value or the default.
+    """
+    value = os.getenv(name)
+    return value if value not in (None, "") else default
+
+
+def env_int(name, default):
+    """
+    Read an integer setting from the environment.
+
+    Args:
+        name (str): The name of the environment variable.
+        default (int): The value to use when the variable is unset or empty.
+
+    Returns:
+        int: The configured value or the default.
+    """
+    value = env_str(name)
+    return int(value) if value is not None else default
+
+
+def env_float(name, default):
+    """
+    Read a floating point setting from the environment.
+
+    Args:
+        name (str): The name of the environment variable.
+        default (float): The value to use when the variable is unset or empty.
+
+    Returns:
+        float: The configured value or the default.
+    """
+    value = env_str(name)
+    return float(value) if value is not None else default
+
+
+def env_bool(name, default=False):
+    """
+    Read a boolean setting from the environment.
+
+    Values such as "1", "true", "yes" and "on" (case-insensitive) are treated as True.
+
+    Args:
+        name (str): The name of the environment variable.
+        default (bool): The value to use when the variable is unset or empty.
+
+    Returns:
+        bool: The configured value or the default.
+    """
+    value = env_str(name)
+    return value.strip().lower() in TRUTHY_VALUES if value is not None else default
@@ -0,0 +1,4 @@
+#!/bin/bash
+# Let the replica of docker-compose.replica.yml stream WAL from this server
+set -e
+echo "host replication all all md5" >> "$PGDATA/pg_hba.conf"
@@ -1,11 +1,15 @@
 import React from 'react'
 import PropTypes from 'prop-types'
+import { API_BASE_URL } from '../services/Users'
 
 const UserCard = ({ user, onEdit, onDelete }) => {
   console.log(user)
-  const avatarUrl = user.profile_photo
-    ? `data:image/jpeg;base64,${user.profile_photo}`
+  const avatarUrl = user.profile_photo_url
+    ? `${API_BASE_URL}${user.profile_photo_url}&size=small`
     : '/images/default-avatar-icon.jpg'
+  const avatarSrcSet = user.profile_photo_url
+    ? `${avatarUrl} 1x, ${API_BASE_URL}${user.profile_photo_url}&size=medium 2x`
+    : undefined
 
   return (
     <div className='card card-bordered w-50 bg-base-100 shadow-md'>
@@ -22,6 +26,7 @@ const UserCard = ({ user, onEdit, onDelete }) => {
           >
             <img
               src={avatarUrl}
+              srcSet={avatarSrcSet}
               alt={`${user.first_name} ${user.last_name}`}
               className='object-cover'
               style={{
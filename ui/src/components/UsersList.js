@@ -15,6 +15,7 @@ const UsersList = () => {
   const [showSavedToast, setShowSavedToast] = useState(false)
   const [showDeletedToast, setShowDeletedToast] = useState(false)
   const [isModalOpen, setIsModalOpen] = useState(false)
+  const [reloads, setReloads] = useState(0)
 
   useEffect(() => {
     const fetchUsers = async () => {
@@ -33,7 +34,21 @@ const UsersList = () => {
     }
 
     fetchUsers()
-  }, [page, pageSize])
+  }, [page, pageSize, reloads])
+
+  // Keep the page in sync with changes made elsewhere instead of polling
+  useEffect(() => {
+    return usersService.subscribeToChanges((change) => {
+      if (change.op === 'created') {
+        setTotalCount((count) => count + 1)
+      } else if (change.op === 'deleted') {
+        setUsers((current) => current.filter((user) => user.id !== change.id))
+        setTotalCount((count) => count - 1)
+      } else if (change.user) {
+        setUsers((current) => current.map((user) => user.id === change.id ? change.user : user))
+      }
+    }, () => setReloads((count) => count + 1))
+  }, [])
 
   const handleUserSubmit = async (userData) => {
     try {
@@ -1,6 +1,6 @@
 import axios from 'axios'
 
-const API_BASE_URL = 'http://localhost:9000'
+export const API_BASE_URL = 'http://localhost:9000'
 
 const usersService = {
   fetchAll: async (page = 1, pageSize = 5) => {
@@ -39,6 +39,16 @@ const usersService = {
     } catch (error) {
       handleServiceError(error)
     }
+  },
+
+  // Calls onChange with every created, updated or deleted event and onReset when changes were
+  // missed; the browser reconnects and resumes on its own. Returns a function to unsubscribe.
+  subscribeToChanges: (onChange, onReset) => {
+    const source = new EventSource(`${API_BASE_URL}/users/changes`)
+    const handleChange = (event) => onChange(JSON.parse(event.data))
+    ;['created', 'updated', 'deleted'].forEach((type) => source.addEventListener(type, handleChange))
+    source.addEventListener('reset', () => onReset())
+    return () => source.close()
   }
 }
 